@@ -5,11 +5,10 @@ Command line tool for working with EC2 instances.
 from __future__ import print_function
 import sys
 import argparse
+import json
 from datetime import datetime
 from ConfigParser import NoOptionError
 
-from dateutil import parser as dateutil_parser
-
 from disco_aws_automation import DiscoAWS, DiscoBake, DiscoSSM
 from disco_aws_automation.resource_helper import TimeoutError
 from disco_aws_automation.disco_logging import configure_logging
@@ -17,6 +16,29 @@ from disco_aws_automation.disco_config import read_config
 from disco_aws_automation.disco_aws_util import graceful, read_pipeline_file
 from disco_aws_automation.exceptions import SmokeTestError
 
+# instance states listhosts shows, everything but terminated
+LISTHOSTS_STATES = ["pending", "running", "shutting-down", "stopping", "stopped"]
+# listhosts columns in display order, with their table format and whether --most shows them. The first
+# three are always shown, the rest when their option is given, and all of them with --all.
+LISTHOSTS_COLUMNS = [
+    ("id", u"{0}", True),
+    ("hostclass", u"{0:<30}", True),
+    ("ip", u"{0:<15}", True),
+    ("state", u"{0:<10}", True),
+    ("hostname", u"{0:<1}", True),
+    ("owner", u"{0:<11}", True),
+    ("instance_type", u"{0:<10}", True),
+    ("ami", u"{0:<12}", True),
+    ("smoke", u"{0:<1}", True),
+    ("ami_age", u"{0:<4}", True),
+    ("uptime", u"{0:<3}", True),
+    ("private_ip", u"{0:<16}", False),
+    ("availability_zone", u"{0:<12}", False),
+    ("productline", u"{0:<15}", False),
+    ("securitygroup", u"{0:15}", False),
+]
+LISTHOSTS_FIXED_COLUMNS = 3
+
 
 # R0912 Allow more than 12 branches so we can parse a lot of commands..
 # R0914 Allow more than 15 local variables so we can parse a lot of commands..
@@ -112,6 +134,11 @@ def get_parser():
     parser_listhosts.add_argument('--all', dest='all', action='store_const',
                                   const=True, default=False,
                                   help='Enables all extra info')
+    parser_listhosts.add_argument('--format', dest='format', choices=['table', 'tsv', 'json'],
+                                  default='table',
+                                  help='table (the default) prints aligned columns sorted by state, '
+                                  'hostclass and hostname. tsv and json print tab separated values or a JSON '
+                                  'object per line, as soon as each page of instances is fetched.')
 
     parser_terminate = subparsers.add_parser(
         'terminate', help='Terminate instance and discard EBS volume. Note that if the instance is managed '
@@ -250,8 +277,101 @@ def get_preferred_private_ip(instance):
      * the *second* network interface's private ip address (normally the static ip), if present
      * the first network interface's private ip
     """
-    interfaces = instance.interfaces
-    return interfaces[0].private_ip_address if len(interfaces) == 1 else interfaces[1].private_ip_address
+    interfaces = sorted(instance.get('NetworkInterfaces', []),
+                        key=lambda interface: interface['Attachment']['DeviceIndex'])
+    if not interfaces:
+        return instance.get('PrivateIpAddress')
+    return interfaces[0]['PrivateIpAddress'] if len(interfaces) == 1 else interfaces[1]['PrivateIpAddress']
+
+
+def listhosts_columns(args):
+    """Returns the names of the listhosts columns selected by the arguments, in display order"""
+    return [name for index, (name, _, in_most) in enumerate(LISTHOSTS_COLUMNS)
+            if index < LISTHOSTS_FIXED_COLUMNS or args.all or (args.most and in_most) or getattr(args, name)]
+
+
+def listhosts_values(instance, columns, ami_creation_times, now):
+    """Returns the values of the columns for a boto3 instance dict, only computing the ones asked for"""
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    launch_time = instance['LaunchTime']
+    values = {
+        "id": lambda: instance['InstanceId'],
+        "hostclass": lambda: tags.get("hostclass", u"-"),
+        "ip": lambda: instance.get('PublicIpAddress') or get_preferred_private_ip(instance),
+        "state": lambda: instance['State']['Name'],
+        "hostname": lambda: tags.get("hostname"),
+        "owner": lambda: tags.get("owner", u"-"),
+        "instance_type": lambda: instance['InstanceType'],
+        "ami": lambda: instance['ImageId'],
+        "smoke": lambda: tags.get("smoketest"),
+        "ami_age": lambda: DiscoBake.time_diff_in_hours(now, ami_creation_times.get(instance['ImageId'])),
+        # use a timezone-aware `now`
+        "uptime": lambda: DiscoBake.time_diff_in_hours(now.replace(tzinfo=launch_time.tzinfo), launch_time),
+        "private_ip": lambda: get_preferred_private_ip(instance),
+        "availability_zone": lambda: instance['Placement']['AvailabilityZone'],
+        "productline": lambda: tags.get("productline"),
+        "securitygroup": lambda: instance['SecurityGroups'][0]['GroupName']
+    }
+    return [values[column]() for column in columns]
+
+
+def listhosts_display(column, value):
+    """Returns how listhosts shows a value in table and tsv output"""
+    if column in ("hostname", "smoke"):
+        return u"-" if value is None else u"y"
+    if column == "productline":
+        return value if value not in (None, u"unknown") else u"-"
+    return value
+
+
+def load_ami_creation_times(bake, instances, ami_creation_times):
+    """
+    Adds the creation times of the AMIs of the instances that haven't been looked up yet, looking up all
+    of the AMIs and their snapshots in a call or two
+    """
+    new_ami_ids = list({instance['ImageId'] for instance in instances} - set(ami_creation_times))
+    if not new_ami_ids:
+        return
+    amis = bake.get_amis(image_ids=new_ami_ids)
+    bake.load_ami_creation_times(amis)
+    ami_creation_times.update(dict.fromkeys(new_ami_ids))  # AMIs that are gone have no creation time
+    ami_creation_times.update({ami.id: bake.get_ami_creation_time(ami) for ami in amis})
+
+
+def listhosts(aws, config, args):
+    """
+    Prints the instances in the environment. Instances are fetched a page at a time, and only the data
+    the selected columns need is looked up.
+    """
+    columns = listhosts_columns(args)
+    formats = dict((name, column_format) for name, column_format, _ in LISTHOSTS_COLUMNS)
+    filters = {"instance-state-name": LISTHOSTS_STATES}
+    if args.hostclass:
+        filters["tag:hostclass"] = [args.hostclass]
+    bake = DiscoBake(config, aws.connection) if "ami_age" in columns else None
+    ami_creation_times = {}
+    now = datetime.utcnow()
+
+    table_rows = []
+    for instances in aws.instance_pages(filters):
+        if bake:
+            load_ami_creation_times(bake, instances, ami_creation_times)
+        for instance in instances:
+            values = listhosts_values(instance, columns, ami_creation_times, now)
+            if args.format == "json":
+                print(json.dumps(dict(zip(columns, values))))
+            elif args.format == "tsv":
+                print(u"\t".join(u"{0}".format(listhosts_display(column, value))
+                                 for column, value in zip(columns, values)))
+            else:
+                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                sort_key = (instance['State']['Name'], tags.get("hostclass", "-"), tags.get("hostname", "-"))
+                table_rows.append((sort_key, values))
+        sys.stdout.flush()
+
+    for _, values in sorted(table_rows):
+        print(u" ".join(formats[column].format(listhosts_display(column, value))
+                        for column, value in zip(columns, values)))
 
 
 def parse_ssm_parameters(parameters):
@@ -294,52 +414,7 @@ def run():
         }]
         aws.spinup(hostclass_dicts, testing=args.testing)
     elif args.mode == "listhosts":
-        instances = aws.instances_from_hostclass(args.hostclass) if args.hostclass else aws.instances()
-        instances_filtered = [i for i in instances if i.state != u"terminated"]
-        instances_sorted = sorted(instances_filtered, key=lambda i: (i.state, i.tags.get("hostclass", "-"),
-                                                                     i.tags.get("hostname", "-")))
-        instance_to_private_ip = {i.id: get_preferred_private_ip(i) for i in instances_sorted}
-        most = args.all or args.most
-
-        if args.ami_age or args.uptime or most:
-            bake = DiscoBake(config, aws.connection)
-            ami_dict = bake.list_amis_by_instance(instances)
-            now = datetime.utcnow()
-
-        for instance in instances_sorted:
-            line = u"{0} {1:<30} {2:<15}".format(
-                instance.id, instance.tags.get("hostclass", "-"),
-                instance.ip_address or instance_to_private_ip[instance.id])
-            if args.state or most:
-                line += u" {0:<10}".format(instance.state)
-            if args.hostname or most:
-                line += u" {0:<1}".format("-" if instance.tags.get("hostname") is None else "y")
-            if args.owner or most:
-                line += u" {0:<11}".format(instance.tags.get("owner", u"-"))
-            if args.instance_type or most:
-                line += u" {0:<10}".format(instance.instance_type)
-            if args.ami or most:
-                line += u" {0:<12}".format(instance.image_id)
-            if args.smoke or most:
-                line += u" {0:<1}".format("-" if instance.tags.get("smoketest") is None else "y")
-            if args.ami_age or most:
-                creation_time = bake.get_ami_creation_time(ami_dict.get(instance.id))
-                line += u" {0:<4}".format(DiscoBake.time_diff_in_hours(now, creation_time))
-            if args.uptime or most:
-                launch_time = dateutil_parser.parse(instance.launch_time)
-                now_with_tz = now.replace(tzinfo=launch_time.tzinfo)  # use a timezone-aware `now`
-                line += u" {0:<3}".format(DiscoBake.time_diff_in_hours(now_with_tz, launch_time))
-            if args.private_ip or args.all:
-                line += u" {0:<16}".format(instance_to_private_ip[instance.id])
-            if args.availability_zone or args.all:
-                line += u" {0:<12}".format(instance.placement)
-            if args.productline or args.all:
-                productline = instance.tags.get("productline", u"unknown")
-                line += u" {0:<15}".format(productline if productline != u"unknown" else u"-")
-            if args.securitygroup or args.all:
-                line += u" {0:15}".format(instance.groups[0].name)
-            print(line)
-
+        listhosts(aws, config, args)
     elif args.mode == "terminate":
         instances = instances_from_args(aws, args)
         terminated_instances = aws.terminate(instances)
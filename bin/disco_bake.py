@@ -10,6 +10,7 @@ from collections import OrderedDict
 
 from bin import print_table
 from disco_aws_automation import DiscoBake, HostclassTemplating
+from disco_aws_automation.disco_bake import BAKE_MAX_PARALLEL, BAKE_MAX_ATTEMPTS
 from disco_aws_automation.disco_aws_util import run_gracefully
 from disco_aws_automation.disco_logging import configure_logging
 
@@ -125,6 +126,35 @@ def get_parser():
                              default=False, help='Tag the baked ami as "private". The AMI will not be visible'
                                                  ' to disco_deploy.py or disco_aws.py provision.')
 
+    parser_bakeall = subparsers.add_parser('bakeall', help="Create amis for many hostclasses",
+                                           description="Bakes the hostclasses concurrently in one process, "
+                                           "phase 1 hostclasses before phase 2 ones.")
+    parser_bakeall.set_defaults(mode="bakeall")
+    parser_bakeall.add_argument('--hostclass', dest='hostclasses', required=True, action='append', type=str,
+                                help='A hostclass to bake, may be given more than once')
+    parser_bakeall.add_argument('--max-parallel', dest='max_parallel', type=int, default=BAKE_MAX_PARALLEL,
+                                help='Maximum number of bakes to run at once')
+    parser_bakeall.add_argument('--max-attempts', dest='max_attempts', type=int, default=BAKE_MAX_ATTEMPTS,
+                                help='Number of times to try baking each hostclass')
+    parser_bakeall.add_argument('--no-destroy', dest='no_destroy', action='store_const', const=True,
+                                default=False, help='If bake fails do not terminate instance')
+    parser_bakeall.add_argument("--stage", dest="stage", default=None,
+                                help="Which stage to tag baked amis with", type=str)
+    parser_bakeall.add_argument('--use-local-ip', dest='use_local_ip', action='store_const',
+                                const=True, default=False,
+                                help="Use instances' local ip address for operations. "
+                                "Set this flag when baking from same subnet as where the baking is occuring.")
+    parser_bakeall.add_argument('--tag', dest='tags', required=False, action='append', type=str, default=[],
+                                help='The key:value pair used to tag the AMIs '
+                                     '(Example: --tag application:dnext)')
+    parser_bakeall.add_argument('--private', dest='is_private', action='store_const', const=True,
+                                default=False, help='Tag the baked amis as "private".')
+    parser_bakeall.add_argument('--results-file', dest='results_file', type=str, default=None,
+                                help='Also write one "hostclass ami_id attempts seconds" line per bake '
+                                     'to this file, with "-" as the ami_id of failed bakes')
+    parser_bakeall.add_argument('--log-dir', dest='log_dir', type=str, default=None,
+                                help='Also write the log of each bake to <log dir>/<hostclass>.log')
+
     parser_create = subparsers.add_parser(
         'create', help="Create a hostclass",
         description="Creates the necessary bits for a generic hostclass")
@@ -149,6 +179,22 @@ def run():
         bakery = DiscoBake(use_local_ip=args.use_local_ip)
         bakery.bake_ami(args.hostclass, args.no_destroy, args.source_ami, args.stage, args.is_private,
                         extra_tags=extra_tags)
+    elif args.mode == "bakeall":
+        extra_tags = OrderedDict(tag.split(':', 1) for tag in args.tags)
+        bakery = DiscoBake(use_local_ip=args.use_local_ip)
+        results = bakery.bake_amis(args.hostclasses, args.no_destroy, args.stage, args.is_private,
+                                   extra_tags=extra_tags, max_parallel=args.max_parallel,
+                                   max_attempts=args.max_attempts, log_dir=args.log_dir)
+        print_table(headers=["Hostclass", "AMI", "Attempts", "Seconds"],
+                    rows=[{"Hostclass": result.hostclass, "AMI": result.ami_id, "Attempts": result.attempts,
+                           "Seconds": result.seconds} for result in results])
+        if args.results_file:
+            with open(args.results_file, "w") as results_file:
+                for result in results:
+                    results_file.write("{0}\t{1}\t{2}\t{3}\n".format(
+                        result.hostclass, result.ami_id or '-', result.attempts, result.seconds))
+        if not all(result.ami_id for result in results):
+            sys.exit(1)
     elif args.mode == "create":
         HostclassTemplating.create_hostclass(args.hostclass)
     elif args.mode == "promote":
@@ -12,6 +12,14 @@ from disco_aws_automation.disco_config import read_config
 from disco_aws_automation import DiscoChaos
 
 
+def positive_int(value):
+    '''Parses a command line argument that must be a whole number of at least 1'''
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{0} is not a positive number".format(value))
+    return number
+
+
 def get_parser():
     '''Returns command line parser'''
     parser = argparse.ArgumentParser(description='Disco Chaos, instance killer')
@@ -25,6 +33,10 @@ def get_parser():
     parser.add_argument('--retainage', dest='retainage', required=False,
                         help='Machines in each hostclass to retain (percent)',
                         default=0.0, type=float)
+    parser.add_argument('--seed', dest='seed', required=False, default=None, type=int,
+                        help='Seed of the instance selection, the same seed picks the same instances')
+    parser.add_argument('--per-minute', dest='per_minute', required=False, default=None, type=positive_int,
+                        help='Terminate instances in waves of this many instances a minute')
     region_env_group = parser.add_mutually_exclusive_group()
     region_env_group.add_argument('--env', dest='env', type=str, default=None,
                                   help="The name of a VPC to operate in. " +
@@ -42,12 +54,12 @@ def run():
 
     env_name = args.env or config.get("disco_aws", "default_environment")
 
-    chaos = DiscoChaos(config, env_name, args.level, args.retainage)
+    chaos = DiscoChaos(config, env_name, args.level, args.retainage, seed=args.seed)
     instances = chaos.get_instances_to_terminate()
     for inst in instances:
         print("{0:20} {1}".format(inst.tags.get('hostclass'), inst.id))
     if not args.dryrun:
-        chaos.terminate(instances)
+        chaos.terminate(instances, per_minute=args.per_minute)
 
 if __name__ == "__main__":
     run_gracefully(run)
@@ -6,9 +6,10 @@ Usage:
     disco_deploy.py [options] test --pipeline PIPELINE
                     [--environment ENV] [--ami AMI] [--hostclass HOSTCLASS] [--allow-any-hostclass]
                     [--strategy STRATEGY] [--ticket TICKETID] [--deployable DEPLOYABLE]
+                    [--all-hostclasses] [--max-parallel MAX]
     disco_deploy.py [options] update --pipeline PIPELINE --environment ENV
                     [--ami AMI] [--hostclass HOSTCLASS] [--allow-any-hostclass] [--strategy STRATEGY]
-                    [--ticket TICKETID] [--deployable DEPLOYABLE]
+                    [--ticket TICKETID] [--deployable DEPLOYABLE] [--all-hostclasses] [--max-parallel MAX]
     disco_deploy.py [options] list (--tested|--untested|--failed|--failures|--testable)
                     [--pipeline PIPELINE] [--environment ENV] [--ami AMI] [--hostclass HOSTCLASS]
                     [--allow-any-hostclass]
@@ -41,6 +42,11 @@ Options:
                             instance is not deployable, the old ASG is retained and the new ASG is deleted.
                             Otherwise, if it is deployable, the new ASG is retained and the old ASG is
                             deleted.
+     --all-hostclasses      Test or update every hostclass with a new AMI instead of just one. Hostclasses
+                            are deployed in order of their pipeline sequence, those with the same
+                            sequence concurrently, and a summary is printed at the end.
+     --max-parallel MAX     Maximum number of hostclasses to deploy at once with --all-hostclasses
+                            [default: 4]
 
      --tested               List of latest tested AMI for each hostclass
      --untested             List of latest untested AMI for each hostclass
@@ -83,6 +89,7 @@ def run():
     env = args["--environment"] or config.get("disco_aws", "default_environment")
 
     force_deployable = None if args["--deployable"] is None else is_truthy(args["--deployable"])
+    max_parallel = int(args["--max-parallel"])
 
     pipeline_definition = []
     if args["--pipeline"]:
@@ -117,14 +124,16 @@ def run():
     if args["test"]:
         try:
             deploy.test(dry_run=args["--dry-run"], deployment_strategy=args["--strategy"],
-                        ticket_id=args["--ticket"], force_deployable=force_deployable)
+                        ticket_id=args["--ticket"], force_deployable=force_deployable,
+                        all_hostclasses=args["--all-hostclasses"], max_parallel=max_parallel)
         except RuntimeError as err:
             logger.error(str(err))
             sys.exit(1)
     elif args["update"]:
         try:
             deploy.update(dry_run=args["--dry-run"], deployment_strategy=args["--strategy"],
-                          ticket_id=args["--ticket"], force_deployable=force_deployable)
+                          ticket_id=args["--ticket"], force_deployable=force_deployable,
+                          all_hostclasses=args["--all-hostclasses"], max_parallel=max_parallel)
         except RuntimeError as err:
             logger.error(str(err))
             sys.exit(1)
@@ -10,6 +10,7 @@ from disco_aws_automation.disco_aws_util import run_gracefully
 from disco_aws_automation.disco_vpc import DiscoVPC
 from disco_aws_automation.disco_config import read_config
 from disco_aws_automation.disco_logging import configure_logging
+from disco_aws_automation.disco_rds import RDS_MAX_PARALLEL_UPDATES
 
 
 # R0912 Allow more than 12 branches so we can parse a lot of commands..
@@ -34,6 +35,9 @@ def get_parser():
                                      help='Cluster name (RDS Database Instance Identifier)')
     parser_update_group.add_argument('--parallel', dest='parallel', action='store_const', const=True,
                                      default=False, help='Update clusters in parallel')
+    parser_update.add_argument('--max-parallel', dest='max_parallel', type=int,
+                               default=RDS_MAX_PARALLEL_UPDATES,
+                               help='Maximum number of clusters to update at once when running in parallel')
 
     # List Mode
     parser_list = subparsers.add_parser("list", help="List RDS clusters in an environment")
@@ -101,7 +105,7 @@ def run():
         if args.cluster:
             rds.update_cluster_by_id(args.cluster)
         else:
-            rds.update_all_clusters_in_vpc(parallel=args.parallel)
+            rds.update_all_clusters_in_vpc(parallel=args.parallel, max_workers=args.max_parallel)
     elif args.mode == "delete":
         rds.delete_db_instance(args.cluster, skip_final_snapshot=args.skip_final_snapshot)
     elif args.mode == "cleanup_snapshots":
@@ -15,12 +15,23 @@ Options:
      --env ENV              Environment to operate in
      --first                In case of multiple matching instances, connect to the first instead of failing
      -u --user USER         The user to login as
+     --refresh              Look up the instances in EC2 instead of using the cached lookups
+
+Instances and the jump host address are cached in ~/.asiaq/ssh_lookups. Cached lookups are used without
+asking EC2, and are refreshed in the background when they are older than a few minutes. Lookups older
+than about twenty minutes, a host that is not in the cache, and a cached route that turns out to be wrong
+(an unreachable jump host, or ssh failing to connect) are looked up in EC2 again.
 """
 
+import json
 import logging
 import os
 import re
 import socket
+import stat
+import tempfile
+import threading
+import time
 
 from docopt import docopt
 
@@ -32,11 +43,17 @@ from disco_aws_automation.disco_logging import configure_logging
 logger = logging.getLogger(__name__)
 
 SSH_OPTIONS = "-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=7"
+SSH_LOOKUP_CACHE_DIR = os.path.expanduser("~/.asiaq/ssh_lookups")
+SSH_LOOKUP_CACHE_TTL = 300  # seconds cached lookups are used before they are refreshed in the background
+SSH_LOOKUP_CACHE_MAX_AGE = 4 * SSH_LOOKUP_CACHE_TTL  # seconds after which cached lookups aren't used at all
+SSH_LOOKUP_KEYS = ("fetched", "instances", "jump_address")
+SSH_CONNECTION_ERROR = 255  # exit status of ssh when it fails to connect
 
 
 class DiscoSSH(object):
     """Utility class for ssh-ing into AWS hosts"""
-    _instances = None  # lazily initialized
+    _lookups = None  # lazily initialized
+    _lookups_fetched = False  # True once the lookups were fetched from EC2 by this process
     _aws = None  # lazily initialized
 
     def __init__(self, args):
@@ -58,29 +75,117 @@ class DiscoSSH(object):
             self._aws = DiscoAWS(self.config, self.env)
         return self._aws
 
+    def _cache_path(self):
+        return os.path.join(SSH_LOOKUP_CACHE_DIR, "{0}.json".format(self.env))
+
+    def _load_lookups(self):
+        """Returns the cached lookups of the environment, or None if there are none or they are unreadable"""
+        try:
+            with open(self._cache_path()) as cache_file:
+                lookups = json.load(cache_file)
+        except (IOError, ValueError):
+            return None
+        if not isinstance(lookups, dict) or not all(key in lookups for key in SSH_LOOKUP_KEYS):
+            logger.debug("Ignoring malformed cached instance lookups of %s", self.env)
+            return None
+        return lookups
+
+    def _save_lookups(self, lookups):
+        """Caches the lookups, the cache is an optimization so failing to write it is not an error"""
+        try:
+            if not os.path.isdir(SSH_LOOKUP_CACHE_DIR):
+                os.makedirs(SSH_LOOKUP_CACHE_DIR)
+            os.chmod(SSH_LOOKUP_CACHE_DIR, stat.S_IRWXU)
+            # write to a temporary file and rename it so concurrent processes never read a partial cache
+            handle, temp_path = tempfile.mkstemp(dir=SSH_LOOKUP_CACHE_DIR)
+            with os.fdopen(handle, "w") as cache_file:
+                json.dump(lookups, cache_file)
+            os.rename(temp_path, self._cache_path())
+        except (IOError, OSError) as err:
+            logger.debug("Not caching instance lookups: %s", err)
+
+    def _fetch_lookups(self, aws):
+        """
+        Fetches the instances in the environment and the jump host address from EC2, and caches them.
+        Only what is needed to pick a route to an instance is kept.
+        """
+        lookups = {
+            "fetched": time.time(),
+            "instances": [
+                {
+                    "id": instance.id,
+                    "hostname": instance.tags.get("hostname"),
+                    "hostclass": instance.tags.get("hostclass"),
+                    "ip_address": instance.ip_address,
+                    "private_ip_address": instance.private_ip_address,
+                    "interface_ips": [interface.private_ip_address for interface in instance.interfaces]
+                }
+                for instance in aws.instances()
+            ],
+            "jump_address": aws.find_jump_address()
+        }
+        self._save_lookups(lookups)
+        return lookups
+
+    def lookups(self):
+        """
+        Lazily loads the cached instance lookups of the environment, fetching them from EC2 if there are
+        none or they are older than SSH_LOOKUP_CACHE_MAX_AGE. Lookups older than SSH_LOOKUP_CACHE_TTL are
+        used, and refreshed in the background for the next run.
+        """
+        if self._lookups is None:
+            cached = None if self.args.get("--refresh") else self._load_lookups()
+            if cached is None or time.time() - cached["fetched"] >= SSH_LOOKUP_CACHE_MAX_AGE:
+                self.refresh_lookups()
+            else:
+                self._lookups = cached
+                if time.time() - cached["fetched"] >= SSH_LOOKUP_CACHE_TTL:
+                    logger.debug("Refreshing cached instance lookups of %s in the background", self.env)
+                    # not a daemon thread, so the refresh finishes even if ssh exits first
+                    threading.Thread(target=self._refresh_cache).start()
+        return self._lookups
+
+    def refresh_lookups(self):
+        """Fetches the instance lookups from EC2, replacing the ones in use"""
+        logger.info("Fetching info about instances in %s", self.env)
+        self._lookups = self._fetch_lookups(self.aws())
+        self._lookups_fetched = True
+
+    def _refresh_cache(self):
+        """
+        Fetches the instance lookups from EC2 for the next run. This runs in the background while the
+        ssh session is open, so it is quiet about failures and uses its own connection to EC2.
+        """
+        try:
+            self._fetch_lookups(DiscoAWS(self.config, self.env))
+        except Exception:
+            logger.debug("Failed to refresh cached instance lookups of %s", self.env, exc_info=True)
+
     def instances(self):
-        """Lazily fetches all instances in the environment"""
-        if not self._instances:
-            logger.info("Fetching info about instances in %s", self.env)
-            self._instances = self.aws().instances()
-        return self._instances
+        """Returns the lookups of all instances in the environment"""
+        return self.lookups()["instances"]
 
     def match_instance(self, host_string):
         """
         Returns the instance that matches the given host string, or None.
-        Matches on hostname or hostclass substring.
+        Matches on hostname or hostclass substring, looking the instances up in EC2 again if
+        nothing in the cached lookups matches.
         Raises ValueError if more than one match.
         """
         matched_instances = []
         names = []
         hostclasses = set()
         for i in self.instances():
-            if host_string in i.tags.get("hostclass", "") or host_string in i.tags.get("hostname", ""):
+            if host_string in (i["hostclass"] or "") or host_string in (i["hostname"] or ""):
                 matched_instances.append(i)
-                names.append(i.tags.get("hostname") or i.id)
-                hostclasses.add(i.tags.get("hostclass", "MISSING_HOSTCLASS"))
+                names.append(i["hostname"] or i["id"])
+                hostclasses.add(i["hostclass"] or "MISSING_HOSTCLASS")
 
         if not matched_instances:
+            if not self._lookups_fetched:
+                logger.debug("No cached instance matched %s", host_string)
+                self.refresh_lookups()
+                return self.match_instance(host_string)
             return None
         elif len(matched_instances) == 1:
             return matched_instances[0]
@@ -101,13 +206,15 @@ class DiscoSSH(object):
             sock = socket.create_connection((ip_address, 22), timeout=2)
             sock.close()
             return True
-        except socket.timeout:
+        except socket.error:  # includes timeouts, and a cached address may no longer be routable
             return False
 
     def detect_best_route(self, host):
         """
         Detects the best way to ssh into an instance. Returns a list of ip addresses where
-        we should tunnel through the first n-1 hosts to reach the n-th host
+        we should tunnel through the first n-1 hosts to reach the n-th host.
+        The cached route is trusted unless the cached jump host can't be reached, in which case the
+        lookups are fetched from EC2 again.
         """
         if self.is_ip(host):
             return [host]  # if user gave an ip, we assume they explicitly want to go there without jumping
@@ -116,21 +223,27 @@ class DiscoSSH(object):
         if not instance:
             raise EasyExit("No instances in the {} environment matched '{}'".format(self.env, host))
 
-        logger.info("Detecting best route to %s", instance.tags.get("hostname"))
+        logger.info("Detecting best route to %s", instance["hostname"])
 
-        if self.is_reachable(instance.ip_address):  # ip_address is actually the public ip address (or None)
-            return [instance.ip_address]
+        # ip_address is actually the public ip address (or None)
+        if self.is_reachable(instance["ip_address"]):
+            return [instance["ip_address"]]
 
-        for interface in instance.interfaces:
-            if self.is_reachable(interface.private_ip_address):
-                return [interface.private_ip_address]
+        for interface_ip in instance["interface_ips"]:
+            if self.is_reachable(interface_ip):
+                return [interface_ip]
 
         logger.info("No direct route. Trying jump host.")
-        jump_host_ip = self.aws().find_jump_address()
+        jump_host_ip = self.lookups()["jump_address"] or self.aws().find_jump_address()
         if not jump_host_ip:
             raise EasyExit("No direct route to host and no jump host in {}".format(self.env))
 
-        return [jump_host_ip, instance.private_ip_address]
+        if not self._lookups_fetched and not self.is_reachable(jump_host_ip):
+            logger.info("Cached jump host %s is unreachable", jump_host_ip)
+            self.refresh_lookups()
+            return self.detect_best_route(host)
+
+        return [jump_host_ip, instance["private_ip_address"]]
 
     def build_ssh_cmd(self, ips):
         """
@@ -148,10 +261,18 @@ class DiscoSSH(object):
         """Parses command line and dispatches the commands"""
         host = self.args["<host>"]
 
-        ips = self.detect_best_route(host)
+        status = self._ssh(self.detect_best_route(host))
+        # a route picked from cached lookups may be out of date if ssh failed to connect
+        if status == SSH_CONNECTION_ERROR and not self.is_ip(host) and not self._lookups_fetched:
+            logger.info("Failed to connect to %s, looking it up again", host)
+            self.refresh_lookups()
+            self._ssh(self.detect_best_route(host))
+
+    def _ssh(self, ips):
+        """Runs ssh to the last ip, through the others, and returns its exit status"""
         cmd = self.build_ssh_cmd(ips)
         logger.info("Now ssh-ing: %s", cmd)
-        os.system(cmd)
+        return os.WEXITSTATUS(os.system(cmd))
 
 if __name__ == "__main__":
     disco_ssh = DiscoSSH(docopt(__doc__))
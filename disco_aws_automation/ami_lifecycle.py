@@ -0,0 +1,125 @@
+"""
+Bulk AMI lifecycle operations: deregistering AMIs, deleting their snapshots and sharing them with
+other accounts.
+"""
+import logging
+import time
+
+from boto.exception import EC2ResponseError
+
+from .exceptions import AMIError
+from .resource_helper import throttled_call, parallel_map, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+AMI_LIFECYCLE_MAX_WORKERS = 8
+AMI_LIFECYCLE_CALLS_PER_SECOND = 5
+SNAPSHOT_DELETE_MAX_TIME = 10  # seconds to keep retrying a snapshot that is still in use
+SNAPSHOT_DELETE_RETRY_INTERVAL = 0.5  # seconds between attempts at deleting a snapshot still in use
+
+
+class AMILifecyclePlan(object):
+    """
+    Plans the deregistrations, snapshot deletions and launch permission grants of a cleanup or
+    promotion run, so their cost can be reported before they are made, and then makes them on a
+    bounded pool of workers that together make at most calls_per_second API calls.
+
+    Deregistrations and grants are made first. The snapshots of an AMI are only deleted once
+    the AMI was deregistered, as AWS refuses to delete the snapshots of a registered AMI.
+    """
+
+    def __init__(self, connection, max_workers=AMI_LIFECYCLE_MAX_WORKERS,
+                 calls_per_second=AMI_LIFECYCLE_CALLS_PER_SECOND):
+        """
+        :param connection: Boto ec2 connection to delete snapshots with.
+        :param max_workers: Maximum number of API calls in flight at once.
+        :param calls_per_second: Maximum number of API calls started each second.
+        """
+        self._connection = connection
+        self._max_workers = max_workers
+        self._calls_per_second = calls_per_second
+        self._rate_limiter = RateLimiter(calls_per_second)
+        self._deregistrations = []  # AMIs
+        self._snapshot_ids = {}  # AMI id -> ids of the snapshots to delete once it is deregistered
+        self._grants = []  # (AMI, account ids)
+
+    def deregister(self, ami):
+        """Plans deregistering an AMI and deleting its snapshots"""
+        self._deregistrations.append(ami)
+        self._snapshot_ids[ami.id] = [bdm.snapshot_id for bdm in ami.block_device_mapping.values()
+                                      if bdm.snapshot_id]
+
+    def grant_launch_permissions(self, ami, account_ids):
+        """Plans allowing the accounts to launch an AMI, with a single call for all the accounts"""
+        if account_ids:
+            self._grants.append((ami, list(account_ids)))
+
+    @property
+    def call_count(self):
+        """Number of API calls the plan makes"""
+        return (len(self._deregistrations) + len(self._grants) +
+                sum(len(snapshot_ids) for snapshot_ids in self._snapshot_ids.values()))
+
+    def describe(self):
+        """Returns a one line summary of the plan and its cost"""
+        return ("{0} AMI deregistrations, {1} snapshot deletions and {2} launch permission grants: "
+                "{3} API calls, at least {4:.0f}s at {5} calls per second").format(
+                    len(self._deregistrations),
+                    sum(len(snapshot_ids) for snapshot_ids in self._snapshot_ids.values()),
+                    len(self._grants), self.call_count, float(self.call_count) / self._calls_per_second,
+                    self._calls_per_second)
+
+    def execute(self):
+        """
+        Makes the planned calls. A failed call does not stop the others, but an AMIError
+        describing the failures is raised once all calls were attempted.
+        """
+        logger.info("Executing plan: %s", self.describe())
+        failures = []
+
+        def _deregister(ami):
+            try:
+                self._rate_limiter.wait()
+                throttled_call(ami.deregister)
+                return ami.id
+            except Exception as err:
+                logger.exception("Failed to deregister AMI %s", ami.id)
+                failures.append("deregister {0}: {1}".format(ami.id, err))
+                return None
+
+        def _grant(grant):
+            ami, account_ids = grant
+            try:
+                self._rate_limiter.wait()
+                logger.warning("Permitting %s to be launched by accounts %s", ami.id, account_ids)
+                throttled_call(ami.set_launch_permissions, account_ids)
+            except Exception as err:
+                logger.exception("Failed to grant launch permissions on AMI %s", ami.id)
+                failures.append("grant {0}: {1}".format(ami.id, err))
+
+        def _delete_snapshot(snapshot_id):
+            try:
+                stop_time = time.time() + SNAPSHOT_DELETE_MAX_TIME
+                while True:
+                    self._rate_limiter.wait()
+                    try:
+                        throttled_call(self._connection.delete_snapshot, snapshot_id)
+                        return
+                    except EC2ResponseError as err:
+                        # the AMI using the snapshot may not be fully deregistered yet
+                        if err.error_code != "InvalidSnapshot.InUse" or time.time() >= stop_time:
+                            raise
+                    time.sleep(SNAPSHOT_DELETE_RETRY_INTERVAL)
+            except Exception as err:
+                logger.exception("Failed to delete snapshot %s", snapshot_id)
+                failures.append("delete {0}: {1}".format(snapshot_id, err))
+
+        deregistered = parallel_map(_deregister, self._deregistrations, max_workers=self._max_workers)
+        parallel_map(_grant, self._grants, max_workers=self._max_workers)
+        snapshot_ids = [snapshot_id for ami_id in deregistered if ami_id
+                        for snapshot_id in self._snapshot_ids[ami_id]]
+        parallel_map(_delete_snapshot, snapshot_ids, max_workers=self._max_workers)
+
+        if failures:
+            raise AMIError("{0} of {1} AMI lifecycle calls failed: {2}".format(
+                len(failures), self.call_count, "; ".join(failures)))
@@ -13,9 +13,9 @@ from . import DiscoVPC, DiscoAWS
 from .disco_aws_util import read_pipeline_file, graceful
 from .disco_logging import configure_logging
 from .disco_config import read_config, normalize_path
-from .disco_dynamodb import AsiaqDynamoDbBackupManager
+from .disco_dynamodb import AsiaqDynamoDbBackupManager, DYNAMODB_BACKUP_MAX_PARALLEL
 from .disco_datapipeline import AsiaqDataPipelineManager
-from .exceptions import AsiaqConfigError
+from .exceptions import AsiaqConfigError, EasyExit
 
 
 class CliCommand(object):
@@ -127,7 +127,13 @@ class DynamoDbBackupCommand(CliCommand):
                                           help="Configure backup to S3 for a dynamodb table")
         restore_parser = subsub.add_parser("restore", help="Restore a dynamodb table from an S3 backup")
         for backup_restore_parser in [backup_parser, restore_parser]:
-            backup_restore_parser.add_argument("table_name")
+            backup_restore_parser.add_argument("table_names", metavar="table_name", nargs="*",
+                                               help="Table(s) to work on")
+            backup_restore_parser.add_argument("--all-tables", action='store_true',
+                                               help="Work on every table in the environment")
+            backup_restore_parser.add_argument("--max-parallel", type=int,
+                                               default=DYNAMODB_BACKUP_MAX_PARALLEL,
+                                               help="Maximum number of tables to work on at once")
             backup_restore_parser.add_argument("--force-reload", action='store_true',
                                                help="Force recreation of the pipeline content")
             backup_restore_parser.add_argument("--metanetwork", metavar="NAME",
@@ -156,13 +162,32 @@ class DynamoDbBackupCommand(CliCommand):
     def _create_bucket(self, mgr):
         mgr.init_bucket()
 
+    def _get_table_names(self, mgr):
+        table_names = mgr.list_tables() if self.args.all_tables else self.args.table_names
+        if not table_names:
+            raise EasyExit("No tables given: name at least one table or use --all-tables")
+        return table_names
+
     def _restore_backup(self, mgr):
-        mgr.restore_backup(self.args.table_name, self.args.backup_dir,
-                           force_update=self.args.force_reload, metanetwork=self.args.metanetwork)
+        table_names = self._get_table_names(mgr)
+        if len(table_names) == 1:
+            mgr.restore_backup(table_names[0], self.args.backup_dir,
+                               force_update=self.args.force_reload, metanetwork=self.args.metanetwork)
+        elif self.args.backup_dir:
+            raise EasyExit("--from can only be used when restoring a single table")
+        else:
+            mgr.restore_backups(table_names, force_update=self.args.force_reload,
+                                metanetwork=self.args.metanetwork, max_workers=self.args.max_parallel)
 
     def _create_backup(self, mgr):
-        mgr.create_backup(self.args.table_name, force_update=self.args.force_reload,
-                          metanetwork=self.args.metanetwork, backup_period=self.args.backup_period)
+        table_names = self._get_table_names(mgr)
+        if len(table_names) == 1:
+            mgr.create_backup(table_names[0], force_update=self.args.force_reload,
+                              metanetwork=self.args.metanetwork, backup_period=self.args.backup_period)
+        else:
+            mgr.create_backups(table_names, force_update=self.args.force_reload,
+                               metanetwork=self.args.metanetwork, backup_period=self.args.backup_period,
+                               max_workers=self.args.max_parallel)
 
     def _list(self, mgr):
         backups = mgr.list_backups(self.config.environment, self.args.table_name)
@@ -0,0 +1,143 @@
+"""
+Packing of the data files copied onto bake instances
+"""
+import fnmatch
+import hashlib
+import logging
+import os
+import tarfile
+import tempfile
+import time
+
+from .disco_creds import DiscoS3Bucket
+
+logger = logging.getLogger(__name__)
+
+NOSYNC_FILE = ".nosync"
+PAYLOAD_S3_PREFIX = "bake_payload/"
+PAYLOAD_URL_EXPIRATION = 3600  # seconds
+
+
+class BakePayload(object):
+    """
+    A compressed tarball of the data files copied onto bake instances, named by the sha256 of its
+    content so that it is only packed when the files change and can be recognized on the instances.
+
+    Like the rsync this replaces, a .nosync file in a source directory lists patterns of files to
+    leave out of that directory and the ones below it.
+    """
+
+    def __init__(self, sources, cache_dir=None):
+        """
+        :param sources: list of (local directory, directory in the tarball) tuples, the contents of
+                        each local directory are packed under its tarball directory ("" for the top)
+        :param cache_dir: directory where packed tarballs are kept, defaults to a temporary directory
+        """
+        self._sources = sources
+        self._cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "asiaq_bake_payload")
+        self.digest = None
+        self.path = None
+        self.size = None
+
+    def pack(self):
+        """Hashes the source files and packs them into a tarball unless one with that hash is cached"""
+        start_time = time.time()
+        files = list(self._list_files())
+        self.digest = BakePayload._hash_files(files)
+        self.path = os.path.join(self._cache_dir, "{0}.tar.gz".format(self.digest))
+
+        if os.path.exists(self.path):
+            logger.info("Using cached bake payload %s", self.path)
+        else:
+            if not os.path.exists(self._cache_dir):
+                os.makedirs(self._cache_dir)
+            # write to a temporary name first so an interrupted pack is never mistaken for a cached one
+            partial_path = "{0}.{1}.partial".format(self.path, os.getpid())
+            tar = tarfile.open(partial_path, "w:gz")
+            try:
+                for local_path, archive_path in files:
+                    tar.add(local_path, arcname=archive_path, recursive=False)
+            finally:
+                tar.close()
+            os.rename(partial_path, self.path)
+
+        self.size = os.path.getsize(self.path)
+        logger.info("Packed %s files into bake payload %s (%s bytes) in %.1fs",
+                    len(files), self.digest, self.size, time.time() - start_time)
+        return self
+
+    def open(self):
+        """Opens the packed tarball for reading, so it can be streamed rather than read into memory"""
+        return open(self.path, "rb")
+
+    def stage_in_s3(self, bucket_name):
+        """
+        Uploads the packed tarball to the bucket unless it is already there, and returns a url the
+        bake instances can download it from without credentials.
+        """
+        bucket = DiscoS3Bucket(bucket_name)
+        key_name = "{0}{1}.tar.gz".format(PAYLOAD_S3_PREFIX, self.digest)
+        key = bucket.key_exists(key_name)
+        if not key:
+            logger.info("Uploading bake payload %s to s3://%s/%s", self.digest, bucket_name, key_name)
+            key = bucket.bucket.new_key(key_name)
+            key.set_contents_from_filename(self.path)
+        return key.generate_url(PAYLOAD_URL_EXPIRATION)
+
+    def _list_files(self):
+        """Yields (local path, tarball path) of every file and directory to pack, in a stable order"""
+        for source_dir, archive_dir in self._sources:
+            source_dir = os.path.abspath(source_dir)
+            excludes_by_dir = {}
+            for dir_path, dir_names, file_names in os.walk(source_dir):
+                excludes = list(excludes_by_dir.get(os.path.dirname(dir_path), []))
+                nosync_path = os.path.join(dir_path, NOSYNC_FILE)
+                if os.path.isfile(nosync_path):
+                    with open(nosync_path) as nosync_file:
+                        excludes.extend(BakePayload._read_excludes(nosync_file))
+                excludes_by_dir[dir_path] = excludes
+
+                relative_dir = os.path.relpath(dir_path, source_dir)
+                archive_dir_path = os.path.normpath(os.path.join(archive_dir, relative_dir))
+                if archive_dir_path == ".":
+                    archive_dir_path = ""
+                else:
+                    yield dir_path, archive_dir_path
+
+                # prune excluded directories in place so os.walk skips them, and pack symlinked
+                # directories as links the way rsync -a does
+                dir_names[:] = sorted(name for name in dir_names
+                                      if not BakePayload._is_excluded(name, excludes))
+                dir_links = [name for name in dir_names if os.path.islink(os.path.join(dir_path, name))]
+                dir_names[:] = [name for name in dir_names if name not in dir_links]
+                for name in sorted(file_names + dir_links):
+                    if name != NOSYNC_FILE and not BakePayload._is_excluded(name, excludes):
+                        yield os.path.join(dir_path, name), os.path.join(archive_dir_path, name)
+
+    @staticmethod
+    def _read_excludes(nosync_file):
+        """Returns the exclude patterns of a .nosync file, which may be given as rsync "- " rules"""
+        for line in nosync_file:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("+ "):
+                continue
+            yield line[2:] if line.startswith("- ") else line
+
+    @staticmethod
+    def _is_excluded(name, excludes):
+        return any(fnmatch.fnmatch(name, pattern.strip("/")) for pattern in excludes)
+
+    @staticmethod
+    def _hash_files(files):
+        """Returns the sha256 of the paths, modes and contents of the files"""
+        sha = hashlib.sha256()
+        for local_path, archive_path in files:
+            stat = os.lstat(local_path)
+            sha.update("{0}\0{1}\0".format(archive_path, stat.st_mode))
+            if os.path.islink(local_path):
+                sha.update(os.readlink(local_path))
+            elif os.path.isfile(local_path):
+                with open(local_path, "rb") as local_file:
+                    for chunk in iter(lambda: local_file.read(1024 * 1024), b""):
+                        sha.update(chunk)
+        return sha.hexdigest()
@@ -5,7 +5,7 @@ import logging
 
 import boto3
 import botocore
-from .resource_helper import throttled_call
+from .resource_helper import throttled_call, parallel_map, get_boto3_paged_results
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +15,8 @@ CERT_ALT_NAMES_KEY = 'SubjectAlternativeNames'
 DOMAIN_NAME_KEY = 'DomainName'
 CERT_KEY = 'Certificate'
 CERT_ISSUED_DATE_KEY = 'IssuedAt'
+# maximum number of certificates described at the same time when indexing the account's certificates
+ACM_DESCRIBE_MAX_PARALLEL = 8
 
 
 class DiscoACM(object):
@@ -26,31 +28,7 @@ class DiscoACM(object):
 
     def __init__(self, connection=None):
         self._acm = connection
-
-    def _in_domain(self, domain, dns_name):
-        """
-        Returns whether the host is in the ACM certificate domain
-        Only supports top level domain wildcard matching
-        e.g. *.blah.com will match, but not *.*.blah.com
-        It would be good to use a standard library here if becomes available.
-        """
-        if not (domain and dns_name):
-            return False
-
-        # sanity check left-most label
-        name, subdomain = dns_name.split('.', 1)
-        if not name or name == '*':
-            logger.error('Left-most label "%s" of "%s" is invalid', name, dns_name)
-            return False
-
-        # exact match
-        if dns_name == domain:
-            return True
-
-        # handle wildcard cert domains
-        if domain.startswith(self.WILDCARD_PREFIX):
-            domain = domain[len(self.WILDCARD_PREFIX):]
-        return subdomain == domain
+        self._cert_index = None  # lazily built
 
     @property
     def acm(self):
@@ -67,35 +45,62 @@ class DiscoACM(object):
                 return None
         return self._acm
 
-    def get_certificate_arn(self, dns_name):
-        """Returns a Certificate ARN from the Amazon Certificate Service given the DNS name"""
-        if not self.acm:
-            return None
+    def _list_certificate_arns(self):
+        """Returns the ARNs of all the certificates in the account, reading every page of the listing"""
+        return [cert[CERT_ARN_KEY]
+                for cert in get_boto3_paged_results(self.acm.list_certificates, CERT_SUMMARY_LIST_KEY)]
 
-        try:
-            cert_summary = throttled_call(self.acm.list_certificates)[CERT_SUMMARY_LIST_KEY]
+    def _describe_certificate(self, cert_arn):
+        return throttled_call(self.acm.describe_certificate, CertificateArn=cert_arn)[CERT_KEY]
 
-            cert_matches = []
-            for cert in cert_summary:
-                response = throttled_call(self.acm.describe_certificate, CertificateArn=cert[CERT_ARN_KEY])
-                cert = response[CERT_KEY]
-                # search for the dns_name in the cert's alternative domain names (includes the main one)
+    @property
+    def cert_index(self):
+        """
+        Lazily indexes the account's certificates by each of their domain names (including wildcard
+        names), keeping the newest certificate for each name. The certificates are described concurrently.
+        """
+        if self._cert_index is None:
+            certs = parallel_map(self._describe_certificate, self._list_certificate_arns(),
+                                 max_workers=ACM_DESCRIBE_MAX_PARALLEL)
+            cert_index = {}
+            for cert in certs:
+                # the cert's alternative domain names include the main one
                 for alt_name in cert[CERT_ALT_NAMES_KEY]:
-                    if self._in_domain(alt_name, dns_name):
-                        # a tuple of the matching cert domain name and the actual cert
-                        cert_matches.append((alt_name, cert))
+                    indexed = cert_index.get(alt_name)
+                    if not indexed or cert[CERT_ISSUED_DATE_KEY] > indexed[CERT_ISSUED_DATE_KEY]:
+                        cert_index[alt_name] = cert
+            self._cert_index = cert_index
+        return self._cert_index
 
-            # sort the matches by name, longest first, then by issued date, newest first
-            cert_matches.sort(key=lambda cert: (len(cert[0]), cert[1][CERT_ISSUED_DATE_KEY]), reverse=True)
+    def get_certificate_arn(self, dns_name):
+        """Returns a Certificate ARN from the Amazon Certificate Service given the DNS name"""
+        if not self.acm or not dns_name:
+            return None
 
-            if not cert_matches:
-                logger.warning("No ACM certificates returned for %s", dns_name)
-                return None
+        # sanity check left-most label
+        name, _, subdomain = dns_name.partition('.')
+        if not name or name == '*':
+            logger.error('Left-most label "%s" of "%s" is invalid', name, dns_name)
+            return None
 
-            # pick the cert for the longest matched domain name
-            return cert_matches[0][1][CERT_ARN_KEY]
+        try:
+            cert_index = self.cert_index
         except (botocore.exceptions.EndpointConnectionError,
                 botocore.vendored.requests.exceptions.ConnectionError):
             # some versions of botocore(1.3.26) will try to connect to acm even if outside us-east-1
             logger.exception("Unable to get ACM certificate")
             return None
+
+        # the dns name is in a cert for itself, for the wildcard of its parent domain or for its parent
+        # domain. Only top level wildcards match, e.g. *.blah.com but not *.*.blah.com
+        cert_names = [dns_name, self.WILDCARD_PREFIX + subdomain, subdomain] if subdomain else [dns_name]
+        cert_matches = [(cert_name, cert_index[cert_name]) for cert_name in cert_names
+                        if cert_name in cert_index]
+
+        if not cert_matches:
+            logger.warning("No ACM certificates returned for %s", dns_name)
+            return None
+
+        # pick the cert for the longest matched domain name, then the newest
+        _, cert = max(cert_matches, key=lambda match: (len(match[0]), match[1][CERT_ISSUED_DATE_KEY]))
+        return cert[CERT_ARN_KEY]
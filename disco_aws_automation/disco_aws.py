@@ -12,6 +12,7 @@ import dateutil.parser
 import boto
 import boto.ec2
 import boto.ec2.autoscale
+import boto3
 from boto.exception import EC2ResponseError
 
 from .disco_log_metrics import DiscoLogMetrics
@@ -38,7 +39,9 @@ from .disco_remote_exec import DiscoRemoteExec
 from .disco_storage import DiscoStorage
 from .disco_vpc import DiscoVPC
 from .resource_helper import (
+    create_filters,
     keep_trying,
+    run_step_graph,
     wait_for_state,
     throttled_call
 )
@@ -53,6 +56,10 @@ from .exceptions import (
 
 logger = logging.getLogger(__name__)
 
+PROVISION_MAX_PARALLEL = 6
+# most instance ids EC2 takes in one StopInstances or TerminateInstances call
+STOP_BATCH_SIZE = 1000
+
 
 class DiscoAWS(object):
     '''Class orchestrating deployment on AWS'''
@@ -72,6 +79,7 @@ class DiscoAWS(object):
         self._config = config
         self._project_name = self._config.get("disco_aws", "project_name")
         self._connection = boto2_conn or None  # lazily initialized
+        self._boto3_ec2 = None  # lazily initialized
         self._vpc = vpc or None  # lazily initialized
         self._disco_remote_exec = remote_exec or None  # lazily initialized
         self._disco_storage = storage or None  # lazily initialized
@@ -87,6 +95,13 @@ class DiscoAWS(object):
             self._connection = boto.connect_ec2()
         return self._connection
 
+    @property
+    def boto3_ec2(self):
+        """Lazily creates boto3 ec2 client"""
+        if not self._boto3_ec2:
+            self._boto3_ec2 = boto3.client('ec2')
+        return self._boto3_ec2
+
     @property
     def disco_storage(self):
         """Lazily creates disco storage object"""
@@ -162,12 +177,13 @@ class DiscoAWS(object):
         # TODO swap hostclass (default to DEFAULT_CONFIG_SECTION) and option
         """Fetch a hostclass configuration option, if it does not exist get the default"""
         env_option = "{0}@{1}".format(option, self.environment_name)
-        if self._config.has_option(hostclass, env_option):
-            return self._config.get(hostclass, env_option)
-        elif self._config.has_option(hostclass, option):
-            return self._config.get(hostclass, option)
-
-        return self.config_no_default(section=DEFAULT_CONFIG_SECTION, option="default_{0}".format(option))
+        default_option = "default_{0}".format(option)
+        return self._config.get_first_option([
+            (hostclass, env_option),
+            (hostclass, option),
+            (DEFAULT_CONFIG_SECTION, "{0}@{1}".format(default_option, self.environment_name)),
+            (DEFAULT_CONFIG_SECTION, default_option)
+        ])
 
     def hostclass_option_default(self, hostclass, option, default=None):
         """Fetch a hostclass configuration option if it exists, otherwise return value passed in as default"""
@@ -371,33 +387,18 @@ class DiscoAWS(object):
         group_name -- force reuse of an existing autoscaling group
         spotinst -- use AWS autoscaling group or Spotinst elastigroup
         """
-        # It's possible that the ami isn't available yet, so wait here
-        wait_for_state(ami, u'available', 600)
-        # TODO is it necessary to wait here???
-
         is_spotinst = is_truthy(str(spotinst)) or is_truthy(self.config('spotinst', hostclass))
 
         meta_network = self.get_meta_network(hostclass)
         instance_type = instance_type if instance_type else self.get_instance_type(hostclass)
 
-        user_data = self.create_userdata(hostclass, owner, is_spotinst=is_spotinst)
-
-        block_device_mappings = self.get_block_device_mappings(
-            hostclass, ami, extra_space, extra_disk, iops, instance_type
-        )
-
-        self.log_metrics.update(hostclass)
-
-        self.create_floating_interfaces(meta_network, hostclass)
-
         chaos = is_truthy(chaos or self.hostclass_option_default(hostclass, "chaos", "True"))
 
-        elb = self.update_elb(hostclass, update_autoscaling=False, testing=testing)
-
+        owner = owner or getpass.getuser()
         tags = {
             "hostclass": hostclass,
             "application": hostclass,
-            "owner": user_data["owner"],
+            "owner": owner,
             "environment": self.environment_name,
             "environment_class": self.vpc.environment_class,
             "chaos": chaos,
@@ -410,9 +411,10 @@ class DiscoAWS(object):
                 for key, value in [tag.split(':')]:
                     tags[key.strip()] = value.strip()
 
-        target_groups = []
-        if is_truthy(self.hostclass_option_default(hostclass, "target_group", "False")):
-            target_groups = self.elb.get_or_create_target_group(
+        def _create_target_groups(_results):
+            if not is_truthy(self.hostclass_option_default(hostclass, "target_group", "False")):
+                return []
+            return self.elb.get_or_create_target_group(
                 environment=self.environment_name,
                 hostclass=hostclass,
                 port_config=DiscoELBPortConfig.from_config(self, hostclass),
@@ -421,37 +423,73 @@ class DiscoAWS(object):
                 tags=tags
             )
 
-        group = self.discogroup.create_or_update_group(
-            hostclass=hostclass,
-            image_id=ami.id,
-            subnets=self.get_subnets(meta_network, hostclass),
-            key_name=DiscoAWS._nonify(self.hostclass_option(hostclass, "ssh_key_name")),
-            min_size=size_as_minimum_int_or_none(min_size),
-            max_size=size_as_maximum_int_or_none(max_size),
-            desired_size=size_as_maximum_int_or_none(desired_size),
-            instance_profile_name=self.hostclass_option_default(hostclass, "instance_profile_name"),
-            ebs_optimized=self.disco_storage.is_ebs_optimized(instance_type),
-            security_groups=[meta_network.security_group.id],
-            tags=tags,
-            user_data="\n".join(['{0}="{1}"'.format(key, value) for key, value in user_data.iteritems()]),
-            associate_public_ip_address=is_truthy(self.hostclass_option(hostclass, "public_ip")),
-            instance_monitoring=monitoring_enabled,
-            instance_type=instance_type,
-            load_balancers=[elb['LoadBalancerName']] if elb else [],
-            target_groups=target_groups,
-            block_device_mappings=block_device_mappings,
-            create_if_exists=create_if_exists,
-            termination_policies=termination_policies,
-            group_name=group_name,
-            spotinst=is_spotinst,
-            spotinst_reserve=spotinst_reserve
-        )
-
-        self.create_scaling_schedule(min_size, desired_size, max_size, group_name=group['name'])
+        def _create_group(results):
+            user_data = results["user_data"]
+            elb = results["elb"]
+            return self.discogroup.create_or_update_group(
+                hostclass=hostclass,
+                image_id=ami.id,
+                subnets=self.get_subnets(meta_network, hostclass),
+                key_name=DiscoAWS._nonify(self.hostclass_option(hostclass, "ssh_key_name")),
+                min_size=size_as_minimum_int_or_none(min_size),
+                max_size=size_as_maximum_int_or_none(max_size),
+                desired_size=size_as_maximum_int_or_none(desired_size),
+                instance_profile_name=self.hostclass_option_default(hostclass, "instance_profile_name"),
+                ebs_optimized=self.disco_storage.is_ebs_optimized(instance_type),
+                security_groups=[meta_network.security_group.id],
+                tags=tags,
+                user_data="\n".join(['{0}="{1}"'.format(key, value)
+                                     for key, value in user_data.iteritems()]),
+                associate_public_ip_address=is_truthy(self.hostclass_option(hostclass, "public_ip")),
+                instance_monitoring=monitoring_enabled,
+                instance_type=instance_type,
+                load_balancers=[elb['LoadBalancerName']] if elb else [],
+                target_groups=results["target_groups"],
+                block_device_mappings=results["block_device_mappings"],
+                create_if_exists=create_if_exists,
+                termination_policies=termination_policies,
+                group_name=group_name,
+                spotinst=is_spotinst,
+                spotinst_reserve=spotinst_reserve
+            )
 
+        # The lookups overlap waiting for the ami, but the steps that create resources wait for it so
+        # that nothing is created for an ami that never becomes available. Independent steps overlap,
+        # so provisioning takes as long as its slowest chain of steps.
+        steps = [
+            # It's possible that the ami isn't available yet, so wait here
+            ("wait_for_ami", lambda _results: wait_for_state(ami, u'available', 600), []),
+            ("user_data",
+             lambda _results: self.create_userdata(hostclass, owner, is_spotinst=is_spotinst), []),
+            ("block_device_mappings",
+             lambda _results: self.get_block_device_mappings(
+                 hostclass, ami, extra_space, extra_disk, iops, instance_type),
+             ["wait_for_ami"]),
+            ("log_metrics", lambda _results: self.log_metrics.update(hostclass), ["wait_for_ami"]),
+            ("floating_interfaces",
+             lambda _results: self.create_floating_interfaces(meta_network, hostclass), ["wait_for_ami"]),
+            ("elb",
+             lambda _results: self.update_elb(hostclass, update_autoscaling=False, testing=testing),
+             ["wait_for_ami"]),
+            ("target_groups", _create_target_groups, ["wait_for_ami"]),
+            ("group", _create_group,
+             ["user_data", "block_device_mappings", "floating_interfaces", "elb", "target_groups"]),
+            ("scaling_schedule",
+             lambda results: self.create_scaling_schedule(
+                 min_size, desired_size, max_size, group_name=results["group"]['name']),
+             ["group"]),
+        ]
         # Create alarms and custom metrics for the hostclass, if is not being used for testing
         if not testing:
-            self.alarms.create_alarms(hostclass, group['name'])
+            steps.append(("alarms",
+                          lambda results: self.alarms.create_alarms(hostclass, results["group"]['name']),
+                          ["group"]))
+
+        # load what the steps share before fanning out, so that threads don't each load it
+        _ = (self.disco_storage, self.discogroup, self.log_metrics, self.elb,
+             meta_network.disco_subnets, meta_network.security_group)
+
+        group = run_step_graph(steps, max_workers=PROVISION_MAX_PARALLEL)["group"]
 
         logger.info("Spun up %s instances of %s from %s into group %s",
                     size_as_maximum_int_or_none(desired_size), hostclass, ami.id, group['name'])
@@ -480,6 +518,8 @@ class DiscoAWS(object):
 
         instances = [i for i in instances if i.state != u'terminated']
         instance_ids = [i.id for i in instances]
+        id_batches = [instance_ids[start:start + STOP_BATCH_SIZE]
+                      for start in xrange(0, len(instance_ids), STOP_BATCH_SIZE)]
         if instance_ids:
             if terminate:
                 for instance in instances:
@@ -487,10 +527,12 @@ class DiscoAWS(object):
                     if use_autoscaling:
                         self.discogroup.terminate(instance.id)
                 if not use_autoscaling:
-                    throttled_call(self.connection.terminate_instances, instance_ids)
+                    for id_batch in id_batches:
+                        throttled_call(self.connection.terminate_instances, id_batch)
                 logger.info("terminated: %s", instances)
             else:
-                throttled_call(self.connection.stop_instances, instance_ids)
+                for id_batch in id_batches:
+                    throttled_call(self.connection.stop_instances, id_batch)
                 logger.info("stopped: %s", instances)
         else:
             logger.info("No unterminated instances")
@@ -571,6 +613,25 @@ class DiscoAWS(object):
                 for instance in reservation.instances
                 if self.vpc or not instance.vpc_id]
 
+    def instance_pages(self, filters=None):
+        """
+        Yields the instances matching the filter as lists of boto3 instance dicts, one page of
+        DescribeInstances results at a time, so callers can use the first instances before the
+        rest are fetched. Takes the same filters as instances().
+        """
+        combined_filters = {name: values if isinstance(values, list) else [values]
+                            for name, values in (filters or {}).items()}
+        if self.vpc:
+            combined_filters.update({tag['Name']: tag['Values'] for tag in self.vpc.vpc_filters()})
+        paginator = self.boto3_ec2.get_paginator('describe_instances')
+        for page in paginator.paginate(Filters=create_filters(combined_filters)):
+            instances = [instance
+                         for reservation in page['Reservations']
+                         for instance in reservation['Instances']
+                         if self.vpc or not instance.get('VpcId')]
+            if instances:
+                yield instances
+
     def instance_from_hostname(self, hostname):
         """Returns first instance with particular hostname"""
         instances = self.instances(filters={"tag:hostname": hostname})
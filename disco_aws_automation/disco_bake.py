@@ -2,7 +2,7 @@
 AMI bake code."""
 from __future__ import print_function
 from ConfigParser import NoOptionError
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
 from subprocess import check_output
 import datetime
 import logging
@@ -11,6 +11,7 @@ import re
 import time
 import uuid
 from os import path
+from threading import Lock
 
 import boto
 import boto.ec2
@@ -18,8 +19,11 @@ import boto.exception
 import dateutil.parser
 from pytz import UTC
 
+from .ami_lifecycle import AMILifecyclePlan
+from .bake_payload import BakePayload
 from .disco_config import normalize_path, read_config
-from .resource_helper import wait_for_sshable, keep_trying, wait_for_state, throttled_call
+from .disco_logging import add_thread_log_file, remove_log_file
+from .resource_helper import wait_for_sshable, keep_trying, wait_for_state, throttled_call, parallel_map
 from .disco_storage import DiscoStorage
 from .disco_remote_exec import DiscoRemoteExec, SSH_DEFAULT_OPTIONS
 from .disco_vpc import DiscoVPC
@@ -31,6 +35,47 @@ logger = logging.getLogger(__name__)
 
 AMI_NAME_PATTERN = re.compile(r"^\w+\s(?:[0-9]+\s)?[0-9]{10,50}")
 AMI_TAG_LIMIT = 10
+BAKE_MAX_PARALLEL = 8
+BAKE_MAX_ATTEMPTS = 2
+BAKE_PAYLOAD_MARKER = ".asiaq_bake_payload"
+LAUNCH_PERMISSION_MAX_PARALLEL = 8
+
+BakeResult = namedtuple('BakeResult', ['hostclass', 'ami_id', 'attempts', 'seconds'])
+
+
+class BakeContext(object):
+    """
+    Lookups that are the same for every bake made by a DiscoBake, such as the repo instance, the phase 1
+    AMI, storage layouts, subnets and config options. Each is resolved once, even when bakes run
+    concurrently, and reused by the later bakes of the process. Failed lookups are not remembered.
+    """
+
+    def __init__(self):
+        self._values = {}  # (kind, args...) -> value
+        self._locks = {}  # (kind, args...) -> lock held while the value is resolved
+        self._lock = Lock()
+
+    def get(self, key, resolve):
+        """Returns the value remembered for the key, calling resolve() to get it the first time"""
+        if key in self._values:
+            return self._values[key]
+        with self._lock:
+            key_lock = self._locks.setdefault(key, Lock())
+        with key_lock:
+            if key not in self._values:
+                self._values[key] = resolve()
+            return self._values[key]
+
+    def remember(self, key, value):
+        """Remembers a value for the key, as if it had been resolved"""
+        with self._lock:
+            self._values[key] = value
+
+    def forget(self, kind):
+        """Forgets the values of one kind of lookup, so they are resolved again the next time"""
+        with self._lock:
+            for key in [key for key in self._values if key[0] == kind]:
+                del self._values[key]
 
 
 class DiscoBake(object):
@@ -58,6 +103,12 @@ class DiscoBake(object):
 
         self._use_local_ip = use_local_ip
         self._final_stage = None
+        self._snapshot_creation_times = {}  # AMI id -> creation time of its newest snapshot
+        self._prod_amis = {}  # AMI id -> whether all prod accounts may launch it
+        self._context = BakeContext()
+        self._aws_data_payload = None  # lazily packed
+        self._aws_data_payload_url = None
+        self._aws_data_payload_lock = Lock()
 
     @property
     def vpc(self):
@@ -135,6 +186,9 @@ class DiscoBake(object):
 
         output = []
 
+        if in_prod:
+            self.load_prod_amis(amis)
+
         for ami in amis:
             name = ami.name
             creation_time = self.get_ami_creation_time(ami)
@@ -166,7 +220,7 @@ class DiscoBake(object):
 
     def option(self, key):
         '''Returns an option from the [bake] section of the disco_aws.ini config file'''
-        return self._config.get("bake", key)
+        return self._context.get(("option", key), lambda: self._config.get("bake", key))
 
     def option_default(self, key, default=None):
         '''Returns an option from the [bake] section of the disco_aws.ini config file'''
@@ -181,12 +235,15 @@ class DiscoBake(object):
         otherwise it returns that value from the [bake] section if it is set,
         otherwise it returns that value from the DEFAULT_CONFIG_SECTION if it is set.
         '''
-        if self._config.has_option(hostclass, key):
-            return self._config.get(hostclass, key)
-        elif self._config.has_option("bake", key):
-            return self.option(key)
+        def _resolve():
+            if self._config.has_option(hostclass, key):
+                return self._config.get(hostclass, key)
+            elif self._config.has_option("bake", key):
+                return self.option(key)
+
+            return self._config.get(DEFAULT_CONFIG_SECTION, "default_{0}".format(key))
 
-        return self._config.get(DEFAULT_CONFIG_SECTION, "default_{0}".format(key))
+        return self._context.get(("hc_option", hostclass, key), _resolve)
 
     def hc_option_default(self, hostclass, key, default=None):
         """Fetch a hostclass configuration option if it exists, otherwise return value passed in as default"""
@@ -197,6 +254,9 @@ class DiscoBake(object):
 
     def repo_instance(self):
         """ Return active repo instance, else none """
+        return self._context.get(("repo_instance",), self._find_repo_instance)
+
+    def _find_repo_instance(self):
         # TODO Fix the circular dep between DiscoAWS and DiscoBake so we don't have to do this
         from .disco_aws import DiscoAWS
 
@@ -212,7 +272,7 @@ class DiscoBake(object):
 
         remotecmd optionally accepts three additional named arguments:
 
-        stdin -- the bytes to send into program input
+        stdin -- the bytes to send into program input, or a file to stream into it
         nothrow -- when True the method will not throw if the program returns a non-zero result.
         log_on_error -- when True, command output will be logged at the error level on non-zero result.
 
@@ -261,7 +321,7 @@ class DiscoBake(object):
             # hack, we insert a comment into /etc/hosts instead of ip.
             repo_ip = "#None"
         else:
-            repo_ip = self.repo_instance().private_ip_address
+            repo_ip = repo.private_ip_address
 
         self.remotecmd(instance, [script, hostclass, repo_ip, bake_id], log_on_error=True, forward_agent=True)
 
@@ -281,13 +341,14 @@ class DiscoBake(object):
         '''
         Share this AMI with the production accounts
         '''
-        for prod_account in self.option("prod_account_ids").split():
-            logger.warning("Permitting %s to be launched by prod account %s", ami.id, prod_account)
-            ami.set_launch_permissions(prod_account)
+        plan = AMILifecyclePlan(self.connection)
+        plan.grant_launch_permissions(ami, self.option("prod_account_ids").split())
+        plan.execute()
 
         throttled_call(ami.add_tags, {
             'shared_with_account_ids': ','.join(self.option("prod_account_ids").split())
         })
+        self._prod_amis[ami.id] = True
 
     def promote_latest_ami_to_production(self, hostclass):
         """
@@ -300,8 +361,31 @@ class DiscoBake(object):
         """
         True if ami has been granted prod launch permission. To all prod accounts.
         """
+        if ami.id not in self._prod_amis:
+            self._prod_amis[ami.id] = self._resolve_prod_ami(ami)
+        return self._prod_amis[ami.id]
+
+    def load_prod_amis(self, amis, max_parallel=LAUNCH_PERMISSION_MAX_PARALLEL):
+        """
+        Resolves whether each AMI has been granted prod launch permission concurrently, so that
+        later calls to is_prod_ami for these AMIs are answered without an API call.
+        """
+        amis = [ami for ami in amis if ami.id not in self._prod_amis]
+        prod_flags = parallel_map(self._resolve_prod_ami, amis, max_workers=max_parallel)
+        self._prod_amis.update(zip([ami.id for ami in amis], prod_flags))
+
+    def _resolve_prod_ami(self, ami):
+        """
+        Checks the shared_with_account_ids tag written by promote_ami_to_production first, and only
+        looks up the launch permissions of AMIs whose tag does not name all the prod accounts.
+        """
+        prod_accounts = self.option("prod_account_ids").split()
+        shared_with = ami.tags.get("shared_with_account_ids")
+        if prod_accounts and shared_with and not set(prod_accounts) - set(shared_with.split(",")):
+            return True
+
         try:
-            launch_permissions = ami.get_launch_permissions()
+            launch_permissions = throttled_call(ami.get_launch_permissions)
         except boto.exception.EC2ResponseError:
             # Most likely we failed to lookup launch_permissions because its
             # not our AMI. So we assume its not prod executable. This is an
@@ -311,7 +395,6 @@ class DiscoBake(object):
             account[0]
             for account in launch_permissions.values()
         ]
-        prod_accounts = self.option("prod_account_ids").split()
         if prod_accounts and set(prod_accounts) - set(image_account_ids):
             return False
         return True
@@ -335,35 +418,69 @@ class DiscoBake(object):
         except:
             raise AMIError("Could not locate image {0}.".format(ami_id))
 
+    @property
+    def aws_data_payload(self):
+        """
+        Lazily packs the config and asiaq data files copied onto bake instances, once per run,
+        and stages them in the payload_bucket if one is configured.
+        """
+        with self._aws_data_payload_lock:
+            if not self._aws_data_payload:
+                payload = BakePayload(
+                    [(normalize_path(self.option("config_data_source")), ""),
+                     (normalize_path(self.option("asiaq_data_source")), "asiaq")],
+                    cache_dir=self.option_default("payload_cache_dir"))
+                payload.pack()
+                bucket_name = self.option_default("payload_bucket")
+                self._aws_data_payload_url = payload.stage_in_s3(bucket_name) if bucket_name else None
+                self._aws_data_payload = payload
+        return self._aws_data_payload
+
     def copy_aws_data(self, instance):
         """
-        Copies all the files in this repo to the destination instance.
+        Copies all the files in this repo to the destination instance, unless the instance
+        already has the same files from an earlier bake.
         """
         logger.info("Copying discoaws data.")
-        config_data_destination = self.option("data_destination")
-        asiaq_data_destination = self.option("data_destination") + "/asiaq"
-        self.remotecmd(instance, ["mkdir", "-p", asiaq_data_destination])
-        self._rsync(instance,
-                    normalize_path(self.option("config_data_source")),
-                    config_data_destination,
-                    user="root")
-        # Ensure there is a trailing / for rsync to do the right thing
-        asiaq_data_source = re.sub(r'//$', '/', normalize_path(self.option("asiaq_data_source")) + "/")
-        self._rsync(instance,
-                    asiaq_data_source,
-                    asiaq_data_destination,
-                    user="root")
-
-    def _rsync(self, instance, *args, **kwargs):
-        address = instance.private_ip_address if self._use_local_ip else instance.ip_address
-        return self.disco_remote_exec.rsync(address, *args, **kwargs)
+        payload = self.aws_data_payload
+        data_destination = self.option("data_destination")
+        marker = "{0}/{1}".format(data_destination, BAKE_PAYLOAD_MARKER)
+
+        installed, _ = self.remotecmd(instance, ["grep", "-qx", payload.digest, marker], nothrow=True)
+        if installed == 0:
+            logger.info("Instance already has bake payload %s, skipping copy", payload.digest)
+            return
+
+        prepare = "rm -rf {0} && mkdir -p {0}".format(data_destination)
+        extract = "tar -xzf - -C {0}".format(data_destination)
+        finish = "echo {0} > {1}".format(payload.digest, marker)
+        if self._aws_data_payload_url:
+            # curl reads the signed url as its config from stdin, keeping it out of the command lines
+            self.remotecmd(instance, ["{0} && curl -sSf -K - | {1} && {2}".format(prepare, extract, finish)],
+                           stdin='url = "{0}"\n'.format(self._aws_data_payload_url))
+            logger.info("Instance pulled bake payload %s (%s bytes) from S3", payload.digest, payload.size)
+        else:
+            with payload.open() as payload_file:
+                self.remotecmd(instance, ["{0} && {1} && {2}".format(prepare, extract, finish)],
+                               stdin=payload_file)
+            logger.info("Sent bake payload %s (%s bytes) to instance", payload.digest, payload.size)
 
     def _get_phase1_ami_id(self, hostclass):
-        phase1_ami = self.find_ami(self.ami_stages()[-1], self.hc_option(hostclass, "phase1_ami_name"),
-                                   include_private=False)
-        if not phase1_ami:
-            raise AMIError("Couldn't find phase 1 ami.")
-        return phase1_ami.id
+        phase1_ami_name = self.hc_option(hostclass, "phase1_ami_name")
+
+        def _find_phase1_ami_id():
+            phase1_ami = self.find_ami(self.ami_stages()[-1], phase1_ami_name, include_private=False)
+            if not phase1_ami:
+                raise AMIError("Couldn't find phase 1 ami.")
+            return phase1_ami.id
+
+        return self._context.get(("phase1_ami_id", phase1_ami_name), _find_phase1_ami_id)
+
+    def _tunnel_subnet_ids(self):
+        """Ids of the subnets bake instances are started in"""
+        tunnel = self.vpc.networks["tunnel"]
+        _ = tunnel.security_group  # load it along with the subnets rather than in each bake
+        return [disco_subnet.subnet_dict['SubnetId'] for disco_subnet in tunnel.disco_subnets.values()]
 
     def _enable_root_ssh(self, instance):
         # Pylint wants us to name the exceptions, but we want to ignore all of them
@@ -429,13 +546,18 @@ class DiscoBake(object):
 
         image_name = "{0} {1}".format(base_image_name, int(time.time()))
 
-        interfaces = self.vpc.networks["tunnel"].create_interfaces_specification(public_ip=True)
+        # pick a subnet for each bake, so concurrent bakes are spread across the subnets
+        interfaces = self.vpc.networks["tunnel"].create_interfaces_specification(
+            subnet_ids=self._context.get(("tunnel_subnet_ids",), self._tunnel_subnet_ids), public_ip=True)
 
         image = None
 
         # Don't map the snapshot on bake.  Bake scripts shouldn't need the snapshotted volume.
         bake_profile = self.hc_option_default(hostclass, "bake_instance_profile", None)
-        device_map = self.disco_storage.configure_storage(hostclass, ami_id=source_ami_id, map_snapshot=False)
+        # Without the snapshot the storage layout only depends on the source AMI, so bakes can share it.
+        device_map = self._context.get(
+            ("storage", source_ami_id),
+            lambda: self.disco_storage.configure_storage(hostclass, ami_id=source_ami_id, map_snapshot=False))
         reservation = throttled_call(
             self.connection.run_instances,
             source_ami_id,
@@ -510,6 +632,65 @@ class DiscoBake(object):
 
         return image
 
+    def bake_amis(self, hostclasses, no_destroy=False, stage=None, is_private=False, extra_tags=None,
+                  max_parallel=BAKE_MAX_PARALLEL, max_attempts=BAKE_MAX_ATTEMPTS, log_dir=None):
+        """
+        Bakes an AMI for each of the hostclasses, up to max_parallel at a time, and returns a list
+        of BakeResult in the order of the hostclasses. The ami_id of a BakeResult is None if every
+        attempt at baking that hostclass failed.
+
+        Phase 1 hostclasses are baked before any phase 2 hostclass is started, and phase 2 hostclasses
+        are baked from the phase 1 AMIs baked just now rather than from the last promoted ones. A failed
+        bake is retried up to max_attempts times in all. The bakes share this object, so ssh keys, the
+        bakery VPC and config are only loaded once.
+
+        If log_dir is given, the log of each hostclass's bake is also written to <log_dir>/<hostclass>.log.
+        """
+        # load the shared state before fanning out
+        _ = self.vpc, self.disco_remote_exec, self.aws_data_payload, self.repo_instance()
+
+        def _bake(hostclass):
+            log_file = add_thread_log_file(path.join(log_dir, hostclass + ".log")) if log_dir else None
+            try:
+                return _bake_with_retries(hostclass)
+            finally:
+                if log_file:
+                    remove_log_file(log_file)
+
+        def _bake_with_retries(hostclass):
+            start_time = time.time()
+            image = None
+            attempt = 0
+            while not image and attempt < max_attempts:
+                attempt += 1
+                logger.info("Baking %s, attempt %s of %s", hostclass, attempt, max_attempts)
+                try:
+                    image = self.bake_ami(hostclass, no_destroy, stage=stage, is_private=is_private,
+                                          extra_tags=extra_tags or {})
+                except EarlyExitException:
+                    logger.info("Left bake instance of %s running", hostclass)
+                    break
+                except Exception:
+                    logger.exception("Bake attempt %s of %s failed", attempt, hostclass)
+            seconds = int(time.time() - start_time)
+            logger.info("Bake of %s %s after %s attempts in %ss",
+                        hostclass, "succeeded" if image else "failed", attempt, seconds)
+            return BakeResult(hostclass, image.id if image else None, attempt, seconds)
+
+        results = {}
+        for phase in (1, 2):
+            phase_hostclasses = [hostclass for hostclass in hostclasses
+                                 if (int(self.hc_option(hostclass, "phase")) == 1) == (phase == 1)]
+            if phase_hostclasses:
+                logger.info("Baking %s phase %s hostclasses", len(phase_hostclasses), phase)
+            for result in parallel_map(_bake, phase_hostclasses, max_workers=max_parallel):
+                results[result.hostclass] = result
+                if phase == 1 and result.ami_id:
+                    # phase 2 hostclasses name the phase 1 AMI they are baked from by its hostclass
+                    self._context.remember(("phase1_ami_id", result.hostclass), result.ami_id)
+
+        return [results[hostclass] for hostclass in hostclasses]
+
     @staticmethod
     def _tag_ami_with_metadata(ami, hostclass, stage, source_ami_id, productline=None, is_private=False,
                                extra_tags=None):
@@ -616,6 +797,8 @@ class DiscoBake(object):
             if AMI_NAME_PATTERN.match(ami.name):
                 ami_map[DiscoBake.ami_hostclass(ami)].append(ami)
 
+        # Plan the deletions of all hostclasses, then make them together on a bounded pool
+        plan = AMILifecyclePlan(self.connection)
         for hostclass, amis in ami_map.iteritems():
             if restrict_hostclass and hostclass != restrict_hostclass:
                 continue
@@ -628,17 +811,12 @@ class DiscoBake(object):
                 logger.info("Deleting %s AMIs: %s", hostclass, to_delete)
                 for ami in to_delete:
                     self.pretty_print_ami(ami, now)
+                    plan.deregister(ami)
 
-            if not dry_run:
-                orphan_snapshot_ids = []
-                for ami in to_delete:
-                    orphan_snapshot_ids.extend([bdm.snapshot_id for bdm in ami.block_device_mapping.values()
-                                                if bdm.snapshot_id])
-                    ami.deregister()
-
-                # Delete snapshots of all the images we deleted
-                for orphan_snapshot_id in orphan_snapshot_ids:
-                    keep_trying(10, self.connection.delete_snapshot, orphan_snapshot_id)
+        if dry_run:
+            logger.info("Dry run, not making %s", plan.describe())
+        else:
+            plan.execute()
 
     def list_amis_by_instance(self, instances=None):
         """
@@ -721,7 +899,38 @@ class DiscoBake(object):
 
     def get_ami_creation_time_from_snapshots(self, ami):
         """Returns age of newest snapshot attached to an AMI"""
-        snapshots = self.get_snapshots(ami)
+        if ami.id not in self._snapshot_creation_times:
+            self._snapshot_creation_times[ami.id] = DiscoBake._newest_snapshot_time(self.get_snapshots(ami))
+        return self._snapshot_creation_times[ami.id]
+
+    def load_ami_creation_times(self, amis):
+        """
+        Looks up the snapshots of every AMI whose name lacks a creation timestamp in a single call, so that
+        later calls to get_ami_creation_time for these AMIs don't need one call each.
+        """
+        snapshot_ids_by_ami = {
+            ami.id: [value.snapshot_id for value in ami.block_device_mapping.values() if value.snapshot_id]
+            for ami in amis
+            if ami.id not in self._snapshot_creation_times and
+            not DiscoBake.extract_ami_creation_time_from_ami_name(ami)
+        }
+        all_snapshot_ids = list({snapshot_id for snapshot_ids in snapshot_ids_by_ami.values()
+                                 for snapshot_id in snapshot_ids})
+        if not all_snapshot_ids:
+            return
+        try:
+            snapshots = throttled_call(self.connection.get_all_snapshots, snapshot_ids=all_snapshot_ids)
+        except boto.exception.EC2ResponseError:
+            # one of the snapshots is gone, leave these to be looked up one AMI at a time
+            return
+        snapshots_by_id = {snapshot.id: snapshot for snapshot in snapshots}
+        for ami_id, snapshot_ids in snapshot_ids_by_ami.iteritems():
+            self._snapshot_creation_times[ami_id] = DiscoBake._newest_snapshot_time(
+                [snapshots_by_id[snapshot_id] for snapshot_id in snapshot_ids
+                 if snapshot_id in snapshots_by_id])
+
+    @staticmethod
+    def _newest_snapshot_time(snapshots):
         start_times = [dateutil.parser.parse(snapshot.start_time) for snapshot in snapshots]
         return max(start_times).replace(tzinfo=None) if start_times else None
 
@@ -1,20 +1,29 @@
 '''Class that kills instances in a controlled manner'''
 
+import logging
 import random
 import math
+import time
 from . import DiscoAWS
 from .disco_aws_util import is_truthy
 
+logger = logging.getLogger(__name__)
+
+# seconds between the waves of terminate when instances are killed at a rate
+CHAOS_WAVE_INTERVAL = 60
+
 
 class DiscoChaos(object):
     '''Class that kills instances in a controlled manner'''
 
-    def __init__(self, config, environment_name, level, retainage):
+    def __init__(self, config, environment_name, level, retainage, seed=None):
         """
         :param config: Configuration object to use
         :param environment_name: Environment to operate on
         :param level: Percentage of instances to kill
         :param retainage: Percentage of instances to keep in each autoscaling group
+        :param seed: Seed of the instance selection, the same seed picks the same instances from the
+                     same groups. A random seed is used if it is not given.
         """
         self._config = config
         self._level = level
@@ -22,6 +31,9 @@ class DiscoChaos(object):
         self._environment_name = environment_name
         self._disco_aws = None
         self._groups = None
+        self._chaotic_groups = None
+        self.seed = seed if seed is not None else random.randint(0, 2 ** 31)
+        self._random = random.Random(self.seed)
 
     @property
     def disco_aws(self):
@@ -49,11 +61,14 @@ class DiscoChaos(object):
         and returned from this function.
         '''
         keep_count = int(math.floor(group.desired_capacity * (1 - self._retainage * 0.01)))
-        return random.sample(group.instances, keep_count)
+        return self._random.sample(group.instances, keep_count)
 
     def _get_chaotic_groups(self):
-        '''Returns list of autoscaling groups that haven't had chaos disabled'''
-        return [group for group in self._get_autoscaling_groups() if DiscoChaos._has_chaos(group)]
+        '''Returns list of autoscaling groups that haven't had chaos disabled (with caching)'''
+        if self._chaotic_groups is None:
+            self._chaotic_groups = [group for group in self._get_autoscaling_groups()
+                                    if DiscoChaos._has_chaos(group)]
+        return self._chaotic_groups
 
     def _termination_eligible_instances(self):
         '''Returns list of instances eligible for termination'''
@@ -62,19 +77,33 @@ class DiscoChaos(object):
                 for instance in self._instances_not_to_retain(group)]
 
     def _total_instances(self):
-        return sum([len(group.instances) for group in self._get_chaotic_groups()])
+        return sum(len(group.instances) for group in self._get_chaotic_groups())
 
     def _select_instances(self, eligible, count):
         '''Selects a set number of instances'''
-        return random.sample(eligible, min(count, len(eligible)))
+        return self._random.sample(eligible, min(count, len(eligible)))
 
     def get_instances_to_terminate(self):
         '''Returns instances to terminate'''
+        logger.info("Selecting instances to terminate with seed %s", self.seed)
         instance_ids_to_kill = self._select_instances(
             eligible=self._termination_eligible_instances(),
             count=max(int(self._total_instances() * self._level * 0.01), 1))
         return self.disco_aws.instances(instance_ids=instance_ids_to_kill) if instance_ids_to_kill else []
 
-    def terminate(self, instances):
-        '''Terminates instances'''
-        self.disco_aws.terminate(instances)
+    def terminate(self, instances, per_minute=None):
+        '''
+        Terminates instances, all at once or in waves of per_minute instances a minute
+        '''
+        if per_minute is None:
+            self.disco_aws.terminate(instances)
+            return
+        if per_minute < 1:
+            raise ValueError("Can't terminate {0} instances a minute".format(per_minute))
+
+        for start in xrange(0, len(instances), per_minute):
+            if start:
+                time.sleep(CHAOS_WAVE_INTERVAL)
+            wave = instances[start:start + per_minute]
+            logger.info("Terminating %s of %s instances", start + len(wave), len(instances))
+            self.disco_aws.terminate(wave)
@@ -2,10 +2,14 @@
 Package for reading configurations out of standard locations.
 """
 
+import hashlib
+import marshal
 import os
 import os.path
-from ConfigParser import ConfigParser, NoOptionError
+import sys
+from ConfigParser import ConfigParser, Error as ConfigParserError, NoOptionError
 from logging import getLogger
+from StringIO import StringIO
 
 from .exceptions import AsiaqConfigError, ProgrammerError
 from .disco_constants import DEFAULT_CONFIG_SECTION  # this should not be a shared constant, eventually
@@ -13,6 +17,10 @@ from .disco_constants import DEFAULT_CONFIG_SECTION  # this should not be a shar
 ASIAQ_CONFIG = os.getenv("ASIAQ_CONFIG", ".")
 DEFAULT_CONFIG_FILE = "disco_aws.ini"
 _LOG = getLogger(__name__)
+_MISSING = object()  # resolved value of an option that is not set anywhere
+CONFIG_CACHE_DIR = os.getenv("ASIAQ_CONFIG_CACHE", os.path.expanduser("~/.asiaq/config_cache"))
+CONFIG_CACHE_MAX_ENTRIES = 100  # parsed configs kept in CONFIG_CACHE_DIR, the least recently written go first
+_PARSED_CONFIGS = {}  # content digest -> parsed config, for config files read again by this process
 
 
 def read_config(*path_components, **kwargs):
@@ -53,6 +61,82 @@ def normalize_path(*path_components):
         raise AsiaqConfigError("Config path not found: %s" % normalized_path)
 
 
+def parse_config(filename, content):
+    """
+    Returns the parsed form of a config file's content: a dict with the "defaults" and "sections"
+    as lists of (name, [(option, raw value), ...]), and the names of the "hostclasses" sections.
+
+    Parsed configs are cached in CONFIG_CACHE_DIR keyed by the path of the file and the sha256 of its
+    content, so tools run over and over on the same config only parse it once. A cached config is loaded
+    with one read. Only the latest content of each file is kept, and at most CONFIG_CACHE_MAX_ENTRIES
+    parsed configs in all.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    if digest in _PARSED_CONFIGS:
+        return _PARSED_CONFIGS[digest]
+
+    # marshal's format may change between python versions, so they don't share cached configs
+    source = hashlib.sha256(os.path.abspath(filename)).hexdigest()[:16]
+    cache_name = "{0}-{1}.py{2}{3}.marshal".format(source, digest, *sys.version_info[:2])
+    cache_path = os.path.join(CONFIG_CACHE_DIR, cache_name)
+    try:
+        with open(cache_path, "rb") as cache_file:
+            parsed = marshal.loads(cache_file.read())
+    except (IOError, EOFError, ValueError, TypeError):
+        parser = ConfigParser()
+        parser.readfp(StringIO(content), filename)
+        # pylint: disable=protected-access
+        parsed = {
+            "defaults": parser.defaults().items(),
+            "sections": [(section, [(option, value) for option, value in parser._sections[section].items()
+                                    if option != "__name__"])
+                         for section in parser.sections()],
+            "hostclasses": [section for section in parser.sections() if section.startswith("mhc")]
+        }
+        _write_parsed_config(cache_path, parsed)
+        _prune_parsed_configs(cache_name)
+
+    _PARSED_CONFIGS[digest] = parsed
+    return parsed
+
+
+def _write_parsed_config(cache_path, parsed):
+    """Caches a parsed config, the cache is an optimization so failing to write it is not an error"""
+    try:
+        if not os.path.exists(CONFIG_CACHE_DIR):
+            os.makedirs(CONFIG_CACHE_DIR, 0o700)
+        # write to a temporary name first so concurrent tools never load a partial cache file
+        partial_path = "{0}.{1}.partial".format(cache_path, os.getpid())
+        with open(partial_path, "wb") as cache_file:
+            cache_file.write(marshal.dumps(parsed))
+        os.rename(partial_path, cache_path)
+    except (IOError, OSError) as err:
+        _LOG.debug("Not caching parsed config in %s: %s", cache_path, err)
+
+
+def _prune_parsed_configs(kept_name):
+    """
+    Removes the cached parses of earlier contents of the same file as kept_name, then the least recently
+    written ones if there are more than CONFIG_CACHE_MAX_ENTRIES. Failing to remove them is not an error.
+    """
+    source, _, version = kept_name.partition("-")
+    version = version.split(".", 1)[1]
+    try:
+        cache_paths = [os.path.join(CONFIG_CACHE_DIR, name) for name in os.listdir(CONFIG_CACHE_DIR)
+                       if name.endswith(".marshal") and name != kept_name]
+        stale_paths = [cache_path for cache_path in cache_paths
+                       if os.path.basename(cache_path).startswith(source + "-") and
+                       cache_path.endswith(version)]
+        for cache_path in stale_paths:
+            os.remove(cache_path)
+        cache_paths = sorted(set(cache_paths) - set(stale_paths), key=os.path.getmtime)
+        for cache_path in cache_paths[:max(0, len(cache_paths) + 1 - CONFIG_CACHE_MAX_ENTRIES)]:
+            os.remove(cache_path)
+    except OSError as err:
+        # another process may have pruned the same files
+        _LOG.debug("Not pruning parsed configs in %s: %s", CONFIG_CACHE_DIR, err)
+
+
 def open_normalized(*path_components, **kwargs):
     """
     Find a file in the configuration directory and open it.  Non-keyword arguments
@@ -68,6 +152,9 @@ class AsiaqConfig(ConfigParser):
 
     All methods accept an "environment" parameter, but recommended usage is to pass in the
     desired environment name at construction time, rather than at call time.
+
+    Resolved options are remembered per environment, section and option, so repeated lookups are a
+    single dict access. Reading or changing the config forgets them.
     """
 
     S3_BUCKET_BASE_OPTION = 's3_bucket_base'
@@ -75,9 +162,73 @@ class AsiaqConfig(ConfigParser):
     DEFAULT_ENVIRONMENT_OPTION = 'default_environment'
 
     def __init__(self, environment=None):
+        # (environment, section, option) -> value or _MISSING, and ((section, option), ...) -> value or error
+        self._resolved_options = {}
+        self._hostclasses = None  # lazily listed
         ConfigParser.__init__(self)  # ConfigParser is an old-style class
         self._real_environment = environment
 
+    def _forget_resolved(self):
+        self._resolved_options = {}
+        self._hostclasses = None
+
+    def read(self, filenames):
+        """Reads the config files like ConfigParser.read does, using the cache of parsed configs"""
+        if isinstance(filenames, basestring):
+            filenames = [filenames]
+        # the hostclass index is kept up to date if it is known, which it is for an empty config
+        hostclasses = [] if not self._sections and not self._defaults else self._hostclasses
+        parsed_configs = []
+        for filename in filenames:
+            try:
+                with open(filename, "rb") as config_file:
+                    content = config_file.read()
+            except IOError:
+                continue
+            parsed_configs.append((filename, parse_config(filename, content)))
+
+        for _, parsed in parsed_configs:
+            self._load_parsed_config(parsed)
+        self._forget_resolved()
+        if hostclasses is not None:
+            hostclasses = list(hostclasses)
+            for _, parsed in parsed_configs:
+                hostclasses.extend(hostclass for hostclass in parsed["hostclasses"]
+                                   if hostclass not in hostclasses)
+            self._hostclasses = hostclasses
+        return [filename for filename, _ in parsed_configs]
+
+    def _load_parsed_config(self, parsed):
+        """Merges a config returned by parse_config into this one, the way reading another file would"""
+        for option, value in parsed["defaults"]:
+            self._defaults[option] = value
+        for section, options in parsed["sections"]:
+            if section not in self._sections:
+                self._sections[section] = self._dict()
+                self._sections[section]["__name__"] = section
+            for option, value in options:
+                self._sections[section][option] = value
+
+    def readfp(self, fp, filename=None):
+        ConfigParser.readfp(self, fp, filename)
+        self._forget_resolved()
+
+    def add_section(self, section):
+        ConfigParser.add_section(self, section)
+        self._forget_resolved()
+
+    def remove_section(self, section):
+        self._forget_resolved()
+        return ConfigParser.remove_section(self, section)
+
+    def set(self, section, option, value=None):
+        ConfigParser.set(self, section, option, value)
+        self._forget_resolved()
+
+    def remove_option(self, section, option):
+        self._forget_resolved()
+        return ConfigParser.remove_option(self, section, option)
+
     @property
     def environment(self):
         """
@@ -103,6 +254,21 @@ class AsiaqConfig(ConfigParser):
             raise ProgrammerError("Using the 'default' option when 'required' is True makes no sense.")
         if not environment:
             environment = self.environment
+
+        key = (environment, section, option)
+        try:
+            value = self._resolved_options[key]
+        except KeyError:
+            value = self._resolved_options[key] = self._resolve_asiaq_option(option, section, environment)
+
+        if value is not _MISSING:
+            return value
+        if required:
+            raise NoOptionError(option, section)
+        return default
+
+    def _resolve_asiaq_option(self, option, section, environment):
+        """Looks up an option the way get_asiaq_option describes, returning _MISSING if it is not set"""
         env_option = "{0}@{1}".format(option, environment)
         default_option = "default_{0}".format(option)
         default_env_option = "default_{0}".format(env_option)
@@ -115,10 +281,35 @@ class AsiaqConfig(ConfigParser):
             return self.get(DEFAULT_CONFIG_SECTION, default_env_option)
         elif self.has_option(DEFAULT_CONFIG_SECTION, default_option):
             return self.get(DEFAULT_CONFIG_SECTION, default_option)
+        return _MISSING
 
-        if required:
-            raise NoOptionError(option, section)
-        return default
+    def get_first_option(self, candidates):
+        """
+        Get the value of the first of the (section, option) pairs in candidates that is set. If none of
+        them is set the error getting the last one is raised, as ConfigParser.get would raise it.
+
+        This lets callers with their own fallback order have their lookups remembered like the ones of
+        get_asiaq_option.
+        """
+        key = tuple(candidates)
+        try:
+            value = self._resolved_options[key]
+        except KeyError:
+            value = self._resolved_options[key] = self._resolve_first_option(key)
+
+        if isinstance(value, ConfigParserError):
+            raise value
+        return value
+
+    def _resolve_first_option(self, candidates):
+        """Looks up an option the way get_first_option describes, returning the error if it is not set"""
+        for section, option in candidates[:-1]:
+            if self.has_option(section, option):
+                return self.get(section, option)
+        try:
+            return self.get(*candidates[-1])
+        except ConfigParserError as err:
+            return err
 
     def get_asiaq_s3_bucket_name(self, bucket_tag, environment=None, separator='--'):
         """Construct a standardized bucket name based on configured prefix and suffix values."""
@@ -132,5 +323,7 @@ class AsiaqConfig(ConfigParser):
 
     def get_hostclasses_from_section_names(self):
         """Returns list of section names that represent hostclasses"""
-        return [section for section in self.sections()
-                if section.startswith("mhc")]
+        if self._hostclasses is None:
+            self._hostclasses = [section for section in self.sections()
+                                 if section.startswith("mhc")]
+        return list(self._hostclasses)
@@ -244,7 +244,7 @@ class AsiaqDataPipelineManager(object):
         self._dp_client.delete_pipeline(pipelineId=pipeline._id)
 
     def fetch_or_create(self, template_name, pipeline_name, pipeline_description, tags, log_location,
-                        force_update=False, metanetwork=None, availability_zone=None):
+                        force_update=False, metanetwork=None, availability_zone=None, known_pipelines=None):
         """
         If a pipeline with the given tags exists, return it; if not, create one with the given tags
         and name based on the provided pipeline, save it, and return it.
@@ -258,8 +258,16 @@ class AsiaqDataPipelineManager(object):
 
         If force_update is supplied, update the pipeline contents as if we had just created it, rather
         than fetching the existing content.
+
+        If known_pipelines is supplied (typically the result of an earlier call to search_descriptions),
+        the existing pipeline is looked for in that list rather than by searching the whole account.
         """
-        searched = self.search_descriptions(tags=tags)
+        if known_pipelines is None:
+            searched = self.search_descriptions(tags=tags)
+        else:
+            tag_set = set(tags.items())
+            searched = [pipeline for pipeline in known_pipelines
+                        if tag_set.issubset(set((pipeline.get_tag_dict() or {}).items()))]
         subnet_id = None
         if searched:
             if len(searched) > 1:
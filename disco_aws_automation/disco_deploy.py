@@ -4,6 +4,8 @@ import copy
 import logging
 import random
 import sys
+import time
+from collections import defaultdict, namedtuple
 
 from ConfigParser import NoOptionError, NoSectionError
 from abc import ABCMeta, abstractmethod
@@ -22,6 +24,7 @@ from .exceptions import (
     UnknownDeploymentStrategyException
 )
 from .disco_aws_util import is_truthy, size_as_minimum_int_or_none, size_as_maximum_int_or_none
+from .resource_helper import parallel_map
 from .disco_constants import (
     DEFAULT_CONFIG_SECTION,
     DEPLOYMENT_STRATEGY_BLUE_GREEN
@@ -29,6 +32,11 @@ from .disco_constants import (
 
 logger = logging.getLogger(__name__)
 
+DEPLOY_MAX_PARALLEL = 4
+DEFAULT_DEPLOY_SEQUENCE = 1
+
+DeployResult = namedtuple('DeployResult', ['hostclass', 'ami_id', 'status', 'seconds'])
+
 
 def snap_to_range(val, mini, maxi):
     '''Returns a value snapped into [mini, maxi]'''
@@ -64,7 +72,11 @@ class DiscoDeploy(object):
         self._disco_group = discogroup
         self._disco_elb = elb
         self._disco_ssm = ssm
+        # Planning snapshot, loaded at most once per run and shared by the test and update helpers
         self._all_stage_amis = None
+        self._latest_running_amis = None
+        self._images = {}
+        self._ami_creation_times = {}
         self._hostclasses = self._get_hostclasses_from_pipeline_definition(pipeline_definition)
         self._allow_any_hostclass = allow_any_hostclass
 
@@ -104,8 +116,24 @@ class DiscoDeploy(object):
         if not self._all_stage_amis:
             self._all_stage_amis = [ami for ami in self._filter_amis(
                 self._disco_bake.list_amis(ami_ids=self._restrict_amis)) if ami.state == u'available']
+            self._disco_bake.load_ami_creation_times(self._all_stage_amis)
+            self._images.update({ami.id: ami for ami in self._all_stage_amis})
         return self._all_stage_amis
 
+    def get_ami_creation_time(self, ami):
+        '''Returns the creation time of an AMI, looking it up only once per AMI'''
+        if not ami:
+            return None
+        if ami.id not in self._ami_creation_times:
+            self._ami_creation_times[ami.id] = self._disco_bake.get_ami_creation_time(ami)
+        return self._ami_creation_times[ami.id]
+
+    def _get_image(self, ami_id):
+        '''Returns the AMI with the given id, looking it up only if it is not already known'''
+        if ami_id not in self._images:
+            self._images[ami_id] = self._disco_bake.connection.get_image(ami_id)
+        return self._images[ami_id]
+
     def get_latest_ami_in_stage_dict(self, stage):
         '''Returns latest AMI for each hostclass in a specific stage
 
@@ -121,13 +149,13 @@ class DiscoDeploy(object):
                 continue
             hostclass = DiscoBake.ami_hostclass(ami)
             old_ami = latest_ami.get(hostclass)
-            new_time = self._disco_bake.get_ami_creation_time(ami)
+            new_time = self.get_ami_creation_time(ami)
             if not new_time:
                 continue
             if not old_ami:
                 latest_ami[hostclass] = ami
                 continue
-            old_time = self._disco_bake.get_ami_creation_time(old_ami)
+            old_time = self.get_ami_creation_time(old_ami)
             if old_time and (new_time > old_time):
                 latest_ami[hostclass] = ami
         return latest_ami
@@ -152,8 +180,8 @@ class DiscoDeploy(object):
         '''Returns AMIs from second dict which are newer than the corresponding item in the first dict'''
         return [ami for (hostclass, ami) in second.iteritems()
                 if (first.get(hostclass) is None) or (
-                    self._disco_bake.get_ami_creation_time(ami) >
-                    self._disco_bake.get_ami_creation_time(first[hostclass]))]
+                    self.get_ami_creation_time(ami) >
+                    self.get_ami_creation_time(first[hostclass]))]
 
     def get_newest_in_either_map(self, first, second):
         '''Returns AMIs which are newest for each hostclass'''
@@ -161,8 +189,8 @@ class DiscoDeploy(object):
         for (hostclass, ami) in second.iteritems():
             if hostclass not in newest_for_hostclass:
                 newest_for_hostclass[hostclass] = ami
-            elif (self._disco_bake.get_ami_creation_time(ami) >
-                  self._disco_bake.get_ami_creation_time(first[hostclass])):
+            elif (self.get_ami_creation_time(ami) >
+                  self.get_ami_creation_time(first[hostclass])):
                 newest_for_hostclass[hostclass] = ami
         return newest_for_hostclass
 
@@ -178,13 +206,17 @@ class DiscoDeploy(object):
 
     def get_latest_running_amis(self):
         '''Retuns hostclass: ami mapping with latest running AMIs'''
-        running_ami_ids = list({instance.image_id for instance in self._disco_aws.instances()})
-        # excludes private amis
-        running_amis = [ami for ami in self._disco_bake.get_amis(running_ami_ids) if ami.tags.get(
-            "is_private", 'False') == 'False']
-
-        sorted_amis = sorted(running_amis, key=self._disco_bake.get_ami_creation_time)
-        return {DiscoBake.ami_hostclass(ami): ami for ami in sorted_amis}
+        if self._latest_running_amis is None:
+            running_ami_ids = list({instance.image_id for instance in self._disco_aws.instances()})
+            running_amis = self._disco_bake.get_amis(running_ami_ids)
+            self._images.update({ami.id: ami for ami in running_amis})
+            self._disco_bake.load_ami_creation_times(running_amis)
+            # excludes private amis
+            public_amis = [ami for ami in running_amis if ami.tags.get("is_private", 'False') == 'False']
+
+            sorted_amis = sorted(public_amis, key=self.get_ami_creation_time)
+            self._latest_running_amis = {DiscoBake.ami_hostclass(ami): ami for ami in sorted_amis}
+        return self._latest_running_amis
 
     def get_update_amis(self):
         '''
@@ -205,6 +237,11 @@ class DiscoDeploy(object):
         return is_truthy(self._hostclasses[hostclass].get("deployable")) \
             if hostclass in self._hostclasses else hostclass not in self._hostclasses
 
+    def get_sequence(self, hostclass):
+        """Returns the pipeline sequence number of this hostclass, or the default if it has none"""
+        sequence = self._hostclasses[hostclass].get("sequence") if hostclass in self._hostclasses else None
+        return int(sequence) if sequence else DEFAULT_DEPLOY_SEQUENCE
+
     def get_integration_test(self, hostclass):
         """Returns the integration test for this hostclass, or None if none exists"""
         return self._hostclasses[hostclass].get("integration_test") \
@@ -266,7 +303,7 @@ class DiscoDeploy(object):
         launch time will be returned.
         :return: List of instances
         '''
-        hostclass = DiscoBake.ami_hostclass(self._disco_bake.connection.get_image(new_ami_id))
+        hostclass = DiscoBake.ami_hostclass(self._get_image(new_ami_id))
         all_ids = [inst['instance_id'] for inst in self._disco_group.get_instances(hostclass=hostclass)]
         all_instances = self._disco_aws.instances(instance_ids=all_ids)
         return [inst for inst in all_instances
@@ -282,7 +319,7 @@ class DiscoDeploy(object):
         launch time will be returned.
         :return: List of instances
         '''
-        hostclass = DiscoBake.ami_hostclass(self._disco_bake.connection.get_image(new_ami_id))
+        hostclass = DiscoBake.ami_hostclass(self._get_image(new_ami_id))
         all_ids = [inst['instance_id'] for inst in self._disco_group.get_instances(hostclass=hostclass)]
         all_instances = self._disco_aws.instances(filters={"image_id": [new_ami_id]}, instance_ids=all_ids)
         return [inst for inst in all_instances
@@ -297,15 +334,21 @@ class DiscoDeploy(object):
         old_instances = self._get_old_instances(new_ami_id)
         deployed_ami_ids = list(set([instance.image_id for instance in old_instances]))
         images = []
-        for ami_id in deployed_ami_ids:
-            try:
-                images.extend(self._disco_bake.get_amis(image_ids=[ami_id]))
-            except EC2ResponseError as err:
-                if err.code == "InvalidAMIID.NotFound":
-                    logger.warning("Unable to find old AMI %s, it was probably deleted", ami_id)
-                else:
-                    raise
-        return max(images, key=self._disco_bake.get_ami_creation_time).id if images else None
+        try:
+            images = self._disco_bake.get_amis(image_ids=deployed_ami_ids) if deployed_ami_ids else []
+        except EC2ResponseError as err:
+            if err.code != "InvalidAMIID.NotFound":
+                raise
+            # one of the AMIs was deleted, find out which one by looking them up one at a time
+            for ami_id in deployed_ami_ids:
+                try:
+                    images.extend(self._disco_bake.get_amis(image_ids=[ami_id]))
+                except EC2ResponseError as lookup_err:
+                    if lookup_err.code == "InvalidAMIID.NotFound":
+                        logger.warning("Unable to find old AMI %s, it was probably deleted", ami_id)
+                    else:
+                        raise
+        return max(images, key=self.get_ami_creation_time).id if images else None
 
     # This method handles blue/green from end to end, so it has a lot of logic in it. We should at some point
     # look at breaking it up a bit and/or the feasibility of that.
@@ -674,35 +717,59 @@ class DiscoDeploy(object):
                 "Unsupported deployment strategy: {0}".format(desired_deployment_strategy)
             )
 
-    def test(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None):
+    def test(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None,
+             all_hostclasses=False, max_parallel=DEPLOY_MAX_PARALLEL):
         '''
         Tests a single AMI and marks it as tested or failed.
         If the ami id is specified using the option --ami then run test on the specified ami
         independently of its stage,
         Otherwise use the most recent untested ami for the hostclass
+        If all_hostclasses is set, tests the most recent untested ami of every hostclass instead,
+        up to max_parallel hostclasses at a time
         '''
         disco_deploy_helper = DiscoDeployTestHelper(self)
-        disco_deploy_helper.run_deploy(
-            dry_run,
-            deployment_strategy,
-            ticket_id,
-            force_deployable=force_deployable
-        )
+        if all_hostclasses:
+            disco_deploy_helper.run_deploys(
+                dry_run,
+                deployment_strategy,
+                ticket_id,
+                force_deployable=force_deployable,
+                max_parallel=max_parallel
+            )
+        else:
+            disco_deploy_helper.run_deploy(
+                dry_run,
+                deployment_strategy,
+                ticket_id,
+                force_deployable=force_deployable
+            )
 
-    def update(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None):
+    def update(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None,
+               all_hostclasses=False, max_parallel=DEPLOY_MAX_PARALLEL):
         '''
         Updates a single autoscaling group with a newer AMI or AMI specified in the --ami option
         If the ami id is specify using the option --ami then run update using the specified ami
         independently of its stage,
         Otherwise uses the most recent tested or un tagged ami
+        If all_hostclasses is set, updates every hostclass with a newer AMI instead,
+        up to max_parallel hostclasses at a time
         '''
         disco_deploy_helper = DiscoDeployUpdateHelper(self)
-        disco_deploy_helper.run_deploy(
-            dry_run,
-            deployment_strategy,
-            ticket_id,
-            force_deployable=force_deployable
-        )
+        if all_hostclasses:
+            disco_deploy_helper.run_deploys(
+                dry_run,
+                deployment_strategy,
+                ticket_id,
+                force_deployable=force_deployable,
+                max_parallel=max_parallel
+            )
+        else:
+            disco_deploy_helper.run_deploy(
+                dry_run,
+                deployment_strategy,
+                ticket_id,
+                force_deployable=force_deployable
+            )
 
     def hostclass_option(self, hostclass, key):
         '''
@@ -711,13 +778,11 @@ class DiscoDeploy(object):
         minus that prefix, otherwise it returns that value from the DEFAULT_CONFIG_SECTION if it is set.
         '''
         alt_key = key.split("test_").pop()
-        if self._config.has_option(hostclass, key):
-            return self._config.get(hostclass, key)
-        elif self._config.has_option("test", key):
-            return self._config.get("test", key)
-        elif alt_key != key and self._config.has_option("test", alt_key):
-            return self._config.get("test", alt_key)
-        return self._config.get(DEFAULT_CONFIG_SECTION, "default_{0}".format(key))
+        candidates = [(hostclass, key), ("test", key)]
+        if alt_key != key:
+            candidates.append(("test", alt_key))
+        candidates.append((DEFAULT_CONFIG_SECTION, "default_{0}".format(key)))
+        return self._config.get_first_option(candidates)
 
     def hostclass_option_default(self, hostclass, key, default=None):
         """Fetch a hostclass configuration option if it exists, otherwise return value passed in as default"""
@@ -744,12 +809,12 @@ class DiscoDeployHelperBase(object):
         return
 
     @abstractmethod
-    def _get_ami_to_deploy(self):
+    def _get_amis_to_deploy(self):
         """
         If the ami id is specified using the option --ami then return on the specified ami
         independently of its stage,
-        Otherwise uses the most recent tested or un tagged ami
-        :return: Returns the ami to use for the deploy
+        Otherwise uses the most recent tested or un tagged ami of each hostclass
+        :return: Returns the amis that can be deployed, at most one per hostclass
         """
         return
 
@@ -764,10 +829,82 @@ class DiscoDeployHelperBase(object):
         """
         return
 
+    def _get_ami_to_deploy(self):
+        """
+        Picks one of the amis that can be deployed
+        :return: Returns the ami to use for the deploy
+        """
+        amis = self._get_amis_to_deploy()
+        return random.choice(amis) if amis else None
+
     def run_deploy(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None):
         '''
         deploy test or update a single AMI and marks it as tested or failed.
         '''
+        self._deploy_with_soc_event(self._get_ami_to_deploy, dry_run, deployment_strategy, ticket_id,
+                                    force_deployable=force_deployable)
+
+    def run_deploys(self, dry_run=False, deployment_strategy=None, ticket_id=None, force_deployable=None,
+                    max_parallel=DEPLOY_MAX_PARALLEL):
+        '''
+        deploy test or update the AMI of every hostclass that has one, up to max_parallel hostclasses at a
+        time. Hostclasses are deployed in order of their pipeline sequence number, all hostclasses
+        with the same sequence number being deployed concurrently. A failing hostclass does not stop the
+        others in its sequence, but no later sequence is started. A SOC event is sent for every AMI.
+        Raises a RuntimeError naming the hostclasses that failed or were skipped, if any.
+        '''
+        amis = self._get_amis_to_deploy()
+        if not amis:
+            # let the single deploy path report the lack of AMIs
+            self._deploy_with_soc_event(lambda: None, dry_run, deployment_strategy, ticket_id,
+                                        force_deployable=force_deployable)
+            return
+
+        # load the shared state before fanning out so the workers only read it
+        _ = self._disco_deploy.config
+        if not dry_run:
+            self._disco_deploy.get_latest_running_amis()
+
+        amis_by_sequence = defaultdict(list)
+        for ami in amis:
+            amis_by_sequence[self._disco_deploy.get_sequence(DiscoBake.ami_hostclass(ami))].append(ami)
+
+        def _deploy(ami):
+            hostclass = DiscoBake.ami_hostclass(ami)
+            start_time = time.time()
+            status = "ok"
+            try:
+                self._deploy_with_soc_event(lambda: ami, dry_run, deployment_strategy, ticket_id,
+                                            force_deployable=force_deployable)
+            except Exception:
+                logger.exception("Failed to deploy %s for hostclass %s", ami.id, hostclass)
+                status = "failed"
+            return DeployResult(hostclass, ami.id, status, int(time.time() - start_time))
+
+        results = []
+        for sequence in sorted(amis_by_sequence):
+            if any(result.status == "failed" for result in results):
+                results.extend(DeployResult(DiscoBake.ami_hostclass(ami), ami.id, "skipped", 0)
+                               for ami in amis_by_sequence[sequence])
+                continue
+            logger.info("Deploying %s hostclasses of sequence %s",
+                        len(amis_by_sequence[sequence]), sequence)
+            results.extend(parallel_map(_deploy, amis_by_sequence[sequence], max_workers=max_parallel))
+
+        logger.info("%s summary:", self.get_command_name())
+        for result in results:
+            logger.info("%-40s %-21s %-8s %ss",
+                        result.hostclass, result.ami_id, result.status, result.seconds)
+
+        unfinished = [result.hostclass for result in results if result.status != "ok"]
+        if unfinished:
+            raise RuntimeError("Deploy did not complete for hostclasses: {0}".format(" ".join(unfinished)))
+
+    def _deploy_with_soc_event(self, get_ami, dry_run, deployment_strategy, ticket_id, force_deployable=None):
+        '''
+        deploy test or update the AMI returned by get_ami and marks it as tested or failed,
+        sending a SOC event about it.
+        '''
         reason = None
         hostclass = None
         previous_ami_id = None
@@ -782,7 +919,7 @@ class DiscoDeployHelperBase(object):
                                      env=self._disco_deploy.environment_name)
 
         try:
-            ami = self._get_ami_to_deploy()
+            ami = get_ami()
 
             if not ami:
                 if self._disco_deploy._restrict_amis:
@@ -797,9 +934,11 @@ class DiscoDeployHelperBase(object):
             else:
                 hostclass = DiscoBake.ami_hostclass(ami)
                 logger.debug("Deploying new ami %s for hostclass %s.", ami.id, hostclass)
-                previous_ami = self._disco_deploy.get_latest_running_amis().get(hostclass)
-                previous_ami_id = previous_ami.id if previous_ami else ""
-                logger.debug("Previous ami %s.", ami.id)
+                if not dry_run:
+                    # Only needed for the SOC event, which isn't sent on a dry run
+                    previous_ami = self._disco_deploy.get_latest_running_amis().get(hostclass)
+                    previous_ami_id = previous_ami.id if previous_ami else ""
+                    logger.debug("Previous ami %s.", previous_ami_id)
 
                 self._deploy_ami(ami, dry_run, deployment_strategy, force_deployable=force_deployable)
                 status = SocifyHelper.SOC_EVENT_OK
@@ -826,15 +965,14 @@ class DiscoDeployTestHelper(DiscoDeployHelperBase):
     def get_command_name(self):
         return 'test'
 
-    def _get_ami_to_deploy(self):
+    def _get_amis_to_deploy(self):
         """
         If the ami id is specified using the option --ami then run test on the specified ami
         independently of its stage,
-        Otherwise use the most recent untested ami for the hostclass
+        Otherwise use the most recent untested ami for each hostclass
         """
-        amis = self._disco_deploy.all_stage_amis if self._disco_deploy._restrict_amis else \
+        return self._disco_deploy.all_stage_amis if self._disco_deploy._restrict_amis else \
             self._disco_deploy.get_test_amis()
-        return random.choice(amis) if amis else None
 
     def _deploy_ami(self, ami, dry_run, deployment_strategy, force_deployable=None):
         self._disco_deploy.test_ami(ami, dry_run, deployment_strategy, force_deployable=force_deployable)
@@ -847,15 +985,14 @@ class DiscoDeployUpdateHelper(DiscoDeployHelperBase):
     def get_command_name(self):
         return 'update'
 
-    def _get_ami_to_deploy(self):
+    def _get_amis_to_deploy(self):
         """
         If the ami id is specify using the option --ami then run update using the specified ami
         independently of its stage,
-        Otherwise uses the most recent tested or un tagged ami
+        Otherwise uses the most recent tested or un tagged ami of each hostclass
         """
-        amis = self._disco_deploy.all_stage_amis if self._disco_deploy._restrict_amis else \
+        return self._disco_deploy.all_stage_amis if self._disco_deploy._restrict_amis else \
             self._disco_deploy.get_update_amis()
-        return random.choice(amis) if amis else None
 
     def _deploy_ami(self, ami, dry_run, deployment_strategy, force_deployable=None):
         self._disco_deploy.update_ami(ami, dry_run, deployment_strategy, force_deployable=force_deployable)
@@ -4,6 +4,7 @@ DynamoDB Module. Can be used to perform various DynamoDB operations
 
 import json
 from logging import getLogger
+from threading import Lock
 
 import boto3
 from botocore.exceptions import ClientError
@@ -11,7 +12,9 @@ from botocore.exceptions import ClientError
 from .disco_config import normalize_path, read_config
 from .disco_datapipeline import AsiaqDataPipelineManager
 from .exceptions import DynamoDBEnvironmentError, EasyExit
-from .resource_helper import throttled_call
+from .resource_helper import throttled_call, parallel_map
+
+DYNAMODB_BACKUP_MAX_PARALLEL = 8
 
 
 class DiscoDynamoDB(object):
@@ -158,6 +161,7 @@ class AsiaqDynamoDbBackupManager(object):
         self._aws_config = config
         self._mgr = AsiaqDataPipelineManager(config=self.config)
         self._s3_client = None
+        self._dynamodb = None
         self.logger = getLogger(type(self).__name__)
         self._s3_bucket_name = None
 
@@ -175,6 +179,13 @@ class AsiaqDynamoDbBackupManager(object):
             self._s3_client = boto3.client('s3')
         return self._s3_client
 
+    @property
+    def dynamodb(self):
+        "Auto-create a DiscoDynamoDB for this environment if needed."
+        if not self._dynamodb:
+            self._dynamodb = DiscoDynamoDB(self.config.environment)
+        return self._dynamodb
+
     @property
     def s3_bucket_name(self):
         """
@@ -189,10 +200,11 @@ class AsiaqDynamoDbBackupManager(object):
         return self._s3_bucket_name
 
     def create_backup(self, table_name, start=True, force_update=False, metanetwork=None,
-                      backup_period=None):
+                      backup_period=None, known_pipelines=None):
         """
         Create a backup pipeline for the given table, and start it running (unless the
-        'start' argument is False).
+        'start' argument is False).  If known_pipelines is given, the existing pipeline is
+        looked for among those rather than by searching every pipeline in the account.
         """
         env = self.config.environment
         pipeline_name = "%s backup - %s" % (table_name, env)
@@ -203,7 +215,8 @@ class AsiaqDynamoDbBackupManager(object):
                                              pipeline_description=pipeline_description,
                                              log_location=self._s3_url("logs"),
                                              metanetwork=metanetwork,
-                                             force_update=force_update)
+                                             force_update=force_update,
+                                             known_pipelines=known_pipelines)
         if start:
             param_values = self._get_table_params(table_name)
             param_values['myOutputS3Loc'] = self._s3_url(env, table_name)
@@ -212,10 +225,12 @@ class AsiaqDynamoDbBackupManager(object):
             start_resp = self._mgr.start(pipeline, param_values)
             self.logger.debug("Started pipeline, got response %s", start_resp)
 
-    def restore_backup(self, table_name, backup_dir=None, force_update=False, metanetwork=None):
+    def restore_backup(self, table_name, backup_dir=None, force_update=False, metanetwork=None,
+                       known_pipelines=None):
         """
         Create a backup-restore pipeline if needed, and activate it to restore a particular table from
-        either a particular backup or the latest one.
+        either a particular backup or the latest one.  If known_pipelines is given, the existing pipeline
+        is looked for among those rather than by searching every pipeline in the account.
         """
         env = self.config.environment
         pipeline_name = "%s restore - %s" % (table_name, env)
@@ -229,7 +244,8 @@ class AsiaqDynamoDbBackupManager(object):
         pipeline = self._mgr.fetch_or_create(
             self.RESTORE_PIPELINE_TEMPLATE,
             pipeline_name=pipeline_name, tags=tags, pipeline_description=pipeline_description,
-            log_location=self._s3_url("logs"), metanetwork=metanetwork, force_update=force_update)
+            log_location=self._s3_url("logs"), metanetwork=metanetwork, force_update=force_update,
+            known_pipelines=known_pipelines)
         param_values = self._get_table_params(table_name)
         param_values['myInputS3Loc'] = self._s3_url(env, table_name, backup_dir)
 
@@ -237,6 +253,44 @@ class AsiaqDynamoDbBackupManager(object):
         start_resp = self._mgr.start(pipeline, param_values)
         self.logger.debug("Started pipeline, got response %s", start_resp)
 
+    def create_backups(self, table_names, start=True, force_update=False, metanetwork=None,
+                       backup_period=None, max_workers=DYNAMODB_BACKUP_MAX_PARALLEL):
+        """
+        Create (and start, unless 'start' is False) backup pipelines for several tables at once.
+        The backup pipelines of the environment are looked up once, and the tables are then handled
+        concurrently. Raises a DynamoDBEnvironmentError naming the tables that failed, if any did.
+        """
+        known_pipelines = self._mgr.search_descriptions(
+            tags={'environment': self.config.environment, 'template': self.BACKUP_PIPELINE_TEMPLATE})
+
+        def _create(table_name):
+            self.create_backup(table_name, start=start, force_update=force_update, metanetwork=metanetwork,
+                               backup_period=backup_period, known_pipelines=known_pipelines)
+
+        self._run_for_tables("backup", table_names, _create, max_workers)
+
+    def restore_backups(self, table_names, force_update=False, metanetwork=None,
+                        max_workers=DYNAMODB_BACKUP_MAX_PARALLEL):
+        """
+        Restore several tables at once, each from its latest backup. The restore pipelines of the
+        environment are looked up once, and the latest backup of each table is found and restored
+        concurrently. Raises a DynamoDBEnvironmentError naming the tables that failed, if any did.
+        """
+        known_pipelines = self._mgr.search_descriptions(
+            tags={'environment': self.config.environment, 'template': self.RESTORE_PIPELINE_TEMPLATE})
+
+        def _restore(table_name):
+            self.restore_backup(table_name, force_update=force_update, metanetwork=metanetwork,
+                                known_pipelines=known_pipelines)
+
+        self._run_for_tables("restore", table_names, _restore, max_workers)
+
+    def list_tables(self):
+        "List the logical names of the DynamoDB tables in this environment."
+        suffix = "_" + self.config.environment
+        return [table_name[:-len(suffix)] for table_name in self.dynamodb.get_all_tables()
+                if table_name.endswith(suffix)]
+
     def list_backups(self, env, table_name):
         """
         List "sub-directories" starting with an env/table-name specified prefix in the backup bucket.
@@ -277,10 +331,40 @@ class AsiaqDynamoDbBackupManager(object):
         all_backups.sort()
         return all_backups[-1] if all_backups else None
 
+    def _run_for_tables(self, action, table_names, func, max_workers):
+        """
+        Call func for each of the tables on a bounded pool, logging overall progress as they complete.
+        A failure for one table does not stop the others; the failed tables are reported at the end.
+        """
+        # resolve the shared clients and the bucket once, before fanning out
+        _ = self.s3_bucket_name, self.dynamodb
+        progress = {'done': 0}
+        progress_lock = Lock()
+
+        def _run(table_name):
+            error = None
+            try:
+                func(table_name)
+            except Exception as err:
+                self.logger.exception("Failed to start %s of table %s", action, table_name)
+                error = err
+            with progress_lock:
+                progress['done'] += 1
+                self.logger.info("Started %s %d of %d (%s)", action, progress['done'], len(table_names),
+                                 table_name)
+            return error
+
+        errors = parallel_map(_run, table_names, max_workers=max_workers)
+        failed = [table_name for table_name, error in zip(table_names, errors) if error]
+        self.logger.info("%s started for %d of %d tables", action.capitalize(),
+                         len(table_names) - len(failed), len(table_names))
+        if failed:
+            raise DynamoDBEnvironmentError(
+                "Failed to start {0} of tables: {1}".format(action, ", ".join(failed)))
+
     def _get_table_params(self, table_name):
         "Get parameters for a pipeline activation for a specific table."
-        dynamodb = DiscoDynamoDB(self.config.environment)
-        region, real_table_name = dynamodb.get_real_table_identifiers(table_name)
+        region, real_table_name = self.dynamodb.get_real_table_identifiers(table_name)
         # we're leaving this defaulted, but this is how we would change it if we wanted to:
         # params['myDDBWriteThroughputRatio'] = str(0.25)
         return {'myDDBRegion': region, 'myDDBTableName': real_table_name}
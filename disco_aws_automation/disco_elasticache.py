@@ -5,6 +5,7 @@ Only Redis on Elasticache is supported at the moment
 import getpass
 import logging
 import hashlib
+import time
 
 import boto3
 import botocore
@@ -12,11 +13,15 @@ from semantic_version import Spec, Version
 
 from .disco_config import read_config
 from .disco_route53 import DiscoRoute53
-from .exceptions import CommandError
-from .resource_helper import throttled_call
+from .exceptions import CommandError, TimeoutError
+from .resource_helper import throttled_call, parallel_map, get_boto3_paged_results
 
 logger = logging.getLogger(__name__)
 
+ELASTICACHE_MAX_PARALLEL_UPDATES = 5
+ELASTICACHE_POLL_INTERVAL = 15  # seconds
+ELASTICACHE_WAIT_TIMEOUT = 60 * 60  # seconds
+
 
 class DiscoElastiCache(object):
     """
@@ -48,8 +53,7 @@ class DiscoElastiCache(object):
 
     def list(self):
         """List all cache clusters in environment"""
-        response = throttled_call(self.conn.describe_replication_groups)
-        groups = [group for group in response.get('ReplicationGroups', [])
+        groups = [group for group in self._get_all_replication_groups().values()
                   if group['Description'].startswith(self.vpc.environment_name + '-')]
 
         return sorted(groups, key=lambda group: (group['Description']))
@@ -64,53 +68,126 @@ class DiscoElastiCache(object):
             maintenance_window(str): accept Preferred Maintenance Window value
                                     or assigns default value.
         """
-        meta_network = self._get_option(cluster_name, 'meta_network') or self.aws.get_default_meta_network()
-        if not self._get_subnet_group(meta_network):
-            self._create_subnet_group(meta_network)
+        cluster_params = self._get_cluster_params(cluster_name)
+        if not self._get_subnet_group(cluster_params['meta_network']):
+            self._create_subnet_group(cluster_params['meta_network'])
+
+        self._update_cluster(cluster_name, cluster_params, self._get_redis_cluster(cluster_name))
+
+    def update_all(self, max_workers=ELASTICACHE_MAX_PARALLEL_UPDATES):
+        """
+        Update all clusters in environment to match config
+
+        The existing replication groups and subnet groups are fetched once up front and each cluster is
+        planned against them. The clusters are then created or modified on a bounded pool of workers and
+        all of the new clusters are waited for together. A cluster that fails to update does not stop the
+        others, the failures are reported together, along with a failure waiting for the new clusters, once
+        the new clusters have their DNS records.
+        """
+        sections = [section for section in self.config.sections()
+                    if section.startswith(self.vpc.environment_name + ':')]
+        cluster_names = [section.split(':')[1] for section in sections]
+        cluster_params = {cluster_name: self._get_cluster_params(cluster_name)
+                          for cluster_name in cluster_names}
+
+        existing_groups = self._get_all_replication_groups()
+        existing_subnet_groups = self._get_all_subnet_group_names()
 
-        maintenance_window = self._get_option(cluster_name,
-                                              'maintenance_window') or self.DEFAULT_MAINTENANCE_WINDOW
+        for meta_network in set(params['meta_network'] for params in cluster_params.values()):
+            if self._get_subnet_group_name(meta_network) not in existing_subnet_groups:
+                self._create_subnet_group(meta_network)
+
+        def _update(cluster_name):
+            cache_cluster = existing_groups.get(self._get_redis_replication_group_id(cluster_name))
+            try:
+                return self._update_cluster(cluster_name, cluster_params[cluster_name], cache_cluster,
+                                            wait=False), None
+            except Exception as err:
+                logger.exception('Failed to update cache cluster %s', cluster_name)
+                return False, err
+
+        results = parallel_map(_update, cluster_names, max_workers=max_workers)
+        created_clusters = [cluster_name for cluster_name, (created, _) in zip(cluster_names, results)
+                            if created]
+        failures = [cluster_name for cluster_name, (_, error) in zip(cluster_names, results) if error]
+
+        if created_clusters:
+            try:
+                groups = self._wait_for_replication_groups(
+                    [self._get_redis_replication_group_id(cluster_name) for cluster_name in created_clusters])
+            except (CommandError, TimeoutError) as err:
+                logger.exception('Failed waiting for new cache clusters')
+                failures.append(str(err))
+            else:
+                for cluster_name in created_clusters:
+                    self._create_cluster_dns(
+                        cluster_name,
+                        cluster_params[cluster_name]['domain_name'],
+                        groups[self._get_redis_replication_group_id(cluster_name)]
+                    )
+
+        # the clusters that were created get their DNS even when others failed
+        if failures:
+            raise CommandError('Failed to update cache clusters: {0}'.format(', '.join(failures)))
+
+    def _get_cluster_params(self, cluster_name):
+        """Read the settings of a cluster from the config file"""
         engine_version = self._get_option(cluster_name, 'engine_version')
         instance_type = self._get_option(cluster_name, 'instance_type')
-        parameter_group = self._get_option(cluster_name, 'parameter_group')
         num_nodes = int(self._get_option(cluster_name, 'num_nodes'))
-        port = int(self._get_option(cluster_name, 'port'))
-        auto_failover = self._has_auto_failover(engine_version, instance_type, num_nodes)
-        domain_name = self._get_option(cluster_name, 'domain_name') or self.aws.get_default_domain_name()
-        tags = [{
-            'Key': 'product_line',
-            'Value': self._get_option(cluster_name, 'product_line') or self.aws.get_default_product_line('')
-        }, {
-            'Key': 'owner',
-            'Value': getpass.getuser()
-        }, {
-            'Key': 'name',
-            'Value': cluster_name
-        }, {
-            'Key': 'environment',
-            'Value': self.vpc.environment_name
-        }]
-        cache_cluster = self._get_redis_cluster(cluster_name)
+        return {
+            'meta_network': (self._get_option(cluster_name, 'meta_network') or
+                             self.aws.get_default_meta_network()),
+            'maintenance_window': (self._get_option(cluster_name, 'maintenance_window') or
+                                   self.DEFAULT_MAINTENANCE_WINDOW),
+            'engine_version': engine_version,
+            'instance_type': instance_type,
+            'parameter_group': self._get_option(cluster_name, 'parameter_group'),
+            'num_nodes': num_nodes,
+            'port': int(self._get_option(cluster_name, 'port')),
+            'auto_failover': self._has_auto_failover(engine_version, instance_type, num_nodes),
+            'domain_name': (self._get_option(cluster_name, 'domain_name') or
+                            self.aws.get_default_domain_name()),
+            'tags': [{
+                'Key': 'product_line',
+                'Value': (self._get_option(cluster_name, 'product_line') or
+                          self.aws.get_default_product_line(''))
+            }, {
+                'Key': 'owner',
+                'Value': getpass.getuser()
+            }, {
+                'Key': 'name',
+                'Value': cluster_name
+            }, {
+                'Key': 'environment',
+                'Value': self.vpc.environment_name
+            }]
+        }
+
+    def _update_cluster(self, cluster_name, cluster_params, cache_cluster, wait=True):
+        """
+        Create or modify a cluster given its current state. Returns True if a new cluster was created.
+        When not waiting, the DNS record of a new cluster has to be created by the caller once it is
+        available.
+        """
         if not cache_cluster:
-            self._create_redis_cluster(cluster_name, engine_version, num_nodes, instance_type,
-                                       parameter_group, port, meta_network, auto_failover, domain_name, tags,
-                                       maintenance_window)
+            self._create_redis_cluster(cluster_name, cluster_params['engine_version'],
+                                       cluster_params['num_nodes'], cluster_params['instance_type'],
+                                       cluster_params['parameter_group'], cluster_params['port'],
+                                       cluster_params['meta_network'], cluster_params['auto_failover'],
+                                       cluster_params['domain_name'], cluster_params['tags'],
+                                       cluster_params['maintenance_window'], wait=wait)
+            return True
+
+        if cache_cluster['Status'] == 'available':
+            self._modify_redis_cluster(cluster_name, cluster_params['engine_version'],
+                                       cluster_params['parameter_group'], cluster_params['auto_failover'],
+                                       cluster_params['domain_name'], cluster_params['maintenance_window'],
+                                       cluster=cache_cluster)
         else:
-            if cache_cluster['Status'] == 'available':
-                self._modify_redis_cluster(cluster_name, engine_version,
-                                           parameter_group, auto_failover, domain_name, maintenance_window)
-            else:
-                logger.error('Unable to update cache cluster %s. Its status is not available',
-                             cache_cluster['Description'])
-
-    def update_all(self):
-        """Update all clusters in environment to match config"""
-        sections = [section for section in self.config.sections()
-                    if section.startswith(self.vpc.environment_name + ':')]
-
-        for section in sections:
-            cluster_name = section.split(':')[1]
-            self.update(cluster_name)
+            logger.error('Unable to update cache cluster %s. Its status is not available',
+                         cache_cluster['Description'])
+        return False
 
     def delete(self, cluster_name, wait=False):
         """
@@ -158,21 +235,66 @@ class DiscoElastiCache(object):
 
             self.route53.delete_records_by_value('CNAME', address)
 
-        if wait:
-            for cluster in clusters:
-                self.conn.get_waiter('replication_group_deleted').wait(
-                    ReplicationGroupId=cluster['ReplicationGroupId'])
+        if wait and clusters:
+            self._wait_for_replication_groups([cluster['ReplicationGroupId'] for cluster in clusters],
+                                              deleted=True)
 
     def delete_all_subnet_groups(self):
         """Delete all subnet groups in environment"""
-        response = throttled_call(self.conn.describe_cache_subnet_groups)
-        subnet_groups = [group for group in response.get('CacheSubnetGroups', [])
-                         if group['CacheSubnetGroupName'].startswith(self.vpc.environment_name + '-')]
+        subnet_groups = [group_name for group_name in self._get_all_subnet_group_names()
+                         if group_name.startswith(self.vpc.environment_name + '-')]
 
-        for group in subnet_groups:
-            logger.info('Deleting cache subnet group %s', group['CacheSubnetGroupName'])
+        for group_name in subnet_groups:
+            logger.info('Deleting cache subnet group %s', group_name)
             throttled_call(self.conn.delete_cache_subnet_group,
-                           CacheSubnetGroupName=group['CacheSubnetGroupName'])
+                           CacheSubnetGroupName=group_name)
+
+    def _get_all_replication_groups(self):
+        """Returns every Replication group in the account indexed by their id"""
+        groups = get_boto3_paged_results(self.conn.describe_replication_groups, 'ReplicationGroups',
+                                         next_token_key='Marker')
+        return {group['ReplicationGroupId']: group for group in groups}
+
+    def _get_all_subnet_group_names(self):
+        """Returns the names of every cache subnet group in the account"""
+        groups = get_boto3_paged_results(self.conn.describe_cache_subnet_groups, 'CacheSubnetGroups',
+                                         next_token_key='Marker')
+        return [group['CacheSubnetGroupName'] for group in groups]
+
+    def _wait_for_replication_groups(self, replication_group_ids, deleted=False,
+                                     timeout=ELASTICACHE_WAIT_TIMEOUT):
+        """
+        Waits for all of the given replication groups to become available, or to be deleted. A single listing
+        of the replication groups is done on each poll regardless of the number of groups being waited for.
+        Returns the replication groups found on the last poll indexed by their id.
+        """
+        pending_ids = set(replication_group_ids)
+        time_passed = 0
+        while True:
+            groups = self._get_all_replication_groups()
+            if deleted:
+                pending_ids = set(group_id for group_id in pending_ids if group_id in groups)
+            else:
+                failed_ids = [group_id for group_id in pending_ids
+                              if groups.get(group_id, {}).get('Status') == 'create-failed']
+                if failed_ids:
+                    raise CommandError('Failed to create cache clusters: {0}'.format(
+                        ', '.join(groups[group_id]['Description'] for group_id in failed_ids)))
+                pending_ids = set(group_id for group_id in pending_ids
+                                  if groups.get(group_id, {}).get('Status') != 'available')
+
+            if not pending_ids:
+                return groups
+
+            if time_passed >= timeout:
+                raise TimeoutError(
+                    "Timed out waiting for cache clusters {0} to be {1} after {2}s".format(
+                        ', '.join(sorted(pending_ids)), 'deleted' if deleted else 'available', time_passed))
+
+            logger.info('Waiting for %s cache clusters to be %s', len(pending_ids),
+                        'deleted' if deleted else 'available')
+            time.sleep(ELASTICACHE_POLL_INTERVAL)
+            time_passed += ELASTICACHE_POLL_INTERVAL
 
     def _get_redis_cluster(self, cluster_name):
         """Returns a Redis Replication group by its name"""
@@ -189,7 +311,8 @@ class DiscoElastiCache(object):
     # pylint: disable=R0913, R0914
     def _create_redis_cluster(self, cluster_name, engine_version, num_nodes, instance_type,
                               parameter_group,
-                              port, meta_network_name, auto_failover, domain_name, tags, maintenance_window):
+                              port, meta_network_name, auto_failover, domain_name, tags, maintenance_window,
+                              wait=True):
         """
         Create a redis cache cluster
 
@@ -197,7 +320,7 @@ class DiscoElastiCache(object):
         Each Replication Group is a set of single node Redis Cache Clusters with one read/write cluster and
         the rest as read only.
 
-        Waits until cluster is created
+        Waits until cluster is created and sets up its DNS record, unless wait is False
 
         Args:
             cluster_name (str): name of cluster
@@ -214,6 +337,7 @@ class DiscoElastiCache(object):
             tags (List[dict]): list of tags to add to replication group
             maintenance_window(string): specifies the weekly time range (of at least 1 hour) in UTC during
                                         which maintenance on the cache cluster is performed.
+            wait (bool): block until the cluster is available and create its DNS record
         """
         replication_group_id = self._get_redis_replication_group_id(cluster_name)
         description = self._get_redis_description(cluster_name)
@@ -236,19 +360,24 @@ class DiscoElastiCache(object):
                        Tags=tags,
                        PreferredMaintenanceWindow=maintenance_window)
 
+        if not wait:
+            return
+
         self.conn.get_waiter('replication_group_available').wait(
             ReplicationGroupId=replication_group_id
         )
 
-        cluster = self._get_redis_cluster(cluster_name)
+        self._create_cluster_dns(cluster_name, domain_name, self._get_redis_cluster(cluster_name))
 
+    def _create_cluster_dns(self, cluster_name, domain_name, cluster):
+        """Create the DNS record for the primary endpoint of a newly created cluster"""
         if domain_name:
             address = cluster['NodeGroups'][0]['PrimaryEndpoint']['Address']
             subdomain = self._get_subdomain(cluster_name, domain_name)
             self.route53.create_record(domain_name, subdomain, 'CNAME', address)
 
     def _modify_redis_cluster(self, cluster_name, engine_version, parameter_group, auto_failover,
-                              domain_name, maintenance_window, apply_immediately=True):
+                              domain_name, maintenance_window, apply_immediately=True, cluster=None):
         """
         Modify an existing Redis replication group
         Args:
@@ -261,9 +390,10 @@ class DiscoElastiCache(object):
                                       False to schedule update at next cluster maintenance window or restart
             maintenance_window(string): specifies the weekly time range (of at least 1 hour) in UTC during
                                         which maintenance on the cache cluster is performed.
+            cluster (dict): the current replication group, looked up if not given
         """
         replication_group_id = self._get_redis_replication_group_id(cluster_name)
-        cluster = self._get_redis_cluster(cluster_name)
+        cluster = cluster or self._get_redis_cluster(cluster_name)
         throttled_call(self.conn.modify_replication_group,
                        ReplicationGroupId=replication_group_id,
                        AutomaticFailoverEnabled=auto_failover,
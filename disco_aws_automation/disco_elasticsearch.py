@@ -11,7 +11,7 @@ from boto3.exceptions import Boto3Error
 from botocore.exceptions import BotoCoreError
 from .disco_config import read_config
 from .disco_route53 import DiscoRoute53
-from .resource_helper import throttled_call
+from .resource_helper import throttled_call, parallel_map
 from .disco_aws_util import is_truthy
 from .disco_constants import (
     VPC_CONFIG_FILE,
@@ -22,6 +22,11 @@ from .disco_alarm_config import DiscoAlarmsConfig
 
 logger = logging.getLogger(__name__)
 
+# most domains DescribeElasticsearchDomains takes in one call
+ES_DESCRIBE_BATCH_SIZE = 5
+# most domains created or updated at the same time
+ES_UPDATE_MAX_PARALLEL = 5
+
 
 class DiscoElasticsearch(object):
     """
@@ -46,6 +51,7 @@ class DiscoElasticsearch(object):
         self._region = None  # Lazily initialized
         self._zone = None  # Lazily initialized
         self._alarms = alarms or None  # Lazily initialized
+        self._nat_eips = None  # Lazily initialized
 
     @property
     def conn(self):
@@ -93,6 +99,14 @@ class DiscoElasticsearch(object):
             self._alarms = DiscoAlarm(environment=self.environment_name, alarm_configs=alarm_configs)
         return self._alarms
 
+    @property
+    def nat_eips(self):
+        """The EIPs of the environment's NAT gateways, shared by the access policies of all domains"""
+        if self._nat_eips is None:
+            nat_eips = self._get_nat_eips()
+            self._nat_eips = nat_eips.split(',') if nat_eips else []
+        return self._nat_eips
+
     def get_domain_name(self, elasticsearch_name):
         """
         Get the name of the ElasticSearch domain.
@@ -134,6 +148,7 @@ class DiscoElasticsearch(object):
         ]
         """
         domain_infos = []
+        domain_names = []
         for domain_name in self._list():
             # Somewhat annoying logic to handle the fact that elasticsearch names are allowed to have '-'
             # in them.
@@ -160,10 +175,14 @@ class DiscoElasticsearch(object):
             domain_info["route_53_endpoint"] = "{}.{}".format(domain_name, self.zone)
             domain_info["internal_name"] = elasticsearch_name
 
-            if include_endpoint:
-                domain_info["elasticsearch_endpoint"] = self.get_endpoint(domain_name)
-
             domain_infos.append(domain_info)
+            domain_names.append(domain_name)
+
+        if include_endpoint:
+            domain_statuses = self._describe_es_domains(domain_names)
+            for domain_info in domain_infos:
+                domain_status = domain_statuses.get(domain_info["elasticsearch_domain_name"], {})
+                domain_info["elasticsearch_endpoint"] = domain_status.get("Endpoint")
 
         return domain_infos
 
@@ -193,6 +212,19 @@ class DiscoElasticsearch(object):
         """
         return self.conn.describe_elasticsearch_domain(DomainName=domain_name)
 
+    def _describe_es_domains(self, domain_names):
+        """
+        Returns a dict of the domain status of each of the specified Elasticsearch domains, describing
+        ES_DESCRIBE_BATCH_SIZE domains per call. Domains that don't exist are left out.
+        """
+        domain_statuses = {}
+        for start in xrange(0, len(domain_names), ES_DESCRIBE_BATCH_SIZE):
+            response = throttled_call(self.conn.describe_elasticsearch_domains,
+                                      DomainNames=domain_names[start:start + ES_DESCRIBE_BATCH_SIZE])
+            for domain_status in response['DomainStatusList']:
+                domain_statuses[domain_status['DomainName']] = domain_status
+        return domain_statuses
+
     def get_endpoint(self, domain_name):
         """
         Get Elasticsearch service endpoint
@@ -215,9 +247,7 @@ class DiscoElasticsearch(object):
         it will use the environment's NAT Gateway to forward requests to the elasticsearch cluster and the
         IP addresses of the NAT Gateway would be read from disco_vpc.ini.
         """
-        nat_eips = self._get_nat_eips()
-        if nat_eips:
-            allowed_source_ips += nat_eips.split(',')
+        allowed_source_ips = allowed_source_ips + self.nat_eips
 
         resource = "arn:aws:es:{region}:{account}:domain/{domain_name}/*".format(region=self.region,
                                                                                  account=self.account_id,
@@ -274,6 +304,7 @@ class DiscoElasticsearch(object):
         # Get a list of all the elasticsearch_names that exist in the current environment
         all_elasticsearch_names = [domain_info["internal_name"] for domain_info in self.list()]
 
+        domain_updates = []
         for desired_elasticsearch_name in desired_elasticsearch_names:
             domain_name = self.get_domain_name(desired_elasticsearch_name)
 
@@ -284,25 +315,36 @@ class DiscoElasticsearch(object):
 
             # Get the latest elasticsearch config.
             desired_es_config = es_config or self._get_es_config(desired_elasticsearch_name)
+            domain_updates.append(
+                (domain_name, desired_es_config, desired_elasticsearch_name in all_elasticsearch_names)
+            )
 
-            if desired_elasticsearch_name in all_elasticsearch_names:
-                try:
-                    del desired_es_config["ElasticsearchVersion"]
-                    logging.debug("Ignoring ElasticsearchVersion specification on update")
-                except KeyError:
-                    pass
-                logger.info('Updating ElasticSearch domain %s', domain_name)
-                throttled_call(self.conn.update_elasticsearch_domain_config, **desired_es_config)
-            else:
-                logger.info('Creating ElasticSearch domain %s', domain_name)
-                throttled_call(self.conn.create_elasticsearch_domain, **desired_es_config)
-
-            # Add the Route 53 entry
-            self._add_route53(domain_name)
+        # Domains take a long time to create or update, so they are created and updated at the same time
+        parallel_map(self._create_or_update_domain, domain_updates, max_workers=ES_UPDATE_MAX_PARALLEL)
 
+        if domain_updates:
             # Update alarms
             self.alarms.create_alarms(elasticsearch_name)
 
+    def _create_or_update_domain(self, domain_update):
+        """Create or update a domain from a (domain name, config, exists) tuple and add its Route 53 entry"""
+        domain_name, desired_es_config, exists = domain_update
+
+        if exists:
+            try:
+                del desired_es_config["ElasticsearchVersion"]
+                logging.debug("Ignoring ElasticsearchVersion specification on update")
+            except KeyError:
+                pass
+            logger.info('Updating ElasticSearch domain %s', domain_name)
+            throttled_call(self.conn.update_elasticsearch_domain_config, **desired_es_config)
+        else:
+            logger.info('Creating ElasticSearch domain %s', domain_name)
+            throttled_call(self.conn.create_elasticsearch_domain, **desired_es_config)
+
+        # Add the Route 53 entry
+        self._add_route53(domain_name)
+
     def delete(self, elasticsearch_name=None, delete_all=False):
         """
         Delete an ElasticSearch domain.
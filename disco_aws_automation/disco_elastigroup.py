@@ -1,10 +1,12 @@
 """Contains DiscoElastigroup class that orchestrates AWS Spotinst Elastigroups"""
 import copy
 import logging
+import threading
 import time
 import os
 
 from base64 import b64encode
+from collections import namedtuple
 from itertools import groupby
 
 import boto3
@@ -18,6 +20,15 @@ logger = logging.getLogger(__name__)
 
 # max time to wait in seconds for instances to become healthy after a roll
 GROUP_ROLL_TIMEOUT = 1200
+# most groups roll_groups rolls at the same time
+GROUP_ROLL_MAX_PARALLEL = 5
+# seconds between polls of roll status, the interval doubles up to the max while no roll makes progress
+ROLL_POLL_MIN_INTERVAL = 10
+ROLL_POLL_MAX_INTERVAL = 60
+# seconds a listing of the account's elastigroups is reused before it is listed again
+SPOTINST_GROUPS_TTL = 60
+
+_Roll = namedtuple('_Roll', ['deploy_id', 'progress', 'stop_time'])
 
 
 class DiscoElastigroup(BaseGroup):
@@ -25,6 +36,10 @@ class DiscoElastigroup(BaseGroup):
 
     def __init__(self, environment_name):
         self.environment_name = environment_name
+        self._region_name = None  # lazily resolved
+        self._inventory = None  # (groups by name, groups by hostclass), lazily listed
+        self._inventory_listed_at = 0
+        self._inventory_lock = threading.Lock()
 
         if os.environ.get('SPOTINST_TOKEN'):
             self.spotinst_client = SpotinstClient(
@@ -60,15 +75,50 @@ class DiscoElastigroup(BaseGroup):
         parts = group_name.split('_')[1:-1]
         return '_'.join(parts)
 
+    @property
+    def region_name(self):
+        """The region of this session, elastigroups in other regions are ignored"""
+        if not self._region_name:
+            self._region_name = boto3.session.Session().region_name
+        return self._region_name
+
+    def _get_inventory(self):
+        """
+        Returns the elastigroups of this environment and region as a tuple of dicts, mapping group names
+        and hostclasses to lists of groups. The account's elastigroups are listed at most once every
+        SPOTINST_GROUPS_TTL seconds, and again after any change made through this class.
+        """
+        with self._inventory_lock:
+            if self._inventory is None or time.time() - self._inventory_listed_at > SPOTINST_GROUPS_TTL:
+                groups_by_name = {}
+                groups_by_hostclass = {}
+                for group in self.spotinst_client.get_groups():
+                    if group['name'].startswith(self.environment_name) and \
+                            self.region_name in group['compute']['availabilityZones'][0]['name']:
+                        groups_by_name.setdefault(group['name'], []).append(group)
+                        groups_by_hostclass.setdefault(self._get_hostclass(group['name']), []).append(group)
+                self._inventory = (groups_by_name, groups_by_hostclass)
+                self._inventory_listed_at = time.time()
+            return self._inventory
+
+    def _forget_inventory(self):
+        """Forget the listed elastigroups so the next lookup sees a change that was just made"""
+        with self._inventory_lock:
+            self._inventory = None
+
     def _get_spotinst_groups(self, hostclass=None, group_name=None):
-        groups = self.spotinst_client.get_groups()
-        session = boto3.session.Session()
+        groups_by_name, groups_by_hostclass = self._get_inventory()
 
-        return [group for group in groups
-                if group['name'].startswith(self.environment_name) and
-                (not group_name or group['name'] == group_name) and
-                (not hostclass or self._get_hostclass(group['name']) == hostclass) and
-                session.region_name in group['compute']['availabilityZones'][0]['name']]
+        if group_name:
+            groups = groups_by_name.get(group_name, [])
+        elif hostclass:
+            groups = groups_by_hostclass.get(hostclass, [])
+        else:
+            groups = [group for groups in groups_by_name.values() for group in groups]
+
+        # callers may change the groups they get, so they get copies rather than the listed groups
+        return copy.deepcopy([group for group in groups
+                              if not hostclass or self._get_hostclass(group['name']) == hostclass])
 
     def get_existing_groups(self, hostclass=None, group_name=None):
         # get a dict for each group that matches the structure that would be returned by DiscoAutoscale
@@ -374,6 +424,7 @@ class DiscoElastigroup(BaseGroup):
         )
 
         new_group = self.spotinst_client.create_group(group_config)
+        self._forget_inventory()
         new_group_name = new_group['name']
 
         return {'name': new_group_name}
@@ -417,14 +468,20 @@ class DiscoElastigroup(BaseGroup):
 
         group_id = new_config.pop('id')
 
-        self.spotinst_client.update_group(group_id, {'group': new_config})
+        self._update_group(group_id, {'group': new_config})
 
         if load_balancers or target_groups:
             self.update_elb(load_balancers, target_groups, group_name=existing_group['name'])
 
+    def _update_group(self, group_id, group_config):
+        """Update an elastigroup by group id"""
+        self.spotinst_client.update_group(group_id, group_config)
+        self._forget_inventory()
+
     def _delete_group(self, group_id):
         """Delete an elastigroup by group id"""
         self.spotinst_client.delete_group(group_id)
+        self._forget_inventory()
 
     def delete_groups(self, hostclass=None, group_name=None, force=False):
         """Delete all elastigroups based on hostclass"""
@@ -455,7 +512,7 @@ class DiscoElastigroup(BaseGroup):
                 }
             }
             logger.info("Scaling down group %s", group['name'])
-            self.spotinst_client.update_group(group['id'], group_update)
+            self._update_group(group['id'], group_update)
 
             if wait:
                 self.wait_instance_termination(group_name=group_name, group=group, noerror=noerror)
@@ -481,7 +538,7 @@ class DiscoElastigroup(BaseGroup):
                 }
             }
 
-            self.spotinst_client.update_group(existing_group['id'], group_config)
+            self._update_group(existing_group['id'], group_config)
 
     def create_recurring_group_action(self, recurrance, min_size=None, desired_capacity=None, max_size=None,
                                       hostclass=None, group_name=None):
@@ -517,7 +574,7 @@ class DiscoElastigroup(BaseGroup):
                 }
             }
 
-            self.spotinst_client.update_group(existing_group['id'], group_config)
+            self._update_group(existing_group['id'], group_config)
 
     def update_elb(self, elb_names, target_groups, hostclass=None, group_name=None):
         """Updates an existing autoscaling group to use a different set of load balancers"""
@@ -581,7 +638,7 @@ class DiscoElastigroup(BaseGroup):
             }
         }
 
-        self.spotinst_client.update_group(existing_group['id'], group_config)
+        self._update_group(existing_group['id'], group_config)
 
         return new_lbs, extra_lbs, new_tgs, extra_tgs
 
@@ -688,7 +745,7 @@ class DiscoElastigroup(BaseGroup):
             snapshot_id
         )
 
-        self.spotinst_client.update_group(existing_group['id'], group_config)
+        self._update_group(existing_group['id'], group_config)
 
     def _roll_group(self, group_id, batch_percentage=100, grace_period=GROUP_ROLL_TIMEOUT,
                     health_check_type='EC2', wait=False):
@@ -700,37 +757,83 @@ class DiscoElastigroup(BaseGroup):
         :param wait (boolean): True to wait for roll operation to finish
         :raises TimeoutError if grace_period has expired
         """
-        self.spotinst_client.roll_group(group_id, batch_percentage, grace_period, health_check_type)
-
         if wait:
-            # wait for the deploy to appear in list
-            time.sleep(10)
-
-            deployments = self.spotinst_client.get_deployments(group_id)
-            deploy_id = deployments[-1]['id']
-
-            current_time = time.time()
-
-            # wait an extra amount of time after grace_period has ended to give time for roll to finish
-            stop_time = current_time + grace_period + 300
+            self.roll_groups([group_id], batch_percentage, grace_period, health_check_type)
+        else:
+            self.spotinst_client.roll_group(group_id, batch_percentage, grace_period, health_check_type)
 
-            while current_time < stop_time:
-                roll_status = self.spotinst_client.get_roll_status(group_id, deploy_id)
-                if roll_status['status'] not in ('in_progress', 'starting'):
-                    if roll_status['status'] != 'finished':
+    # pylint: disable=too-many-locals, too-many-branches
+    def roll_groups(self, group_ids, batch_percentage=100, grace_period=GROUP_ROLL_TIMEOUT,
+                    health_check_type='EC2', max_parallel=GROUP_ROLL_MAX_PARALLEL):
+        """
+        Recreate the instances in many Elastigroups and wait for the rolls to finish. Up to max_parallel
+        groups roll at the same time and all of them are tracked in one polling loop, which polls less
+        often while none of the rolls make progress.
+        :param group_ids (list): Elastigroup IDs to roll
+        :param batch_percentage (int): Percentage of instances to roll at a time (0-100)
+        :param grace_period (int): Time in seconds to wait for new instances to become healthy
+        :param max_parallel (int): Most groups to roll at the same time
+        :return dict: The final status of each group's roll
+        :raises TimeoutError if any roll didn't finish within grace_period
+        """
+        waiting = list(group_ids)
+        rolling = {}  # group id -> _Roll
+        statuses = {}
+        interval = ROLL_POLL_MIN_INTERVAL
+
+        while waiting or rolling:
+            while waiting and len(rolling) < max_parallel:
+                group_id = waiting.pop(0)
+                deployment = self.spotinst_client.roll_group(group_id, batch_percentage, grace_period,
+                                                             health_check_type)
+                logger.info("Started roll of group %s", group_id)
+                # wait an extra amount of time after grace_period has ended to give time for roll to finish
+                rolling[group_id] = _Roll(deploy_id=(deployment or {}).get('id'), progress=None,
+                                          stop_time=time.time() + grace_period + 300)
+
+            time.sleep(interval)
+
+            progressed = False
+            for group_id, roll in rolling.items():
+                deploy_id = roll.deploy_id
+                if not deploy_id:
+                    # the roll didn't tell us its deployment, the newest one in the list is it
+                    deployments = self.spotinst_client.get_deployments(group_id)
+                    if deployments:
+                        deploy_id = deployments[-1]['id']
+
+                roll_status = self.spotinst_client.get_roll_status(group_id, deploy_id) if deploy_id else {}
+                status = roll_status.get('status')
+                progress = (roll_status.get('progress') or {}).get('value')
+
+                if status and status not in ('in_progress', 'starting'):
+                    if status != 'finished':
                         logger.error("Roll of group %s did not complete successfully with status %s",
-                                     group_id, roll_status['status'])
-                    break
-
-                logger.info("Waiting for %s group to roll in order to update settings", group_id)
-                time.sleep(10)
-                current_time = time.time()
-
-            if current_time >= stop_time:
-                raise TimeoutError(
-                    "Timed out after waiting %s seconds for rolling deploy of %s" %
-                    (grace_period, group_id)
-                )
+                                     group_id, status)
+                    statuses[group_id] = status
+                    del rolling[group_id]
+                    progressed = True
+                elif time.time() >= roll.stop_time:
+                    logger.error("Timed out after waiting %s seconds for rolling deploy of %s",
+                                 grace_period, group_id)
+                    statuses[group_id] = 'timed_out'
+                    del rolling[group_id]
+                else:
+                    if progress != roll.progress:
+                        progressed = True
+                    rolling[group_id] = roll._replace(deploy_id=deploy_id, progress=progress)
+                    logger.info("Roll of group %s is %s%% complete", group_id, progress or 0)
+
+            interval = ROLL_POLL_MIN_INTERVAL if progressed else min(interval * 2, ROLL_POLL_MAX_INTERVAL)
+
+        timed_out = [group_id for group_id, status in statuses.items() if status == 'timed_out']
+        if timed_out:
+            raise TimeoutError(
+                "Timed out after waiting %s seconds for rolling deploy of %s" %
+                (grace_period, ', '.join(sorted(timed_out)))
+            )
+
+        return statuses
 
     def _get_instance_type_config(self, instance_types):
         return {
@@ -19,13 +19,17 @@ from .disco_route53 import DiscoRoute53
 from .disco_acm import DiscoACM
 from .disco_iam import DiscoIAM
 from .exceptions import CommandError, TimeoutError
-from .resource_helper import throttled_call
+from .resource_helper import throttled_call, parallel_map
 from .disco_aws_util import chunker
 
 logger = logging.getLogger(__name__)
 
 
 STICKY_POLICY_NAME = 'session-cookie-policy'
+ELB_HEALTH_POLL_INTERVAL = 5  # seconds
+
+# The ELB of a hostclass and the instances in it to wait for, instance_ids of None means all instances
+ELBHealthWait = namedtuple('ELBHealthWait', ['hostclass', 'testing', 'instance_ids'])
 
 
 class DiscoELB(object):
@@ -64,19 +68,31 @@ class DiscoELB(object):
 
     def list(self):
         """Returns all of the ELBs for the current environment"""
-        return [elb for elb in
-                throttled_call(self.elb_client.describe_load_balancers).get('LoadBalancerDescriptions', [])
-                if elb['VPCId'] == self.vpc.get_vpc_id()]
+        vpc_id = self.vpc.get_vpc_id()
+        elbs = []
+        marker = None
+        while True:
+            if marker:
+                response = throttled_call(self.elb_client.describe_load_balancers, Marker=marker)
+            else:
+                response = throttled_call(self.elb_client.describe_load_balancers)
+
+            elbs.extend(elb for elb in response.get('LoadBalancerDescriptions', [])
+                        if elb['VPCId'] == vpc_id)
+            marker = response.get('NextMarker')
+
+            if not marker:
+                return elbs
 
     def list_for_display(self):
         """Returns information about all of the ELBs in the current environment for display purposes"""
-        # Grab all of the ELBs in this environment
-        elbs_in_env = self.list()
+        # Grab all of the ELBs in this environment, indexed by their names
+        elbs_in_env = {elb["LoadBalancerName"]: elb for elb in self.list()}
 
         tag_descriptions = []
 
         # Grab their tags in chunks of 20
-        for elbs in chunker([elb["LoadBalancerName"] for elb in elbs_in_env], 20):
+        for elbs in chunker(elbs_in_env.keys(), 20):
             tag_descriptions += [tag_description for tag_description
                                  in throttled_call(self.elb_client.describe_tags,
                                                    LoadBalancerNames=elbs).get('TagDescriptions', [])]
@@ -95,9 +111,7 @@ class DiscoELB(object):
             else:
                 # Otherwise, look for the elb_name tag or just use the name of the load balancer
                 elb_name = get_tag_value(tag_description["Tags"], "elb_name") or elb_id
-            elb = [elb_in_env for elb_in_env in elbs_in_env
-                   if elb_in_env["LoadBalancerName"] == elb_id][0]
-            availability_zones = ','.join(elb["AvailabilityZones"])
+            availability_zones = ','.join(elbs_in_env[elb_id]["AvailabilityZones"])
 
             elb_infos.append({
                 "elb_name": elb_name,
@@ -529,32 +543,68 @@ class DiscoELB(object):
         timeout         The number of seconds to wait for instances to reach that state. Default: 600.
         See http://boto3.readthedocs.io/en/latest/reference/services/elb.html
         """
-        elb = self.get_elb(hostclass=hostclass, testing=testing)
-        elb_id = elb["LoadBalancerName"]
-        elb_name = DiscoELB.get_elb_name(self.vpc.environment_name, hostclass,
-                                         testing=testing)
+        self.wait_for_instance_health_states(
+            [ELBHealthWait(hostclass=hostclass, testing=testing, instance_ids=instance_ids)],
+            state=state,
+            timeout=timeout
+        )
+
+    def wait_for_instance_health_states(self, health_waits, state="InService", timeout=900):
+        """
+        Waits for the instances of several ELBs to enter a specific state. All of the ELBs are checked on
+        every poll, so the total wait is the one of the slowest ELB rather than the sum of all of them.
+        For each ELB at least one instance must enter the specified state.
+
+        Params:
+        health_waits    A list of ELBHealthWait(hostclass, testing, instance_ids) tuples, describing the ELBs
+                        and the instances in them to wait for. See wait_for_instance_health_state.
+        state           The state to wait for the instances. Defaults to 'InService'.
+        timeout         The number of seconds to wait for all instances to reach that state. Default: 900.
+        """
+        # keyed by position, the same ELB may be waited on for different instances
+        pending = {}
+        for index, health_wait in enumerate(health_waits):
+            health_wait = ELBHealthWait(*health_wait)
+            elb = self.get_elb(hostclass=health_wait.hostclass, testing=health_wait.testing)
+            elb_name = DiscoELB.get_elb_name(self.vpc.environment_name, health_wait.hostclass,
+                                             testing=health_wait.testing)
+            pending[index] = (elb_name, elb["LoadBalancerName"], health_wait.instance_ids)
+
         stop_time = time.time() + timeout
-        original_scope = scope = instance_ids if instance_ids else "all instances"
-        while time.time() < stop_time:
-            instances = self._describe_instance_health(elb_id=elb_id, instance_ids=instance_ids)
-            if len(instances) >= 1 and all(instance["State"] == state for instance in instances):
-                logger.info("Successfully waited for %s in ELB (%s) to enter state (%s)",
-                            original_scope, elb_name, state)
-                return
-            # Update scope to be the instances that have not yet entered the desired state
-            scope = [instance["InstanceId"] for instance in instances if instance["State"] != state]
-            logger.info(
-                "Waiting for %s in ELB (%s) to enter state (%s)",
-                scope or original_scope,
-                elb_name,
-                state
+        scopes = {}
+        while pending:
+            indexes = pending.keys()
+            states = parallel_map(
+                lambda index: self._describe_instance_health(elb_id=pending[index][1],
+                                                             instance_ids=pending[index][2]),
+                indexes
             )
-            time.sleep(5)
-        raise TimeoutError(
-            "Timed out after waiting {} seconds for {} in ELB ({}) to enter state ({})".format(timeout,
-                                                                                               scope,
-                                                                                               elb_name,
-                                                                                               state))
+            for index, instances in zip(indexes, states):
+                elb_name, _, instance_ids = pending[index]
+                original_scope = instance_ids or "all instances"
+                if len(instances) >= 1 and all(instance["State"] == state for instance in instances):
+                    logger.info("Successfully waited for %s in ELB (%s) to enter state (%s)",
+                                original_scope, elb_name, state)
+                    del pending[index]
+                    continue
+                # Update scope to be the instances that have not yet entered the desired state
+                scopes[index] = [instance["InstanceId"] for instance in instances
+                                 if instance["State"] != state] or original_scope
+                logger.info("Waiting for %s in ELB (%s) to enter state (%s)",
+                            scopes[index], elb_name, state)
+
+            if not pending:
+                return
+
+            if time.time() >= stop_time:
+                waiting_for = ", ".join("{} in ELB ({})".format(scopes[index], pending[index][0])
+                                        for index in sorted(pending))
+                raise TimeoutError(
+                    "Timed out after waiting {} seconds for {} to enter state ({})".format(timeout,
+                                                                                           waiting_for,
+                                                                                           state))
+
+            time.sleep(ELB_HEALTH_POLL_INTERVAL)
 
 
 class DiscoELBPortConfig(object):
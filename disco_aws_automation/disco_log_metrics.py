@@ -3,11 +3,10 @@ Some code to manage cloudwatch logs
 cloudwatch logs allow us to create metrics/alarms from log files
 """
 import logging
-from ConfigParser import ConfigParser
 
 import boto3
 
-from .disco_config import normalize_path
+from .disco_config import read_config
 from .resource_helper import throttled_call, get_boto3_paged_results
 
 logger = logging.getLogger(__name__)
@@ -32,9 +31,7 @@ class DiscoLogMetrics(object):
         """
         if not self._config:
             try:
-                config = ConfigParser()
-                config.read(normalize_path(self.config_file))
-                self._config = config
+                self._config = read_config(self.config_file)
             except Exception:
                 return None
         return self._config
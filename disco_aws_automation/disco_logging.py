@@ -1,6 +1,9 @@
 '''Utility function for logging'''
 import logging
 import sys
+import threading
+
+LOG_FORMAT = '%(asctime)s %(name)s %(levelname)s %(message)s'
 
 
 def configure_logging(debug, silent=False):
@@ -30,5 +33,34 @@ def configure_logging(debug, silent=False):
 
     stream_handler = logging.StreamHandler(sys.__stdout__)
     stream_handler.setLevel(logging.DEBUG)
-    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
     logger.addHandler(stream_handler)
+
+
+class ThreadLogFilter(logging.Filter):
+    '''Only lets through the records logged by one thread.'''
+
+    def __init__(self, thread_id):
+        logging.Filter.__init__(self)
+        self.thread_id = thread_id
+
+    def filter(self, record):
+        return record.thread == self.thread_id
+
+
+def add_thread_log_file(log_path):
+    '''
+    Also writes everything the calling thread logs to the file at log_path, so the output of one of
+    several concurrent tasks can be read on its own. Returns the handler, pass it to remove_log_file.
+    '''
+    file_handler = logging.FileHandler(log_path)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler.addFilter(ThreadLogFilter(threading.current_thread().ident))
+    logging.getLogger('').addHandler(file_handler)
+    return file_handler
+
+
+def remove_log_file(file_handler):
+    '''Stops writing to a log file added by add_thread_log_file.'''
+    logging.getLogger('').removeHandler(file_handler)
+    file_handler.close()
@@ -19,7 +19,8 @@ from .disco_subnet import DiscoSubnet
 from .resource_helper import (
     keep_trying,
     find_or_create,
-    throttled_call
+    throttled_call,
+    parallel_map
 )
 from .disco_constants import NETWORKS
 from .exceptions import (
@@ -30,6 +31,9 @@ from .exceptions import (
 
 logger = logging.getLogger(__name__)
 
+# maximum number of subnets whose NAT gateways are created or deleted at the same time, one per zone
+NAT_GATEWAY_MAX_PARALLEL = 3
+
 
 class DiscoMetaNetwork(object):
     """
@@ -207,14 +211,16 @@ class DiscoMetaNetwork(object):
 
             self._create_route_table_per_subnet()
 
-            for disco_subnet, allocation_id in zip(self.disco_subnets.values(), allocation_ids):
-                disco_subnet.create_nat_gateway(eip_allocation_id=allocation_id)
+            # each subnet waits for its own NAT gateway, so the subnets are handled at the same time
+            parallel_map(lambda args: args[0].create_nat_gateway(eip_allocation_id=args[1]),
+                         zip(self.disco_subnets.values(), allocation_ids),
+                         max_workers=NAT_GATEWAY_MAX_PARALLEL)
 
         else:
             self._create_route_table_per_subnet()
 
-            for disco_subnet in self.disco_subnets.values():
-                disco_subnet.create_nat_gateway()
+            parallel_map(lambda disco_subnet: disco_subnet.create_nat_gateway(),
+                         self.disco_subnets.values(), max_workers=NAT_GATEWAY_MAX_PARALLEL)
 
     def _create_route_table_per_subnet(self):
         if self.centralized_route_table:
@@ -226,8 +232,8 @@ class DiscoMetaNetwork(object):
 
     def delete_nat_gateways(self):
         """ Deletes all subnets' NAT gateways if any """
-        for disco_subnet in self.disco_subnets.values():
-            disco_subnet.delete_nat_gateway()
+        parallel_map(lambda disco_subnet: disco_subnet.delete_nat_gateway(),
+                     self.disco_subnets.values(), max_workers=NAT_GATEWAY_MAX_PARALLEL)
 
     def _instantiate_subnets(self, try_creating_aws_subnets=True):
         # FIXME needs to talk about and simplify this
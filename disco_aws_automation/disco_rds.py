@@ -21,7 +21,7 @@ from .disco_creds import DiscoS3Bucket
 from .disco_route53 import DiscoRoute53
 from .disco_vpc_sg_rules import DiscoVPCSecurityGroupRules
 from .exceptions import TimeoutError, RDSEnvironmentError, AsiaqConfigError
-from .resource_helper import keep_trying, tag2dict, throttled_call
+from .resource_helper import keep_trying, tag2dict, throttled_call, parallel_map
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,7 @@ RDS_DELETE_TIMEOUT = 1800  # seconds. From observation, it takes about 15-20 min
 RDS_SNAPSHOT_DELETE_TIMEOUT = 60  # seconds. From observation, this takes approximately 0 seconds
 RDS_STARTUP_TIMEOUT = 600  # seconds. Time we allow RDS to get IP address before we give up
 RDS_RESTORE_TIMEOUT = 1200  # seconds. Time we allow RDS to be restored and available to try and modify it
+RDS_MAX_PARALLEL_UPDATES = 5  # Number of clusters updated at once, kept low to stay under the RDS API limits
 DEFAULT_LICENSE = {
     'oracle': 'bring-your-own-license',
     'postgres': 'postgresql-license'
@@ -41,17 +42,78 @@ DEFAULT_PORT = {
 }
 
 
-class RDS(threading.Thread):
+class RDSContext(object):
+    """
+    Clients and lookups shared by all the RDS clusters updated in a single run, so that each of
+    them is only created or fetched once no matter how many clusters are being worked on
+    """
+
+    def __init__(self, env_name, config_aws=None, config_rds=None, credential_bucket_name=None):
+        self.env_name = env_name
+        self.config_aws = config_aws or read_config()
+        self.config_rds = config_rds or read_config(config_file=DEFAULT_CONFIG_FILE_RDS)
+        self.client = boto3.client('rds')
+        self._credential_bucket_name = credential_bucket_name
+        self._lock = threading.Lock()
+        # Lazily initialized
+        self._credential_bucket = None
+        self._disco_alarm = None
+        self._disco_route53 = None
+        self._keys = {}
+
+    @property
+    def credential_bucket(self):
+        """The S3 bucket that holds the RDS master passwords of the environment"""
+        with self._lock:
+            if not self._credential_bucket:
+                if not self._credential_bucket_name:
+                    from .disco_vpc import DiscoVPC
+                    self._credential_bucket_name = DiscoVPC.get_credential_buckets_from_env_name(
+                        self.config_aws, self.env_name)[0]
+                self._credential_bucket = DiscoS3Bucket(self._credential_bucket_name)
+            return self._credential_bucket
+
+    @property
+    def disco_alarm(self):
+        """DiscoAlarm object for the environment"""
+        with self._lock:
+            if not self._disco_alarm:
+                self._disco_alarm = DiscoAlarm(self.env_name)
+            return self._disco_alarm
+
+    @property
+    def disco_route53(self):
+        """DiscoRoute53 object, shared so hosted zone lookups are only done once"""
+        with self._lock:
+            if not self._disco_route53:
+                self._disco_route53 = DiscoRoute53()
+            return self._disco_route53
+
+    def get_credential(self, key_name):
+        """
+        Returns the content of a key in the credential bucket, or None if it doesn't exist.
+        Results are cached so a key is only fetched once per run.
+        """
+        if key_name not in self._keys:
+            bucket = self.credential_bucket
+            value = bucket.get_key(key_name) if bucket.key_exists(key_name) else None
+            with self._lock:
+                self._keys[key_name] = value
+        return self._keys[key_name]
+
+
+class RDS(object):
     """Class for spinning up a single rds instance"""
 
-    def __init__(self, env_name, database_identifier, rds_security_group_id, subnet_ids, domain_name):
+    def __init__(self, env_name, database_identifier, rds_security_group_id, subnet_ids, domain_name,
+                 context=None):
         """Initialize class"""
-        threading.Thread.__init__(self, name=database_identifier)
-        self.client = boto3.client('rds')
+        self.context = context or RDSContext(env_name)
+        self.client = self.context.client
         self.vpc_name = env_name
         self.database_name = RDS.get_database_name(env_name, database_identifier)
-        self.config_aws = read_config()
-        self.config_rds = read_config(config_file=DEFAULT_CONFIG_FILE_RDS)
+        self.config_aws = self.context.config_aws
+        self.config_rds = self.context.config_rds
         self.rds_security_group_id = rds_security_group_id
         self.subnet_ids = subnet_ids
         self.domain_name = domain_name
@@ -61,7 +123,7 @@ class RDS(threading.Thread):
         Configure alarms for this RDS instance. The alarms are configured in disco_alarms.ini
         """
         logger.debug("Configuring Cloudwatch alarms ")
-        DiscoAlarm(self.vpc_name).create_alarms(database_name)
+        self.context.disco_alarm.create_alarms(database_name)
 
     def _get_instance_address(self, instance_identifier):
         """
@@ -77,7 +139,7 @@ class RDS(threading.Thread):
         start_time = time.time()
         instance_endpoint = keep_trying(RDS_STARTUP_TIMEOUT, self._get_instance_address, instance_identifier)
         logger.info("Waited %s seconds for RDS to get an address", time.time() - start_time)
-        disco_route53 = DiscoRoute53()
+        disco_route53 = self.context.disco_route53
         instance_record_name = '{0}.{1}.'.format(instance_identifier, self.domain_name)
 
         # Delete and recreate DNS record for this Instance
@@ -150,18 +212,18 @@ class RDS(threading.Thread):
         """
         Get the Master Password for instance stored in the S3 bucket
         """
-        from .disco_vpc import DiscoVPC
-        bucket_name = DiscoVPC.get_credential_buckets_from_env_name(self.config_aws, self.vpc_name)[0]
-        bucket = DiscoS3Bucket(bucket_name)
-
         # for backwards compatibility check the old style keys containing the env name
         instance_identifier = RDS.get_instance_identifier(env_name, database_name)
         s3_password_old_key = 'rds/{0}/master_user_password'.format(instance_identifier)
-        if bucket.key_exists(s3_password_old_key):
-            return bucket.get_key(s3_password_old_key)
+        password = self.context.get_credential(s3_password_old_key)
+        if password is not None:
+            return password
 
         s3_password_new_key = 'rds/{0}/master_user_password'.format(database_name)
-        return bucket.get_key(s3_password_new_key)
+        password = self.context.get_credential(s3_password_new_key)
+        if password is None:
+            raise KeyError("{0} does not exist in the credential bucket".format(s3_password_new_key))
+        return password
 
     def get_latest_snapshot(self, db_instance_identifier):
         """
@@ -451,9 +513,6 @@ class RDS(threading.Thread):
         # Create a DNS record for this instance
         self.setup_dns(clone_db_identifier)
 
-    def run(self):
-        self.update_cluster()
-
 
 class DiscoRDS(object):
     """Class for doing RDS operations on a given environment"""
@@ -485,12 +544,17 @@ class DiscoRDS(object):
 
         raise RuntimeError('Security group for intranet meta network is missing.')
 
+    def _get_rds_context(self):
+        """Returns the clients and lookups to be shared by all of the clusters of a run"""
+        return RDSContext(self.vpc_name, config_aws=self.config_aws, config_rds=self.config_rds)
+
     def update_cluster_by_id(self, database_identifier):
         """Update a RDS cluster by its database identifier"""
         rds_security_group_id = self.get_rds_security_group_id()
         subnet_ids = self.get_subnet_ids()
         rds = RDS(self.vpc_name, database_identifier,
-                  rds_security_group_id, subnet_ids, self.domain_name)
+                  rds_security_group_id, subnet_ids, self.domain_name,
+                  context=self._get_rds_context())
         rds.update_cluster()
 
     def get_subnet_ids(self):
@@ -503,9 +567,12 @@ class DiscoRDS(object):
                 subnet_ids.append(str(subnet['SubnetId']))
         return subnet_ids
 
-    def update_all_clusters_in_vpc(self, parallel=True):
+    def update_all_clusters_in_vpc(self, parallel=True, max_workers=RDS_MAX_PARALLEL_UPDATES):
         """
         Updates every RDS instance in the current VPC to match the configuration
+
+        When running in parallel at most max_workers clusters are updated at the same time. All of the
+        clusters share the same boto3 client, credential bucket and Route53 zone lookups.
         """
         vpc_prefix = self.vpc_name + '-'
         sections = [section for section in self.config_rds.sections()
@@ -513,31 +580,40 @@ class DiscoRDS(object):
         logger.debug("The following RDS clusters will be updated: %s", ", ".join(sections))
         rds_security_group_id = self.get_rds_security_group_id()
         subnet_ids = self.get_subnet_ids()
-        rds_list = []
-
-        for section in sections:
-            # the section names are database identifiers
-            database_identifier = section
-            rds = RDS(self.vpc_name,
-                      database_identifier,
-                      rds_security_group_id,
-                      subnet_ids,
-                      self.domain_name)
-            rds_list.append(rds)
-
-        # For Sequential execution
-        if not parallel:
-            for rds in rds_list:
-                rds.update_cluster()
-            return
-
-        # Running in parallel
-        for rds in rds_list:
-            rds.start()
-
-        # Wait for all threads to finish
-        for rds in rds_list:
-            rds.join()
+        context = self._get_rds_context()
+
+        # the section names are database identifiers
+        rds_list = [RDS(self.vpc_name, database_identifier, rds_security_group_id, subnet_ids,
+                        self.domain_name, context=context)
+                    for database_identifier in sections]
+
+        results = parallel_map(self._timed_update_cluster, rds_list,
+                               max_workers=max_workers if parallel else 1)
+
+        failed_clusters = []
+        for database_identifier, (duration, error) in zip(sections, results):
+            logger.info("RDS cluster %s %s after %.1fs", database_identifier,
+                        "failed to update" if error else "updated", duration)
+            if error:
+                failed_clusters.append(database_identifier)
+
+        if failed_clusters:
+            raise RDSEnvironmentError(
+                "Failed to update RDS clusters: {0}".format(", ".join(failed_clusters)))
+
+    def _timed_update_cluster(self, rds):
+        """
+        Updates a single cluster and returns how long it took along with the error, if any, so that one
+        failing cluster doesn't stop the others from being updated
+        """
+        start_time = time.time()
+        error = None
+        try:
+            rds.update_cluster()
+        except Exception as err:
+            logger.exception("Failed to update RDS cluster %s", rds.database_name)
+            error = err
+        return time.time() - start_time, error
 
     def get_db_instances(self, status=None):
         """
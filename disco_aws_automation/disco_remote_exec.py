@@ -2,22 +2,152 @@
 ssh and rsync code
 """
 from __future__ import print_function
+import json
 import logging
 import subprocess
 import os
 import stat
-import shutil
 import tempfile
+import time
 import socket
+from threading import Lock
 
 from boto.exception import S3ResponseError
 
 from .disco_creds import DiscoS3Bucket, SSH_PRIVATE_KEY_BUCKET_PREFIX
 from .exceptions import CommandError
+from .resource_helper import parallel_map
 
 logger = logging.getLogger(__name__)
 
 SSH_DEFAULT_OPTIONS = ["-oBatchMode=yes", "-oStrictHostKeyChecking=no", '-oUserKnownHostsFile=/dev/null']
+SSH_KEY_CACHE_DIR = os.path.expanduser("~/.asiaq/ssh_keys")
+SSH_KEY_CACHE_TTL = 900  # seconds a bucket listing is trusted before the keys' ETags are checked again
+
+
+class SSHKeyCache(object):
+    """
+    Local record of the private ssh keys in our credential buckets: their ETags and fingerprints, kept
+    in a directory only the user can read. The keys themselves are not kept, they are downloaded when
+    the ssh agent doesn't hold them and removed once they are added to it.
+
+    A bucket's keys are known without asking S3 for SSH_KEY_CACHE_TTL seconds after it was listed. After
+    that the bucket is listed again, keys removed from it are forgotten and keys whose ETag changed lose
+    their fingerprint, so they are downloaded again.
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, cache_dir=SSH_KEY_CACHE_DIR, ttl=SSH_KEY_CACHE_TTL):
+        self._cache_dir = cache_dir
+        self._ttl = ttl
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        os.chmod(cache_dir, stat.S_IRWXU)
+        self._manifest_path = os.path.join(cache_dir, SSHKeyCache.MANIFEST)
+        self._manifest = None  # loaded by get_keys
+        self._lock = Lock()
+
+    def get_keys(self, credential_buckets):
+        """
+        Returns a list of ((bucket name, key name), fingerprint) of the private ssh keys in the credential
+        buckets. The fingerprint is None for keys that have not been downloaded since they changed.
+        """
+        manifest = self._manifest = self._load_manifest()
+        now = time.time()
+        stale_buckets = [bucket_name for bucket_name in credential_buckets
+                         if not self._is_fresh(manifest.get(bucket_name), now)]
+
+        listings = parallel_map(SSHKeyCache._list_keys, stale_buckets)
+        for bucket_name, listing in zip(stale_buckets, listings):
+            if listing is None:
+                manifest.pop(bucket_name, None)
+                continue
+            cached_keys = manifest.get(bucket_name, {}).get("keys", {})
+            keys = {}
+            for key_name, etag in listing:
+                cached = cached_keys.get(key_name, {})
+                fingerprint = cached.get("fingerprint") if cached.get("etag") == etag else None
+                keys[key_name] = {"etag": etag, "fingerprint": fingerprint}
+            # keys removed from the bucket are left out
+            manifest[bucket_name] = {"listed": now, "keys": keys}
+
+        if stale_buckets:
+            self._save_manifest(manifest)
+        return [((bucket_name, key_name), entry["fingerprint"])
+                for bucket_name in credential_buckets
+                for key_name, entry in manifest.get(bucket_name, {}).get("keys", {}).items()]
+
+    def download_keys(self, keys):
+        """
+        Downloads (bucket name, key name) keys returned by get_keys into temporary files only the user
+        can read, and records their fingerprints. Returns the paths of the files downloaded, the caller
+        must remove them once they are used. Keys that fail to download are left out.
+        """
+        if not keys:
+            return []
+        logger.debug("Downloading %s ssh keys", len(keys))
+        key_files = parallel_map(self._download, keys)
+        for (bucket_name, key_name), key_file in zip(keys, key_files):
+            if key_file:
+                entry = self._manifest[bucket_name]["keys"][key_name]
+                entry["fingerprint"] = SSHKeyCache._fingerprint(key_file)
+        self._save_manifest(self._manifest)
+        return [key_file for key_file in key_files if key_file]
+
+    def _is_fresh(self, bucket_entry, now):
+        return bucket_entry is not None and now - bucket_entry["listed"] < self._ttl
+
+    @staticmethod
+    def _list_keys(bucket_name):
+        """Returns a list of (key name, ETag) of the private ssh keys in a bucket, None if it has none"""
+        logger.debug("Listing ssh keys in %s", bucket_name)
+        try:
+            s3_keys = DiscoS3Bucket(bucket_name).list(SSH_PRIVATE_KEY_BUCKET_PREFIX)
+            return [(key.name, key.etag) for key in s3_keys if not key.name.endswith("/")]
+        except S3ResponseError:
+            # It is ok if the keys don't exist, but log something to debug
+            logger.info("Found no ssh keys at %s in %s", SSH_PRIVATE_KEY_BUCKET_PREFIX, bucket_name)
+            return None
+
+    def _download(self, key):
+        """Downloads a key into a new file only the user can read, returns its path or None on failure"""
+        bucket_name, key_name = key
+        # mkstemp creates the file readable only by the user, before any of the key is written to it
+        handle, key_file = tempfile.mkstemp(dir=self._cache_dir, suffix=".key")
+        os.close(handle)
+        try:
+            DiscoS3Bucket(bucket_name).get_contents_to_file(key_name, key_file)
+        except S3ResponseError:
+            logger.info("Failed to add ssh key %s", key_name)
+            os.remove(key_file)
+            return None
+        logger.debug("Downloaded ssh key %s", key_name)
+        return key_file
+
+    @staticmethod
+    def _fingerprint(key_file):
+        """Returns the fingerprint of a key as listed by ssh-add -l, or None if it can't be computed"""
+        try:
+            with open(os.devnull, "w") as devnull:
+                output = subprocess.check_output(["ssh-keygen", "-l", "-f", key_file], stderr=devnull)
+            return output.split()[1]
+        except (subprocess.CalledProcessError, OSError, IndexError):
+            return None
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path) as manifest_file:
+                return json.load(manifest_file)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        # write to a temporary file and rename it so concurrent processes never read a partial manifest
+        with self._lock:
+            handle, temp_path = tempfile.mkstemp(dir=self._cache_dir)
+            with os.fdopen(handle, "w") as manifest_file:
+                json.dump(manifest, manifest_file)
+            os.rename(temp_path, self._manifest_path)
 
 
 class DiscoRemoteExec(object):
@@ -29,52 +159,38 @@ class DiscoRemoteExec(object):
     def __init__(self, credential_buckets):
         DiscoRemoteExec.add_ssh_keys(credential_buckets)
 
-    @staticmethod
-    def add_ssh_keys_in_bucket(tempdir, bucket_name):
-        """
-        Grabs all the private ssh keys we have access to in the named bucket and
-        adds them to our ssh keychain.
-        """
-        try:
-            s3_bucket = DiscoS3Bucket(bucket_name)
-        except S3ResponseError:
-            # It is ok if the keys don't exist, but log something to debug
-            logger.info("Found no ssh keys at %s", SSH_PRIVATE_KEY_BUCKET_PREFIX)
-            return
-
-        for key in s3_bucket.listkeys(SSH_PRIVATE_KEY_BUCKET_PREFIX):
-            keyfile = tempdir + '/' + key
-            # write the ssh key to a temporary file
-            try:
-                s3_bucket.get_contents_to_file(key, keyfile)
-                os.chmod(keyfile, os.stat(keyfile).st_mode & (stat.S_IREAD | stat.S_IWRITE))
-                if os.system("ssh-add {0} 2> /dev/null".format(keyfile)) != 0:
-                    raise CommandError("Failed to add {0} key".format(keyfile))
-                logger.debug("Added ssh key %s", key)
-            except S3ResponseError:
-                logger.info("Failed to add ssh key %s", key)
-
     @staticmethod
     def add_ssh_keys(credential_buckets):
         """
         Grabs private ssh keys from each of our credential buckets and adds
-        them to our ssh keychain.
+        them to our ssh keychain. Keys that the agent already holds, according
+        to the fingerprints in a local SSHKeyCache, are not downloaded again.
         """
+        key_cache = SSHKeyCache()
+        keys = key_cache.get_keys(credential_buckets)
+        agent_fingerprints = DiscoRemoteExec._agent_fingerprints()
+        missing = [key for key, fingerprint in keys if fingerprint not in agent_fingerprints]
+        key_files = key_cache.download_keys(missing)
         try:
-            # Create temporary directory for the ssh key files
-            tempdir = tempfile.mkdtemp()
-            full_temp_path = tempdir + '/' + SSH_PRIVATE_KEY_BUCKET_PREFIX
-            if not os.path.exists(full_temp_path):
-                os.makedirs(full_temp_path)
-
-            # Add keys from each of our credential buckets
-            for bucket_name in credential_buckets:
-                logger.debug("Adding keys from %s", bucket_name)
-                DiscoRemoteExec.add_ssh_keys_in_bucket(tempdir, bucket_name)
-
+            if key_files:
+                with open(os.devnull, "w") as devnull:
+                    if subprocess.call(["ssh-add"] + key_files, stderr=devnull) != 0:
+                        raise CommandError("Failed to add ssh keys {0}".format(
+                            " ".join(key_name for _, key_name in missing)))
         finally:
-            # Remove the temporary directory
-            shutil.rmtree(tempdir)
+            for key_file in key_files:
+                os.remove(key_file)
+        logger.debug("Added %s ssh keys, %s were already in the agent",
+                     len(key_files), len(keys) - len(missing))
+
+    @staticmethod
+    def _agent_fingerprints():
+        """Returns the fingerprints of the keys held by the ssh agent"""
+        with open(os.devnull, "w") as devnull:
+            process = subprocess.Popen(["ssh-add", "-l"], stdout=subprocess.PIPE, stderr=devnull)
+            output, _ = process.communicate()
+        # ssh-add -l lines look like "2048 SHA256:... comment (RSA)"
+        return set(line.split()[1] for line in output.splitlines() if len(line.split()) > 1)
 
     # R0914 Allow more than 15 local variables so we can pass a lot of options to ssh
     # pylint: disable=R0914
@@ -86,6 +202,9 @@ class DiscoRemoteExec(object):
         Runs the passed in command on a remote host, via a jump host if a jump_address
         is provided and if the address is not reachable without a jump host.
 
+        stdin may be the bytes to send to the command, or a file opened for reading which is
+        streamed to the command without being read into memory.
+
         Returns a tuple containing the return code and the standard output from the command.
         """
         is_reachable = DiscoRemoteExec._is_reachable(address)
@@ -103,12 +222,13 @@ class DiscoRemoteExec(object):
         # output subprocess into a file to bypass pipe buffer size limitation,
         # which might cause subprocess hanging, see
         # https://thraxil.org/users/anders/posts/2008/03/13/Subprocess-Hanging-PIPE-is-your-enemy/
+        streamed = hasattr(stdin, 'read')
         with tempfile.TemporaryFile() as output:
             process = subprocess.Popen(command,
-                                       stdin=subprocess.PIPE,
+                                       stdin=stdin if streamed else subprocess.PIPE,
                                        stdout=output,
                                        stderr=subprocess.STDOUT)
-            process.communicate(stdin)
+            process.communicate(None if streamed else stdin)
             output.seek(0)
             stdout = output.read()
             logger.debug(stdout)
@@ -19,6 +19,16 @@ class DiscoRoute53(object):
 
     def __init__(self):
         self.route53 = Route53Connection()
+        self._zones = {}  # Hosted zones by name, zones are looked up once per object
+
+    def _get_zone(self, hosted_zone_name):
+        """Returns the Hosted Zone with the given name"""
+        zone = self._zones.get(hosted_zone_name)
+        if not zone:
+            zone = throttled_call(self.route53.get_zone, hosted_zone_name)
+            if zone:
+                self._zones[hosted_zone_name] = zone
+        return zone
 
     def list_zones(self):
         """Returns a list of Hosted Zones in Route53"""
@@ -33,7 +43,7 @@ class DiscoRoute53(object):
             record_type (str): the type of record (A, AAAA, CNAME, etc)
             value (str): a single value to insert into the record
         """
-        zone = throttled_call(self.route53.get_zone, hosted_zone_name)
+        zone = self._get_zone(hosted_zone_name)
 
         record = Record(record_name, record_type, ttl=5)
         record.add_value(value)
@@ -51,7 +61,7 @@ class DiscoRoute53(object):
         Args:
             hosted_zone_name (str): the domain of the Hosted Zone
         """
-        zone = throttled_call(self.route53.get_zone, hosted_zone_name)
+        zone = self._get_zone(hosted_zone_name)
         return sorted(throttled_call(self.route53.get_all_rrsets, zone.id), key=lambda record: record.name)
 
     def delete_record(self, hosted_zone_name, record_name, record_type):
@@ -62,7 +72,7 @@ class DiscoRoute53(object):
             record_name (str): the name of the record
             record_type (str): the type of record (A, AAAA, CNAME, etc)
         """
-        zone = throttled_call(self.route53.get_zone, hosted_zone_name)
+        zone = self._get_zone(hosted_zone_name)
 
         records = throttled_call(self.route53.get_all_rrsets, zone.id)
         # Needs a default None, to prevent StopIteration when the iterator is exhausted
@@ -1,14 +1,18 @@
 '''Contains DiscoSNS class for manipulating SNS topics'''
 import logging
-import itertools
 
 import boto
 from boto.exception import BotoServerError
 
 import boto3
 
+from .resource_helper import throttled_call, parallel_map
+
 logger = logging.getLogger(__name__)
 
+# most SNS calls made at the same time when reconciling topics and subscriptions
+SNS_MAX_PARALLEL = 8
+
 
 class DiscoSNS(object):
     """
@@ -40,7 +44,7 @@ class DiscoSNS(object):
 
     def create_topic(self, name):
         """Creates a topic with the given name, if one doesn't exist already."""
-        self.sns.create_topic(name)
+        throttled_call(self.sns.create_topic, name)
 
     def delete_topic(self, name):
         """Deletes a topic with the given name."""
@@ -52,12 +56,12 @@ class DiscoSNS(object):
         Note that this will trigger a confirmation email from AWS to the target email, inviting the
         recipient to join the SNS topic. No topic notifications will be sent until recipient joins.
         """
-        self.sns.subscribe(self.topic_arn_from_name(topic_name), "email", email)
+        throttled_call(self.sns.subscribe, self.topic_arn_from_name(topic_name), "email", email)
 
     def subscribe_http(self, topic_name, url):
         """Subscribes an HTTP(s) callback to a topic."""
         protocol = url.split(":")[0]
-        self.sns.subscribe(self.topic_arn_from_name(topic_name), protocol, url)
+        throttled_call(self.sns.subscribe, self.topic_arn_from_name(topic_name), protocol, url)
 
     def subscribe(self, topic_name, endpoints):
         """
@@ -79,18 +83,53 @@ class DiscoSNS(object):
         """Returns list of topics that needs to be deleted"""
         return [topic
                 for topic in set(existing_topics) - set(desired_topics)
-                if topic.find("_") != -1 and topic.split("_")[-2] == env]
+                if DiscoSNS.is_env_topic(topic, env)]
 
     @staticmethod
     def get_subscriptions_to_delete(existing_subscriptions_by_topic, desired_subscriptions_by_topic, env):
         """Returns lists of subscriptions that needs to be deleted"""
         return [subscription_arn
                 for topic in existing_subscriptions_by_topic.keys()
-                if topic.find("_") != -1 and topic.rsplit("_")[-2] == env
+                if DiscoSNS.is_env_topic(topic, env)
                 for subscription_arn, subscription_endpoint in
                 existing_subscriptions_by_topic[topic].iteritems()
                 if subscription_endpoint not in desired_subscriptions_by_topic.get(topic, [])]
 
+    @staticmethod
+    def is_env_topic(topic, env):
+        """Returns True if the topic name belongs to the environment, like astro_topic1_<env>_critical"""
+        return topic.find("_") != -1 and topic.split("_")[-2] == env
+
+    def get_topic_names(self):
+        """Returns the names of all the topics in the account, reading every page of topics"""
+        topic_names = []
+        next_token = None
+        while True:
+            response = throttled_call(self.sns.get_all_topics, next_token=next_token)
+            result = response["ListTopicsResponse"]["ListTopicsResult"]
+            topic_names.extend(topic["TopicArn"].split(":")[-1] for topic in result["Topics"])
+            next_token = result.get("NextToken")
+            if not next_token:
+                return topic_names
+
+    def get_subscriptions(self, topic_name):
+        """
+        Returns a dict of the confirmed subscriptions of a topic, mapping subscription ARNs to endpoints
+        """
+        subscriptions = {}
+        next_token = None
+        while True:
+            response = throttled_call(self.sns.get_all_subscriptions_by_topic,
+                                      self.topic_arn_from_name(topic_name), next_token=next_token)
+            result = response["ListSubscriptionsByTopicResponse"]["ListSubscriptionsByTopicResult"]
+            subscriptions.update(
+                (subscription["SubscriptionArn"], subscription["Endpoint"])
+                for subscription in result["Subscriptions"]
+                if subscription["SubscriptionArn"] != "PendingConfirmation")  # pending is managed by aws
+            next_token = result.get("NextToken")
+            if not next_token:
+                return subscriptions
+
     # >15 local variables is actually a good thing in the context of immutability
     # pylint: disable=R0914
     def update_sns_with_notifications(self, notifications, env, delete=False, dry_run=False):
@@ -98,29 +137,21 @@ class DiscoSNS(object):
         Updates SNS topics and subscriptions to match the ones given.
         If `delete` is True then it also deletes existing topics and subscriptions that were
         not included in `notifications`
+
+        Only the subscriptions of the environment's topics and the given topics are listed, and the
+        changes are made on a pool of SNS_MAX_PARALLEL threads.
         """
         desired_topics = [notification.name for notification in notifications]
         desired_subscriptions_by_topic = {
             notification.name: notification.endpoints
             for notification in notifications}
 
-        existing_topic_arns = [
-            topic["TopicArn"]
-            for topic in self.sns.get_all_topics()["ListTopicsResponse"]["ListTopicsResult"]["Topics"]]
-
-        existing_topics = [arn.split(":")[-1] for arn in existing_topic_arns]
-
-        existing_subscriptions = [
-            subscription
-            for subscription in self.sns.get_all_subscriptions()[
-                "ListSubscriptionsResponse"]["ListSubscriptionsResult"]["Subscriptions"]
-            if subscription["SubscriptionArn"] != "PendingConfirmation"]  # pending is managed by aws
-        existing_subscriptions_by_topic = {
-            topic_arn.split(":")[-1]: {
-                subscription["SubscriptionArn"]: subscription["Endpoint"]
-                for subscription in group}
-            for topic_arn, group in itertools.groupby(
-                existing_subscriptions, lambda subscription: subscription["TopicArn"])}
+        existing_topics = self.get_topic_names()
+        indexed_topics = [topic for topic in existing_topics
+                          if DiscoSNS.is_env_topic(topic, env) or topic in desired_subscriptions_by_topic]
+        existing_subscriptions_by_topic = dict(zip(
+            indexed_topics,
+            parallel_map(self.get_subscriptions, indexed_topics, max_workers=SNS_MAX_PARALLEL)))
 
         topics_to_delete = DiscoSNS.get_topics_to_delete(existing_topics, desired_topics, env)
 
@@ -142,11 +173,18 @@ class DiscoSNS(object):
             logger.info("The following subscriptions will be deleted: %s", subscriptions_to_delete)
 
         if not dry_run:
-            for notification in notifications:
-                self.create_topic(notification.name)
-                self.subscribe(notification.name, notification.endpoints)
+            def _update_notification(notification):
+                existing_subscriptions = existing_subscriptions_by_topic.get(notification.name)
+                if existing_subscriptions is None:
+                    self.create_topic(notification.name)
+                    existing_subscriptions = {}
+                existing_endpoints = set(existing_subscriptions.values())
+                self.subscribe(notification.name, [endpoint for endpoint in notification.endpoints
+                                                   if endpoint not in existing_endpoints])
+
+            parallel_map(_update_notification, notifications, max_workers=SNS_MAX_PARALLEL)
             if delete:
-                for topic in topics_to_delete_arn:
-                    self.sns.delete_topic(topic)
-                for subscription in subscriptions_to_delete:
-                    self.sns.unsubscribe(subscription)
+                parallel_map(lambda topic: throttled_call(self.sns.delete_topic, topic),
+                             topics_to_delete_arn, max_workers=SNS_MAX_PARALLEL)
+                parallel_map(lambda subscription: throttled_call(self.sns.unsubscribe, subscription),
+                             subscriptions_to_delete, max_workers=SNS_MAX_PARALLEL)
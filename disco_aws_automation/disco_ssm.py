@@ -13,7 +13,7 @@ from botocore.exceptions import ClientError
 from boto.exception import BotoServerError
 
 from .disco_config import read_config
-from .resource_helper import throttled_call, wait_for_state_boto3
+from .resource_helper import throttled_call, parallel_map
 from .exceptions import TimeoutError
 
 logger = logging.getLogger(__name__)
@@ -343,16 +343,13 @@ class DiscoSSM(object):
         logger.info("Unchanged documents: %s", unchanged_docs)
 
         if not dry_run:
-            # Include docs_to_update in docs_to_delete so that they can be recreated later
-            docs_to_delete |= docs_to_update
             self._delete_docs(docs_to_delete)
-            if wait:
-                self._wait_for_docs_deleted(docs_to_delete)
-
-            docs_to_create |= docs_to_update
             self._create_docs(docs_to_create)
+            self._update_docs(docs_to_update)
+
             if wait:
-                self._wait_for_docs_active(docs_to_create)
+                self._wait_for_docs_deleted(docs_to_delete)
+                self._wait_for_docs_active(docs_to_create | docs_to_update)
 
     def _create_docs(self, docs_to_create):
         for doc_name in docs_to_create:
@@ -365,50 +362,76 @@ class DiscoSSM(object):
             logger.debug("Deleting document: %s", doc_name)
             throttled_call(self.conn.delete_document, Name=doc_name)
 
+    def _update_docs(self, docs_to_update):
+        """
+        Updates the documents in place by creating a new version of each of them and promoting
+        that version to be the default one, so the documents never go missing during an update
+        """
+        for doc_name in docs_to_update:
+            ssm_json = self._read_ssm_file(doc_name)
+            logger.debug("Updating document: %s", doc_name)
+            response = throttled_call(self.conn.update_document, Content=ssm_json, Name=doc_name,
+                                      DocumentVersion="$LATEST")
+            new_version = response["DocumentDescription"]["DocumentVersion"]
+            throttled_call(self.conn.update_document_default_version, Name=doc_name,
+                           DocumentVersion=new_version)
+
     def _check_for_update(self, docs_to_check):
         """
         Returns the documents whose content in the configuration is different from
         the one currently in AWS
         """
+        doc_names = list(docs_to_check)
+        existing_contents = parallel_map(self.get_document_content, doc_names)
+
         docs_to_update = set()
-        for doc_name in docs_to_check:
+        for doc_name, existing_content in zip(doc_names, existing_contents):
             desired_json = self._read_ssm_file(doc_name)
-            existing_json = self._standardize_json_str(self.get_document_content(doc_name))
+            existing_json = self._standardize_json_str(existing_content) if existing_content else None
 
             if desired_json != existing_json:
                 docs_to_update.add(doc_name)
 
         return docs_to_update
 
-    def _wait_for_docs_deleted(self, docs_to_delete):
-        for doc_name in docs_to_delete:
-            time_passed = 0
+    def _get_doc_status(self, doc_name):
+        """Returns the status of a document or None if the document doesn't exist"""
+        try:
+            return throttled_call(self.conn.describe_document, Name=doc_name)["Document"]["Status"]
+        except ClientError:
+            return None
 
-            while True:
-                try:
-                    self.conn.describe_document(Name=doc_name)
-                except ClientError:
-                    # When the document is deleted, calling the describe method would
-                    # result in a ClientError being thrown, that's when we know the document
-                    # has been deleted.
-                    break
+    def _wait_for_docs(self, doc_names, is_done, description):
+        """
+        Waits for all of the given documents to satisfy is_done(status). Every poll checks all
+        of the pending documents at once so that the total wait is that of the slowest document.
+        """
+        pending_docs = list(doc_names)
+        time_passed = 0
 
-                if time_passed >= SSM_WAIT_TIMEOUT:
-                    raise TimeoutError(
-                        "Timed out waiting for document ({0}) to be deleted after {1}s"
-                        .format(doc_name, time_passed))
+        while pending_docs:
+            statuses = parallel_map(self._get_doc_status, pending_docs)
+            pending_docs = [doc_name for doc_name, status in zip(pending_docs, statuses)
+                            if not is_done(status)]
 
-                time.sleep(SSM_WAIT_SLEEP_INTERVAL)
-                time_passed += SSM_WAIT_SLEEP_INTERVAL
+            if not pending_docs:
+                break
+
+            if time_passed >= SSM_WAIT_TIMEOUT:
+                raise TimeoutError(
+                    "Timed out waiting for documents ({0}) to be {1} after {2}s"
+                    .format(pending_docs, description, time_passed))
+
+            time.sleep(SSM_WAIT_SLEEP_INTERVAL)
+            time_passed += SSM_WAIT_SLEEP_INTERVAL
+
+    def _wait_for_docs_deleted(self, docs_to_delete):
+        # When a document is deleted, calling the describe method results in a ClientError
+        # being thrown, that's when we know the document has been deleted.
+        self._wait_for_docs(docs_to_delete, lambda status: status is None, "deleted")
 
     def _wait_for_docs_active(self, docs_to_wait):
-        for doc_name in docs_to_wait:
-            wait_for_state_boto3(describe_func=self.conn.describe_document,
-                                 params_dict={"Name": doc_name},
-                                 resources_name="Document",
-                                 expected_state="Active",
-                                 state_attr="Status",
-                                 timeout=SSM_WAIT_TIMEOUT)
+        self._wait_for_docs(docs_to_wait, lambda status: status == "Active", "active")
 
     def _read_ssm_file(self, doc_name):
         file_path = "{0}/{1}{2}".format(SSM_DOCUMENTS_DIR, doc_name, SSM_EXT)
@@ -8,7 +8,6 @@ import logging
 
 import socket
 import time
-from ConfigParser import ConfigParser
 
 from datetime import datetime
 from boto.exception import EC2ResponseError
@@ -105,11 +104,8 @@ class DiscoVPC(object):
         """lazy load config"""
         if not self._config:
             try:
-                config = ConfigParser()
-                config_file = normalize_path(self.config_file)
-                logger.info("Reading VPC config %s", config_file)
-                config.read(config_file)
-                self._config = config
+                logger.info("Reading VPC config %s", normalize_path(self.config_file))
+                self._config = read_config(self.config_file)
             except Exception:
                 return None
         return self._config
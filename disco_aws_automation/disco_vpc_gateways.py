@@ -8,7 +8,7 @@ import time
 from boto.exception import EC2ResponseError
 
 from .resource_helper import (
-    wait_for_state_boto3, find_or_create, create_filters, throttled_call)
+    wait_for_state_boto3, find_or_create, create_filters, throttled_call, parallel_map)
 from .disco_eip import DiscoEIP
 from .disco_subnet import DYNO_NAT_TAG_KEY
 from .exceptions import (TimeoutError, EIPConfigError)
@@ -18,6 +18,7 @@ logger = logging.getLogger(__name__)
 
 VGW_STATE_POLL_INTERVAL = 2  # seconds
 VGW_ATTACH_TIME = 600  # seconds. From observation, it takes about 300s to attach vgw
+NAT_METANETWORK_MAX_PARALLEL = 5  # max meta networks updating NAT gateways at once
 
 
 class DiscoVPCGateways(object):
@@ -205,8 +206,9 @@ class DiscoVPCGateways(object):
 
         # Updating NAT gateways has to be done AFTER current NAT routes are calculated
         # because we don't want to delete existing NAT gateways before that.
-        for network in self.disco_vpc.networks.values():
-            self._update_nat_gateways(network, dry_run)
+        # Every meta network waits on its own NAT gateways, so they are all updated at the same time.
+        parallel_map(lambda network: self._update_nat_gateways(network, dry_run),
+                     self.disco_vpc.networks.values(), max_workers=NAT_METANETWORK_MAX_PARALLEL)
 
         routes_to_delete = current_nat_routes - desired_nat_routes
         logger.info("NAT gateway routes to delete (source, dest): %s", routes_to_delete)
@@ -2,8 +2,12 @@
 This module has utility functions for working with aws resources
 """
 import logging
+import sys
 import time
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
 from random import randint
+from threading import Lock
 
 from botocore.exceptions import ClientError, WaiterError
 from boto.exception import EC2ResponseError, BotoServerError
@@ -11,6 +15,7 @@ from boto.exception import EC2ResponseError, BotoServerError
 from .exceptions import (
     TimeoutError,
     ExpectedTimeoutError,
+    ProgrammerError,
     S3WritingError
 )
 
@@ -19,6 +24,7 @@ logger = logging.getLogger(__name__)
 STATE_POLL_INTERVAL = 2  # seconds
 INSTANCE_SSHABLE_POLL_INTERVAL = 15  # seconds
 MAX_POLL_INTERVAL = 60  # seconds
+DEFAULT_MAX_WORKERS = 8
 
 
 def create_filters(filter_dict):
@@ -238,6 +244,109 @@ def get_boto3_paged_results(func, results_key, next_token_key='NextToken', *args
     return response_items
 
 
+def parallel_map(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Apply func to every item using a bounded pool of threads and return the results in the
+    same order as items. The first exception raised by func is re-raised in the caller.
+
+    This is meant for fanning out independent AWS control plane calls, callers should still
+    wrap individual calls in throttled_call.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    if len(items) == 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_step_graph(steps, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Run steps that depend on each other on a bounded pool of threads, starting each step as soon as
+    the steps it depends on are done, and return a dict of the step results by step name.
+
+    steps is a list of (name, func, dependencies) tuples. func is called with the dict of the results
+    of the steps done so far, so it can use the results of its dependencies. The time each step took
+    is logged. When a step fails no further steps are started, and once the running steps are done
+    its exception is re-raised in the caller.
+    """
+    pending = {name: (func, set(dependencies)) for name, func, dependencies in steps}
+    unknown = set.union(set(), *[dependencies for _, dependencies in pending.values()]) - set(pending)
+    if len(pending) != len(steps) or unknown:
+        raise ProgrammerError("Steps must have unique names and depend on known steps: {0}".format(
+            [name for name, _, _ in steps]))
+
+    results = {}
+    done_queue = Queue()
+    error = None
+    running = 0
+    start_time = time.time()
+
+    def _run_step(name, func):
+        step_start_time = time.time()
+        try:
+            done_queue.put((name, func(results), None, time.time() - step_start_time))
+        except Exception:
+            done_queue.put((name, None, sys.exc_info(), time.time() - step_start_time))
+
+    pool = ThreadPool(max(1, min(max_workers, len(steps))))
+    try:
+        while True:
+            ready = [name for name, (_, dependencies) in pending.items() if dependencies <= set(results)]
+            if error is None:
+                for name in ready:
+                    func, _ = pending.pop(name)
+                    running += 1
+                    pool.apply_async(_run_step, (name, func))
+            if not running:
+                break
+            name, result, exc_info, seconds = done_queue.get()
+            running -= 1
+            logger.info("Step %s %s in %.1fs", name, "failed" if exc_info else "done", seconds)
+            if exc_info:
+                error = error or exc_info
+            else:
+                results[name] = result
+    finally:
+        pool.close()
+        pool.join()
+
+    if error:
+        raise error[0], error[1], error[2]
+    if pending:
+        raise ProgrammerError("Steps {0} depend on each other".format(sorted(pending)))
+    logger.info("Ran %s steps in %.1fs", len(results), time.time() - start_time)
+    return results
+
+
+class RateLimiter(object):
+    """
+    Spaces out calls made from any number of threads so that no more than calls_per_second
+    of them are started each second. Call wait() before each rate limited call.
+    """
+
+    def __init__(self, calls_per_second):
+        self._interval = 1.0 / calls_per_second
+        self._next_call_time = 0
+        self._lock = Lock()
+
+    def wait(self):
+        """Blocks until the next call may be made"""
+        with self._lock:
+            now = time.time()
+            wait_time = self._next_call_time - now
+            self._next_call_time = max(now, self._next_call_time) + self._interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
 def check_written_s3(object_name, expected_written_length, written_length):
     """
     Check S3 object is written by checking the bytes_written from key.set_contents_from_* method
@@ -75,6 +75,8 @@ class SpotinstClient(object):
         :param int grace_period: Amount of time in seconds to wait for instances to pass health checks
         :param str health_check_type: Type of health check to use. Available options are ELB, TARGET_GROUP,
                                       MLB, HCS, EC2, NONE
+        :return: The deployment started by the roll, or None if the response doesn't include it
+        :rtype: dict
         """
         request = {
             "batchSizePercentage": batch_percentage,
@@ -84,7 +86,10 @@ class SpotinstClient(object):
                 "action": "REPLACE_SERVER"
             }
         }
-        self._make_throttled_request(path='aws/ec2/group/%s/roll' % group_id, data=request, method='put')
+        response = self._make_throttled_request(path='aws/ec2/group/%s/roll' % group_id, data=request,
+                                                method='put')
+        items = response['response'].get('items')
+        return items[0] if items else None
 
     def get_deployments(self, group_id):
         """
@@ -20,38 +20,51 @@ fi
 
 source "$(dirname $0)/boto_init.sh" 2>&1 > /dev/null
 
-function bake {
+function post_status {
     local hostclass=$1
-    local attempt=0
-    local exit_code=1
+    local succeeded=$2
+    curl -ksS -X POST $JENKINS_URL/job/$STATUS_JOB_NAME/build --data token=$TOKEN \
+        --data-urlencode json="{\"parameter\": [{\"name\":\"HOSTCLASS\", \"value\":\"$hostclass\"}, {\"name\":\"SUCCEEDED\", \"value\":\"$succeeded\"}]}"
+}
+
+function bake_hostclasses {
+    local hostclass_args=""
+    local log_file="$LOG_DIR/bakeall.log"
+    local results_file="$LOG_DIR/bakeall.results"
     if [ "${BAKE_TO_STAGE}" != "" ]; then
         stage_arg="--stage=$BAKE_TO_STAGE"
     fi
+    if [ "${MAX_PARALLEL}" != "" ]; then
+        parallel_arg="--max-parallel=$MAX_PARALLEL"
+    fi
 
-    while [ "$exit_code" != "0" -a "$attempt" -lt "$MAX_ATTEMPTS" ]; do
-        local log_file="$LOG_DIR/$hostclass.$attempt.log"
-        echo "Baking $hostclass -- log at $log_file"
-        disco_bake.py --debug bake --hostclass $hostclass --use-local-ip $stage_arg &> $log_file
-        exit_code="$?"
-        attempt=$((attempt+1))
+    for hostclass in $* ; do
+        hostclass_args="$hostclass_args --hostclass $hostclass"
     done
 
-    if [[ "$exit_code" == "0" ]]; then
-        curl -ksS -X POST $JENKINS_URL/job/$STATUS_JOB_NAME/build --data token=$TOKEN \
-            --data-urlencode json="{\"parameter\": [{\"name\":\"HOSTCLASS\", \"value\":\"$hostclass\"}, {\"name\":\"SUCCEEDED\", \"value\":\"true\"}]}"
-    else
-        echo "Bake attempt $attempt for $hostclass failed, excerpt from $log_file:"
-        tail -n 250 $log_file | sed "s/^/$hostclass $attempt: /"
-        curl -ksS -X POST $JENKINS_URL/job/$STATUS_JOB_NAME/build --data token=$TOKEN \
-            --data-urlencode json="{\"parameter\": [{\"name\":\"HOSTCLASS\", \"value\":\"$hostclass\"}, {\"name\":\"SUCCEEDED\", \"value\":\"false\"}]}"
-    fi
-}
+    echo "Baking $* -- log at $log_file, log of each hostclass in $LOG_DIR/<hostclass>.log"
+    rm -f $results_file
+    disco_bake.py --debug bakeall $hostclass_args --max-attempts $MAX_ATTEMPTS --use-local-ip \
+        --results-file $results_file --log-dir $LOG_DIR $stage_arg $parallel_arg &> $log_file
 
-function bake_hostclasses {
-    local hostclasses=$*
+    if [[ ! -f $results_file ]]; then
+        echo "Baking failed, excerpt from $log_file:"
+        tail -n 250 $log_file
+        for hostclass in $* ; do
+            post_status $hostclass false
+        done
+        return
+    fi
 
-    for hostclass in $hostclasses ; do
-        bake $hostclass &
-    done
-    wait
+    # each result line is: hostclass ami_id attempts seconds
+    while read hostclass ami_id attempts seconds; do
+        if [[ "$ami_id" != "-" ]]; then
+            echo "Baked $hostclass as $ami_id in $seconds seconds ($attempts attempts)"
+            post_status $hostclass true
+        else
+            echo "Bake of $hostclass failed after $attempts attempts, excerpt from $LOG_DIR/$hostclass.log:"
+            tail -n 250 $LOG_DIR/$hostclass.log | sed "s/^/$hostclass: /"
+            post_status $hostclass false
+        fi
+    done < $results_file
 }
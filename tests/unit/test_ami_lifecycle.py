@@ -0,0 +1,106 @@
+"""
+Tests of ami_lifecycle
+"""
+from unittest import TestCase
+
+from boto.exception import EC2ResponseError
+from mock import MagicMock, patch
+
+from disco_aws_automation.ami_lifecycle import AMILifecyclePlan
+from disco_aws_automation.exceptions import AMIError
+
+
+def _mock_ami(ami_id, snapshot_ids):
+    ami = MagicMock()
+    ami.id = ami_id
+    ami.block_device_mapping = {
+        "/dev/sd{0}".format(chr(ord("a") + index)): MagicMock(snapshot_id=snapshot_id)
+        for index, snapshot_id in enumerate(snapshot_ids)
+    }
+    return ami
+
+
+class AMILifecyclePlanTests(TestCase):
+    '''Test AMILifecyclePlan class'''
+
+    def setUp(self):
+        self._connection = MagicMock()
+        self._plan = AMILifecyclePlan(self._connection, calls_per_second=1000)
+
+    def test_describe(self):
+        '''Test describe reports the number of calls the plan makes'''
+        self._plan.deregister(_mock_ami("ami-1", ["snap-1", "snap-2"]))
+        self._plan.deregister(_mock_ami("ami-2", [None]))
+        self._plan.grant_launch_permissions(_mock_ami("ami-3", []), ["123", "456"])
+        self._plan.grant_launch_permissions(_mock_ami("ami-4", []), [])
+
+        self.assertEqual(self._plan.call_count, 5)
+        self.assertIn("2 AMI deregistrations, 2 snapshot deletions and 1 launch permission grants",
+                      self._plan.describe())
+
+    def test_execute(self):
+        '''Test execute deregisters AMIs, deletes their snapshots and grants permissions'''
+        ami1 = _mock_ami("ami-1", ["snap-1", "snap-2"])
+        ami2 = _mock_ami("ami-2", [])
+        self._plan.deregister(ami1)
+        self._plan.grant_launch_permissions(ami2, ["123", "456"])
+
+        self._plan.execute()
+
+        ami1.deregister.assert_called_once_with()
+        ami2.set_launch_permissions.assert_called_once_with(["123", "456"])
+        self.assertEqual(sorted(call[0][0] for call in self._connection.delete_snapshot.call_args_list),
+                         ["snap-1", "snap-2"])
+
+    def test_execute_failure(self):
+        '''Test execute keeps the snapshots of an AMI it failed to deregister and reports the failure'''
+        ami1 = _mock_ami("ami-1", ["snap-1"])
+        ami1.deregister.side_effect = RuntimeError("Mock failure")
+        ami2 = _mock_ami("ami-2", ["snap-2"])
+        self._plan.deregister(ami1)
+        self._plan.deregister(ami2)
+
+        self.assertRaises(AMIError, self._plan.execute)
+
+        ami2.deregister.assert_called_once_with()
+        self._connection.delete_snapshot.assert_called_once_with("snap-2")
+
+    @patch('disco_aws_automation.ami_lifecycle.time.sleep')
+    def test_snapshot_in_use_is_retried(self, mock_sleep):
+        '''Test a snapshot still in use is deleted again soon, each attempt waiting on the rate limiter'''
+        in_use = EC2ResponseError(400, 'Bad Request')
+        in_use.error_code = 'InvalidSnapshot.InUse'
+        self._connection.delete_snapshot.side_effect = [in_use, in_use, True]
+        self._plan._rate_limiter = MagicMock()
+        self._plan.deregister(_mock_ami("ami-1", ["snap-1"]))
+
+        self._plan.execute()
+
+        self.assertEqual(self._connection.delete_snapshot.call_count, 3)
+        # one wait for the deregistration, one for each attempt at deleting the snapshot
+        self.assertEqual(self._plan._rate_limiter.wait.call_count, 4)
+        self.assertTrue(all(sleep_call[0][0] < 1 for sleep_call in mock_sleep.call_args_list))
+
+    @patch('time.sleep')
+    def test_snapshot_throttling_is_retried(self, mock_sleep):
+        '''Test a snapshot deletion that is throttled is backed off and deleted again'''
+        throttled = EC2ResponseError(503, 'Service Unavailable')
+        throttled.error_code = 'RequestLimitExceeded'
+        self._connection.delete_snapshot.side_effect = [throttled, True]
+        self._plan.deregister(_mock_ami("ami-1", ["snap-1"]))
+
+        self._plan.execute()
+
+        self.assertEqual(self._connection.delete_snapshot.call_count, 2)
+        self.assertTrue(mock_sleep.called)
+
+    def test_snapshot_failure_not_retried(self):
+        '''Test a snapshot deletion failing for another reason than being in use is not retried'''
+        not_found = EC2ResponseError(400, 'Bad Request')
+        not_found.error_code = 'InvalidSnapshot.NotFound'
+        self._connection.delete_snapshot.side_effect = not_found
+        self._plan.deregister(_mock_ami("ami-1", ["snap-1"]))
+
+        self.assertRaises(AMIError, self._plan.execute)
+
+        self._connection.delete_snapshot.assert_called_once_with("snap-1")
@@ -0,0 +1,71 @@
+"""
+Tests of bake_payload
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+from unittest import TestCase
+
+from disco_aws_automation.bake_payload import BakePayload
+
+
+class BakePayloadTests(TestCase):
+    '''Test BakePayload class'''
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._config_dir = os.path.join(self._tempdir, "config")
+        self._asiaq_dir = os.path.join(self._tempdir, "asiaq")
+        self._cache_dir = os.path.join(self._tempdir, "cache")
+        self._write(self._config_dir, "init/phase1.sh", "echo phase1")
+        self._write(self._config_dir, "discoroot/etc/hosts", "127.0.0.1 localhost")
+        self._write(self._asiaq_dir, "bin/disco_bake.py", "print 'bake'")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
+
+    @staticmethod
+    def _write(directory, relative_path, content):
+        full_path = os.path.join(directory, relative_path)
+        if not os.path.exists(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, "w") as output:
+            output.write(content)
+
+    def _payload(self):
+        return BakePayload([(self._config_dir, ""), (self._asiaq_dir, "asiaq")], cache_dir=self._cache_dir)
+
+    def test_pack(self):
+        '''Test pack lays out the sources in one tarball named by its hash'''
+        payload = self._payload().pack()
+        self.assertEqual(os.path.basename(payload.path), payload.digest + ".tar.gz")
+        self.assertEqual(payload.size, os.path.getsize(payload.path))
+        tar = tarfile.open(payload.path)
+        self.assertEqual(sorted(tar.getnames()),
+                         ["asiaq", "asiaq/bin", "asiaq/bin/disco_bake.py",
+                          "discoroot", "discoroot/etc", "discoroot/etc/hosts",
+                          "init", "init/phase1.sh"])
+
+    def test_pack_is_cached(self):
+        '''Test pack reuses the tarball when nothing changed and repacks when something did'''
+        first = self._payload().pack()
+        mtime = os.path.getmtime(first.path)
+        second = self._payload().pack()
+        self.assertEqual(first.digest, second.digest)
+        self.assertEqual(mtime, os.path.getmtime(second.path))
+
+        self._write(self._config_dir, "init/phase1.sh", "echo changed")
+        third = self._payload().pack()
+        self.assertNotEqual(first.digest, third.digest)
+
+    def test_pack_nosync(self):
+        '''Test pack leaves out the files listed in .nosync files'''
+        self._write(self._config_dir, ".nosync", "*.log\n- discoroot\n")
+        self._write(self._config_dir, "init/bake.log", "noise")
+        payload = self._payload().pack()
+        names = tarfile.open(payload.path).getnames()
+        self.assertIn("init/phase1.sh", names)
+        self.assertNotIn("init/bake.log", names)
+        self.assertNotIn("discoroot", names)
+        self.assertNotIn(".nosync", names)
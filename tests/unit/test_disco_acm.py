@@ -141,6 +141,7 @@ class DiscoACMTests(TestCase):
                          self.disco_acm.get_certificate_arn(TEST_DOMAIN_NAME),
                          'Failed to match most specific cert domain.')
         self._acm.list_certificates.return_value = {CERT_SUMMARY_LIST_KEY: [TEST_WILDCARD_CERT, TEST_CERT]}
+        self.disco_acm = DiscoACM(self._acm)
         self.assertEqual(TEST_CERTIFICATE_ARN_ACM_EXACT,
                          self.disco_acm.get_certificate_arn(TEST_DOMAIN_NAME),
                          'Failed to match most specific cert domain.')
@@ -155,3 +156,27 @@ class DiscoACMTests(TestCase):
         self.assertEqual(TEST_MULTI_CERT_ARN_ACM,
                          self.disco_acm.get_certificate_arn(TEST_MULTI_DOMAIN_NAME),
                          'Matching of domains with alt names needs to be fixed.')
+
+    def test_get_cert_arn_indexes_once(self):
+        """
+        test that the certs are listed and described once for any number of lookups
+        """
+        self.disco_acm.get_certificate_arn(TEST_DOMAIN_NAME)
+        self.disco_acm.get_certificate_arn(TEST_ALT_DOMAIN_NAME)
+        self.disco_acm.get_certificate_arn('non.existent.cert.domain')
+
+        self._acm.list_certificates.assert_called_once_with()
+        self.assertEqual(self._acm.describe_certificate.call_count, 4)
+
+    def test_get_cert_arn_reads_every_page(self):
+        """
+        test that certs on later pages of the cert listing are found
+        """
+        self._acm.list_certificates.side_effect = [
+            {CERT_SUMMARY_LIST_KEY: [TEST_WILDCARD_CERT], 'NextToken': 'page2'},
+            {CERT_SUMMARY_LIST_KEY: [TEST_CERT]}
+        ]
+
+        self.assertEqual(TEST_CERTIFICATE_ARN_ACM_EXACT,
+                         self.disco_acm.get_certificate_arn(TEST_DOMAIN_NAME))
+        self._acm.list_certificates.assert_called_with(NextToken='page2')
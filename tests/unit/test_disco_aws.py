@@ -116,6 +116,112 @@ class DiscoAWSTests(TestCase):
         mock_ami.id = aws.connection.create_image(instance.id, "test-ami", "this is a test ami")
         return mock_ami
 
+    @patch("disco_aws_automation.disco_aws.wait_for_state", MagicMock())
+    def test_provision_step_results(self):
+        """
+        Provision creates the group from the results of the steps before it, then its schedule and alarms
+        """
+        aws = DiscoAWS(config=get_mock_config(), environment_name=TEST_ENV_NAME, vpc=MagicMock(),
+                       storage=MagicMock(), discogroup=MagicMock(), elb=MagicMock(),
+                       log_metrics=MagicMock(), alarms=MagicMock())
+        aws.get_meta_network = _get_meta_network_mock()
+        aws.create_userdata = MagicMock(return_value={"owner": "unittestuser"})
+        aws.update_elb = MagicMock(return_value={"LoadBalancerName": "unittest-elb"})
+        aws.create_floating_interfaces = MagicMock()
+        aws.get_block_device_mappings = MagicMock(return_value=["unittest-bdm"])
+        aws.create_scaling_schedule = MagicMock()
+        aws.discogroup.create_or_update_group.return_value = {"name": "unittest-group"}
+
+        metadata = aws.provision(ami=MagicMock(id="ami-1234abcd"), hostclass="mhcunittest",
+                                 owner="unittestuser", instance_type="m3.large",
+                                 min_size=1, desired_size=1, max_size=1)
+
+        self.assertEqual(metadata["group_name"], "unittest-group")
+        group_kwargs = aws.discogroup.create_or_update_group.call_args[1]
+        self.assertEqual(group_kwargs["user_data"], 'owner="unittestuser"')
+        self.assertEqual(group_kwargs["load_balancers"], ["unittest-elb"])
+        self.assertEqual(group_kwargs["block_device_mappings"], ["unittest-bdm"])
+        self.assertEqual(group_kwargs["tags"]["owner"], "unittestuser")
+        aws.log_metrics.update.assert_called_once_with("mhcunittest")
+        aws.create_scaling_schedule.assert_called_once_with(1, 1, 1, group_name="unittest-group")
+        aws.alarms.create_alarms.assert_called_once_with("mhcunittest", "unittest-group")
+
+    @patch("disco_aws_automation.disco_aws.wait_for_state", MagicMock(side_effect=TimeoutError("ami")))
+    def test_provision_failed_step(self):
+        """
+        Provision creates nothing for an ami that never becomes available and re-raises the failure
+        """
+        aws = DiscoAWS(config=get_mock_config(), environment_name=TEST_ENV_NAME, vpc=MagicMock(),
+                       storage=MagicMock(), discogroup=MagicMock(), elb=MagicMock(),
+                       log_metrics=MagicMock(), alarms=MagicMock())
+        aws.get_meta_network = _get_meta_network_mock()
+        aws.create_userdata = MagicMock(return_value={"owner": "unittestuser"})
+        aws.update_elb = MagicMock()
+        aws.create_floating_interfaces = MagicMock()
+        aws.get_block_device_mappings = MagicMock()
+        aws.create_scaling_schedule = MagicMock()
+
+        self.assertRaises(TimeoutError, aws.provision, ami=MagicMock(id="ami-1234abcd"),
+                          hostclass="mhcunittest", owner="unittestuser", instance_type="m3.large",
+                          min_size=1, desired_size=1, max_size=1)
+
+        for not_started in [aws.get_block_device_mappings, aws.log_metrics.update,
+                            aws.create_floating_interfaces, aws.update_elb,
+                            aws.elb.get_or_create_target_group, aws.discogroup.create_or_update_group,
+                            aws.create_scaling_schedule, aws.alarms.create_alarms]:
+            self.assertFalse(not_started.called)
+
+    def test_hostclass_option_not_resolved_again(self):
+        """hostclass_option remembers options, including missing ones, rather than reading the config again"""
+        config = get_mock_config({"disco_aws": {"project_name": "unittest", "default_chaos": "True"},
+                                  "mhcunittest": {"chaos@" + TEST_ENV_NAME: "False"}})
+        aws = DiscoAWS(config=config, environment_name=TEST_ENV_NAME)
+
+        def _lookup():
+            self.assertEqual("False", aws.hostclass_option("mhcunittest", "chaos"))
+            self.assertEqual("True", aws.hostclass_option("mhcother", "chaos"))
+            self.assertIsNone(aws.hostclass_option_default("mhcunittest", "unset_option"))
+
+        _lookup()
+        with patch.object(config, "has_option") as has_option, patch.object(config, "get") as get:
+            _lookup()
+        self.assertFalse(has_option.called)
+        self.assertFalse(get.called)
+
+    def test_instance_pages(self):
+        """instance_pages yields a page of instances at a time, filtered to the environment's VPC"""
+        aws = DiscoAWS(config=get_mock_config(), environment_name=TEST_ENV_NAME, vpc=MagicMock())
+        aws.vpc.vpc_filters.return_value = [{"Name": "vpc-id", "Values": ["vpc-1234"]}]
+        aws._boto3_ec2 = MagicMock()
+        paginator = aws._boto3_ec2.get_paginator.return_value
+        paginator.paginate.return_value = [
+            {"Reservations": [{"Instances": [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}]}]},
+            {"Reservations": []},
+            {"Reservations": [{"Instances": [{"InstanceId": "i-3"}]}]}
+        ]
+
+        pages = list(aws.instance_pages({"tag:hostclass": "mhcfoo"}))
+
+        self.assertEqual([["i-1", "i-2"], ["i-3"]],
+                         [[instance["InstanceId"] for instance in page] for page in pages])
+        aws._boto3_ec2.get_paginator.assert_called_once_with("describe_instances")
+        self.assertItemsEqual([{"Name": "tag:hostclass", "Values": ["mhcfoo"]},
+                               {"Name": "vpc-id", "Values": ["vpc-1234"]}],
+                              paginator.paginate.call_args[1]["Filters"])
+
+    @patch("disco_aws_automation.disco_aws.STOP_BATCH_SIZE", 2)
+    def test_terminate_in_batches(self):
+        """Terminate sends the instance ids to EC2 in batches"""
+        aws = DiscoAWS(config=get_mock_config(), environment_name=TEST_ENV_NAME, boto2_conn=MagicMock(),
+                       vpc=MagicMock(), discogroup=MagicMock())
+        instances = [MagicMock(id="i-{0}".format(index), state="running") for index in range(5)]
+
+        aws.terminate(instances)
+
+        self.assertEqual([call[0][0] for call in aws.connection.terminate_instances.call_args_list],
+                         [["i-0", "i-1"], ["i-2", "i-3"], ["i-4"]])
+        self.assertEqual(aws.vpc.delete_instance_routes.call_count, 5)
+
     @skip("Broken due to boto3 upgrade. Need to refactor this test")
     @patch_disco_aws
     def test_provision_hostclass_simple(self, mock_config, **kwargs):
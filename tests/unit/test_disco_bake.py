@@ -1,7 +1,11 @@
 """
 Tests of disco_bake
 """
+import logging
+import os
 import random
+import shutil
+import tempfile
 from unittest import TestCase
 
 import boto.ec2.instance
@@ -87,6 +91,18 @@ class DiscoBakeTests(TestCase):
         self._bake.hc_option = Mock(return_value="mhcphase1")
         self.assertEqual("ami-abc002", self._bake._get_phase1_ami_id(hostclass="mhcfoo"))
 
+    def test_get_phase1_ami_id_is_cached(self):
+        '''Test that get_phase1_ami_id looks up the phase 1 AMI once until it is forgotten'''
+        self._bake.find_ami = Mock(return_value=Mock(id='ami-abcd1234'))
+        self._bake.hc_option = Mock(return_value="mhcphase1")
+        self.assertEqual("ami-abcd1234", self._bake._get_phase1_ami_id(hostclass="mhcntp"))
+        self.assertEqual("ami-abcd1234", self._bake._get_phase1_ami_id(hostclass="mhcfoo"))
+        self.assertEqual(self._bake.find_ami.call_count, 1)
+
+        self._bake._context.forget("phase1_ami_id")
+        self._bake._get_phase1_ami_id(hostclass="mhcntp")
+        self.assertEqual(self._bake.find_ami.call_count, 2)
+
     def test_get_phase1_ami_id_raises(self):
         '''Test that get_phase1_ami_id raises AMIError if find_ami returns None'''
         self._bake.find_ami = Mock(return_value=None)
@@ -301,7 +317,7 @@ class DiscoBakeTests(TestCase):
         self._bake.get_amis = MagicMock(return_value=amis)
         self._bake.option = MagicMock(return_value="MockAccount")
         self._bake.promote_latest_ami_to_production("mhcfoo")
-        amis[1].set_launch_permissions.assert_called_once_with("MockAccount")
+        amis[1].set_launch_permissions.assert_called_once_with(["MockAccount"])
         amis[0].set_launch_permissions.assert_not_called()
         amis[2].set_launch_permissions.assert_not_called()
 
@@ -318,3 +334,162 @@ class DiscoBakeTests(TestCase):
         amis.append(self.mock_ami('mhcfoo 4', 'untested', 'astro', is_private=True))
         self._bake.get_amis = MagicMock(return_value=amis)
         self.assertEqual(self._bake.list_stragglers(), {"mhcfoo": amis[1]})
+
+    def test_load_ami_creation_times(self):
+        """Test load_ami_creation_times looks up the snapshots of many AMIs in one call"""
+        amis = [
+            self.mock_ami('mhcfoo', block_device_mapping={'/dev/sda': MagicMock(snapshot_id='snap-1')}),
+            self.mock_ami('mhcbar', block_device_mapping={'/dev/sda': MagicMock(snapshot_id='snap-2'),
+                                                          '/dev/sdb': MagicMock(snapshot_id='snap-3')})
+        ]
+        self._bake.connection.get_all_snapshots.return_value = [
+            MagicMock(id='snap-1', start_time='2017-01-01T00:00:00.000Z'),
+            MagicMock(id='snap-2', start_time='2017-02-01T00:00:00.000Z'),
+            MagicMock(id='snap-3', start_time='2017-03-01T00:00:00.000Z')
+        ]
+        self._bake.load_ami_creation_times(amis)
+        self.assertEqual(self._bake.connection.get_all_snapshots.call_count, 1)
+        self.assertEqual(self._bake.get_ami_creation_time_from_snapshots(amis[0]).month, 1)
+        self.assertEqual(self._bake.get_ami_creation_time_from_snapshots(amis[1]).month, 3)
+        self.assertEqual(self._bake.connection.get_all_snapshots.call_count, 1)
+
+    def test_bake_amis(self):
+        """Test bake_amis bakes phase 1 before phase 2 and retries failed bakes"""
+        phases = {'mhcphase1': '1', 'mhcfoo': '2', 'mhcbar': '2'}
+        self._bake.hc_option = MagicMock(side_effect=lambda hostclass, key: phases[hostclass])
+        baked = []
+        attempts = {'mhcbar': 0}
+
+        def _bake_ami(hostclass, *_args, **_kwargs):
+            baked.append(hostclass)
+            if hostclass == 'mhcbar':
+                attempts['mhcbar'] += 1
+                if attempts['mhcbar'] == 1:
+                    raise Exception("bake failed")
+            return MagicMock(id='ami-' + hostclass)
+        self._bake.bake_ami = MagicMock(side_effect=_bake_ami)
+        self._bake._vpc = MagicMock()
+        self._bake._disco_remote_exec = MagicMock()
+        self._bake._aws_data_payload = MagicMock()
+        self._bake.repo_instance = MagicMock()
+
+        results = self._bake.bake_amis(['mhcfoo', 'mhcphase1', 'mhcbar'], max_parallel=1)
+
+        self.assertEqual(baked, ['mhcphase1', 'mhcfoo', 'mhcbar', 'mhcbar'])
+        self.assertEqual([result.hostclass for result in results], ['mhcfoo', 'mhcphase1', 'mhcbar'])
+        self.assertEqual([result.ami_id for result in results], ['ami-mhcfoo', 'ami-mhcphase1', 'ami-mhcbar'])
+        self.assertEqual(results[2].attempts, 2)
+
+    def test_bake_amis_uses_new_phase1_ami(self):
+        """Test bake_amis bakes phase 2 hostclasses from the phase 1 AMI it just baked"""
+        options = {'mhcphase1': {'phase': '1'}, 'mhcfoo': {'phase': '2', 'phase1_ami_name': 'mhcphase1'}}
+        self._bake.hc_option = MagicMock(side_effect=lambda hostclass, key: options[hostclass][key])
+        self._bake.find_ami = MagicMock()
+        source_amis = {}
+
+        def _bake_ami(hostclass, *_args, **_kwargs):
+            if hostclass == 'mhcfoo':
+                source_amis[hostclass] = self._bake._get_phase1_ami_id(hostclass)
+            return MagicMock(id='ami-' + hostclass)
+        self._bake.bake_ami = MagicMock(side_effect=_bake_ami)
+        self._bake._vpc = MagicMock()
+        self._bake._disco_remote_exec = MagicMock()
+        self._bake._aws_data_payload = MagicMock()
+        self._bake.repo_instance = MagicMock()
+
+        self._bake.bake_amis(['mhcfoo', 'mhcphase1'])
+
+        self.assertEqual(source_amis, {'mhcfoo': 'ami-mhcphase1'})
+        self.assertFalse(self._bake.find_ami.called)
+
+    def test_bake_amis_log_dir(self):
+        """Test bake_amis writes the log of each hostclass's bake to its own file"""
+        self._bake.hc_option = MagicMock(return_value='2')
+
+        def _bake_ami(hostclass, *_args, **_kwargs):
+            for _ in range(20):
+                logging.getLogger(__name__).warning("Baking %s", hostclass)
+            return MagicMock(id='ami-' + hostclass)
+        self._bake.bake_ami = MagicMock(side_effect=_bake_ami)
+        self._bake._vpc = MagicMock()
+        self._bake._disco_remote_exec = MagicMock()
+        self._bake._aws_data_payload = MagicMock()
+        self._bake.repo_instance = MagicMock()
+        log_dir = tempfile.mkdtemp()
+        try:
+            self._bake.bake_amis(['mhcfoo', 'mhcbar'], log_dir=log_dir)
+
+            for hostclass in ['mhcfoo', 'mhcbar']:
+                with open(os.path.join(log_dir, hostclass + '.log')) as log_file:
+                    lines = [line for line in log_file if 'WARNING' in line]
+                self.assertEqual(20, len(lines))
+                self.assertTrue(all(line.rstrip().endswith('Baking ' + hostclass) for line in lines))
+        finally:
+            shutil.rmtree(log_dir)
+
+    def test_bake_amis_gives_up(self):
+        """Test bake_amis reports a hostclass that failed every attempt"""
+        self._bake.hc_option = MagicMock(return_value='2')
+        self._bake.bake_ami = MagicMock(side_effect=Exception("bake failed"))
+        self._bake._vpc = MagicMock()
+        self._bake._disco_remote_exec = MagicMock()
+        self._bake._aws_data_payload = MagicMock()
+        self._bake.repo_instance = MagicMock()
+
+        results = self._bake.bake_amis(['mhcfoo'], max_attempts=3)
+
+        self.assertEqual(self._bake.bake_ami.call_count, 3)
+        self.assertIsNone(results[0].ami_id)
+
+    def test_copy_aws_data_skips_installed_payload(self):
+        """Test copy_aws_data does not send the payload to an instance that already has it"""
+        self._bake._aws_data_payload = MagicMock(digest='abc', size=10)
+        self._bake.remotecmd = MagicMock(return_value=(0, ''))
+        self._bake.copy_aws_data(MagicMock())
+        self.assertEqual(self._bake.remotecmd.call_count, 1)
+
+    def test_copy_aws_data_sends_payload(self):
+        """Test copy_aws_data streams the payload to an instance that doesn't have it"""
+        self._bake._aws_data_payload = MagicMock(digest='abc', size=10)
+        payload_file = self._bake._aws_data_payload.open.return_value.__enter__.return_value
+        self._bake.remotecmd = MagicMock(return_value=(1, ''))
+        self._bake.copy_aws_data(MagicMock())
+        self.assertEqual(self._bake.remotecmd.call_count, 2)
+        self.assertIs(self._bake.remotecmd.call_args[1]['stdin'], payload_file)
+        self.assertFalse(payload_file.read.called)
+
+    def test_copy_aws_data_hides_payload_url(self):
+        """Test copy_aws_data passes the signed payload url on stdin rather than in the command"""
+        self._bake._aws_data_payload = MagicMock(digest='abc', size=10)
+        self._bake._aws_data_payload_url = 'https://bucket/payload?Signature=secret'
+        self._bake.remotecmd = MagicMock(return_value=(1, ''))
+        self._bake.copy_aws_data(MagicMock())
+        self.assertNotIn('secret', str(self._bake.remotecmd.call_args[0]))
+        self.assertIn('secret', self._bake.remotecmd.call_args[1]['stdin'])
+
+    def test_load_prod_amis(self):
+        """Test load_prod_amis trusts the shared_with_account_ids tag and looks up the other AMIs"""
+        self._bake.option = MagicMock(return_value="111 222")
+        tagged = self.mock_ami("mhcfoo 0000000001")
+        tagged.tags = {"shared_with_account_ids": "111,222"}
+        shared = self.mock_ami("mhcfoo 0000000002")
+        shared.get_launch_permissions.return_value = {"user_ids": ["111"], "groups": ["222"]}
+        private = self.mock_ami("mhcfoo 0000000003")
+        private.get_launch_permissions.return_value = {"user_ids": ["111"]}
+
+        headers, output = self._bake.tabilize_amis([tagged, shared, private], in_prod=True)
+
+        self.assertIn("Production", headers)
+        self.assertEqual([row["Production"] for row in output], ["prod", "prod", "non-prod"])
+        self.assertFalse(tagged.get_launch_permissions.called)
+        self.assertTrue(self._bake.is_prod_ami(shared))
+        shared.get_launch_permissions.assert_called_once_with()
+
+    def test_invoke_host_init_looks_up_repo_once(self):
+        """Test invoke_host_init passes the repo ip and reuses the repo instance across bakes"""
+        self._bake._find_repo_instance = MagicMock(return_value=MagicMock(private_ip_address="10.0.0.1"))
+        self._bake.remotecmd = MagicMock()
+        self._bake.invoke_host_init(MagicMock(), "mhcfoo", "phase2.sh")
+        self._bake.invoke_host_init(MagicMock(), "mhcbar", "phase2.sh")
+        self._bake._find_repo_instance.assert_called_once_with()
+        self.assertEqual(self._bake.remotecmd.call_args[0][1][:3], [ANY, "mhcbar", "10.0.0.1"])
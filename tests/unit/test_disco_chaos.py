@@ -3,7 +3,7 @@ Tests of disco_aws
 """
 from unittest import TestCase
 
-from mock import MagicMock, create_autospec
+from mock import MagicMock, create_autospec, patch
 
 from disco_aws_automation import DiscoChaos, DiscoAWS, DiscoGroup
 from tests.helpers.patch_disco_aws import (get_default_config_dict,
@@ -26,9 +26,9 @@ class DiscoChaosTests(TestCase):
         group.desired_capacity = capacity
         group.instances = []
         group.tags = tags or []
-        for _ in xrange(0, capacity):
+        for index in xrange(0, capacity):
             instance = MagicMock()
-            instance.instance_id = 'i-12345678'
+            instance.instance_id = 'i-{0:08d}'.format(index)
             group.instances.append(instance)
         return group
 
@@ -88,3 +88,43 @@ class DiscoChaosTests(TestCase):
         self.chaos._groups = [self._mock_group(100)]
         self.chaos._disco_aws.instances = self._fake_instances
         self.assertEqual(len(self.chaos.get_instances_to_terminate()), int(25))
+
+    def test_chaotic_groups_listed_once(self):
+        """Groups are checked for chaos once for all the lookups"""
+        self.chaos._disco_aws.discogroup = create_autospec(DiscoGroup)
+        self.chaos._disco_aws.discogroup.get_existing_groups.return_value = [self._mock_group(10)]
+        self.chaos._disco_aws.instances = self._fake_instances
+        with patch.object(DiscoChaos, '_has_chaos', return_value=True) as has_chaos:
+            self.chaos.get_instances_to_terminate()
+        self.assertEqual(has_chaos.call_count, 1)
+        self.assertEqual(self.chaos._disco_aws.discogroup.get_existing_groups.call_count, 1)
+
+    def test_selection_reproducible_from_seed(self):
+        """The same seed selects the same instances"""
+        groups = [self._mock_group(100), self._mock_group(50)]
+        selections = []
+        for _ in xrange(2):
+            chaos = DiscoChaos(config=get_mock_config(get_default_config_dict()),
+                               environment_name=TEST_ENV_NAME,
+                               level=25.0, retainage=30.0, seed=42)
+            chaos._disco_aws = create_autospec(DiscoAWS)
+            chaos._disco_aws.instances = self._fake_instances
+            chaos._groups = groups
+            selections.append(chaos.get_instances_to_terminate())
+        self.assertEqual(selections[0], selections[1])
+
+    @patch('time.sleep')
+    def test_terminate_in_waves(self, sleep_mock):
+        """Instances are terminated in waves of the given size a minute apart"""
+        instances = [MagicMock() for _ in xrange(5)]
+        self.chaos.terminate(instances, per_minute=2)
+        self.assertEqual([call[0][0] for call in self.chaos._disco_aws.terminate.call_args_list],
+                         [instances[0:2], instances[2:4], instances[4:5]])
+        self.assertEqual(sleep_mock.call_count, 2)
+
+    def test_terminate_no_waves(self):
+        """Waves of fewer than one instance a minute are rejected rather than terminating all or none"""
+        instances = [MagicMock() for _ in xrange(5)]
+        for per_minute in [0, -1]:
+            self.assertRaises(ValueError, self.chaos.terminate, instances, per_minute=per_minute)
+        self.assertFalse(self.chaos._disco_aws.terminate.called)
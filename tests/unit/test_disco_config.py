@@ -1,7 +1,11 @@
 """Tests for disco_config utilities."""
 
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 from copy import deepcopy
+from StringIO import StringIO
 from ConfigParser import NoOptionError
 from mock import patch, Mock
 
@@ -87,6 +91,80 @@ class TestReadConfig(TestCase):
         parser.read.assert_called_once_with("FAKE_CONFIG_DIR/foo/bar/baz.ini")
 
 
+class TestParseConfig(TestCase):
+    """Tests for the cache of parsed configs."""
+
+    CONFIG = "[disco_aws]\ndefault_environment=ci\n\n[mhcfoo]\nphase=2\nlong=first\n  second\n\n[bake]\n"
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._config_file = os.path.join(self._tempdir, "disco_aws.ini")
+        with open(self._config_file, "w") as config_file:
+            config_file.write(self.CONFIG)
+        self._cache_dir = os.path.join(self._tempdir, "cache")
+        self._patches = [patch("disco_aws_automation.disco_config.CONFIG_CACHE_DIR", self._cache_dir),
+                         patch("disco_aws_automation.disco_config._PARSED_CONFIGS", {})]
+        for patcher in self._patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self._patches:
+            patcher.stop()
+        shutil.rmtree(self._tempdir)
+
+    def test__read__parsed_and_cached(self):
+        "Reading a config parses it like ConfigParser and caches the parsed config"
+        config = disco_config.AsiaqConfig()
+        self.assertEqual([self._config_file], config.read(self._config_file))
+        self.assertEqual(['disco_aws', 'mhcfoo', 'bake'], config.sections())
+        self.assertEqual("first\nsecond", config.get("mhcfoo", "long"))
+        self.assertEqual(['mhcfoo'], config.get_hostclasses_from_section_names())
+        self.assertEqual(1, len(os.listdir(self._cache_dir)))
+
+    def test__read__cached_config_not_parsed(self):
+        "A config with cached content is not parsed again, even by another process"
+        disco_config.AsiaqConfig().read(self._config_file)
+        disco_config._PARSED_CONFIGS.clear()
+        with patch("disco_aws_automation.disco_config.ConfigParser.readfp") as readfp:
+            config = disco_config.AsiaqConfig()
+            config.read([self._config_file, os.path.join(self._tempdir, "missing.ini")])
+        self.assertFalse(readfp.called)
+        self.assertEqual("ci", config.environment)
+        self.assertEqual("2", config.get_asiaq_option("phase", section="mhcfoo"))
+
+    def test__read__changed_config_parsed(self):
+        "A changed config is parsed again"
+        disco_config.AsiaqConfig().read(self._config_file)
+        with open(self._config_file, "a") as config_file:
+            config_file.write("[mhcbar]\nphase=1\n")
+        config = disco_config.AsiaqConfig()
+        config.read(self._config_file)
+        self.assertEqual(['mhcbar', 'mhcfoo'], sorted(config.get_hostclasses_from_section_names()))
+        # the parse of the old content is not kept
+        self.assertEqual(1, len(os.listdir(self._cache_dir)))
+
+    @patch("disco_aws_automation.disco_config.CONFIG_CACHE_MAX_ENTRIES", 2)
+    def test__read__cache_bounded(self):
+        "At most CONFIG_CACHE_MAX_ENTRIES parsed configs are kept"
+        for name in ["a.ini", "b.ini", "c.ini"]:
+            config_file = os.path.join(self._tempdir, name)
+            with open(config_file, "w") as config_out:
+                config_out.write("[{0}]\n".format(name))
+            disco_config.AsiaqConfig().read(config_file)
+        self.assertEqual(2, len(os.listdir(self._cache_dir)))
+
+    def test__read__many_files_indexes_hostclasses(self):
+        "Reading several config files indexes the hostclasses of all of them"
+        other_file = os.path.join(self._tempdir, "other.ini")
+        with open(other_file, "w") as config_file:
+            config_file.write("[mhcbar]\nphase=1\n[mhcfoo]\nphase=1\n")
+        config = disco_config.AsiaqConfig()
+        config.read([self._config_file, other_file])
+        with patch.object(config, "sections") as sections:
+            self.assertEqual(['mhcfoo', 'mhcbar'], config.get_hostclasses_from_section_names())
+        self.assertFalse(sections.called)
+
+
 @patch("disco_aws_automation.disco_config.ASIAQ_CONFIG", "FAKE_CONFIG_DIR")
 class TestOpenNormalized(TestCase):
     """Tests for the open_normalized utility function."""
@@ -224,3 +302,69 @@ class TestAsiaqConfig(TestCase):
         config_dict[disco_config.DEFAULT_CONFIG_SECTION].update(self.S3_BUCKET_CONFIG)
         config = MockAsiaqConfig(config_dict, environment="nope")
         self.assertEqual("bucket-base--foobar--blah", config.get_asiaq_s3_bucket_name('foobar'))
+
+    def test__get_asiaq_option__resolved_once(self):
+        "Repeated lookups of an option are answered without looking through the config again"
+        config = MockAsiaqConfig(deepcopy(self.BASE_CONFIG_DICT))
+        with patch.object(config, 'has_option', wraps=config.has_option) as has_option:
+            for _ in range(3):
+                self.assertEqual('default_env_answer',
+                                 config.get_asiaq_option('envy_option', section='mhcfoobar'))
+                self.assertIsNone(config.get_asiaq_option('nobody-cares-about-this', required=False))
+        self.assertEqual(has_option.call_count, 5)
+
+    def test__get_first_option__first_set(self):
+        "The first candidate that is set is returned, and the error getting the last one if none is set"
+        config = MockAsiaqConfig(deepcopy(self.BASE_CONFIG_DICT))
+        self.assertEqual('fallback_answer', config.get_first_option([
+            ('mhcfoobar', 'envy_option@nope'), ('mhcfoobar', 'envy_option'), ('mhcfoobar', 'easy_option')]))
+        for _ in range(2):
+            self.assertRaises(NoOptionError, config.get_first_option,
+                              [('mhcfoobar', 'nope'), (disco_config.DEFAULT_CONFIG_SECTION, 'default_nope')])
+
+    def test__get_first_option__not_resolved_again(self):
+        "Once the candidates are resolved, looking them up again neither checks nor reads the config"
+        config = MockAsiaqConfig(deepcopy(self.BASE_CONFIG_DICT))
+        candidates = [('mhcfoobar', 'nope'), (disco_config.DEFAULT_CONFIG_SECTION, 'default_unused_option')]
+        missing = [('mhcfoobar', 'nope'), (disco_config.DEFAULT_CONFIG_SECTION, 'default_nope')]
+        self.assertEqual('fall-all-the-way-back', config.get_first_option(candidates))
+        self.assertRaises(NoOptionError, config.get_first_option, missing)
+
+        with patch.object(config, 'has_option') as has_option, patch.object(config, 'get') as get:
+            self.assertEqual('fall-all-the-way-back', config.get_first_option(candidates))
+            self.assertRaises(NoOptionError, config.get_first_option, missing)
+        self.assertFalse(has_option.called)
+        self.assertFalse(get.called)
+
+    def test__get_first_option__forgotten_on_change(self):
+        "Changing the config forgets resolved candidates"
+        config = disco_config.AsiaqConfig(environment='ci')
+        config.readfp(StringIO("[mhcfoobar]\nenvy_option=fallback_answer\n"))
+        candidates = [('mhcfoobar', 'envy_option@ci'), ('mhcfoobar', 'envy_option')]
+        self.assertEqual('fallback_answer', config.get_first_option(candidates))
+
+        config.set('mhcfoobar', 'envy_option@ci', 'ci_answer')
+        self.assertEqual('ci_answer', config.get_first_option(candidates))
+
+    def test__get_asiaq_option__forgotten_on_change(self):
+        "Changing the config forgets resolved options"
+        config = disco_config.AsiaqConfig(environment='ci')
+        config.readfp(StringIO("[mhcfoobar]\nenvy_option=fallback_answer\n"))
+        self.assertEqual('fallback_answer', config.get_asiaq_option('envy_option', section='mhcfoobar'))
+        self.assertEqual(['mhcfoobar'], config.get_hostclasses_from_section_names())
+
+        config.set('mhcfoobar', 'envy_option@ci', 'ci_answer')
+        config.add_section('mhcbarfoo')
+        self.assertEqual('ci_answer', config.get_asiaq_option('envy_option', section='mhcfoobar'))
+        self.assertEqual(['mhcbarfoo', 'mhcfoobar'], sorted(config.get_hostclasses_from_section_names()))
+
+    def test__get_asiaq_option__not_resolved_again(self):
+        "Once an option is resolved, looking it up again neither checks nor reads the config"
+        config = MockAsiaqConfig(deepcopy(self.BASE_CONFIG_DICT))
+        self.assertEqual('default_env_answer', config.get_asiaq_option('envy_option', section='mhcfoobar'))
+
+        with patch.object(config, 'has_option') as has_option, patch.object(config, 'get') as get:
+            self.assertEqual('default_env_answer',
+                             config.get_asiaq_option('envy_option', section='mhcfoobar'))
+        self.assertFalse(has_option.called)
+        self.assertFalse(get.called)
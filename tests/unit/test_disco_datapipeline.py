@@ -451,6 +451,19 @@ class DataPipelineManagerTest(TestCase):
         self.assertEqual("mypipeline", searched[0]._name)
         self.assertEqual("buildit", searched[0]._id)
 
+    def test__fetch_or_create__known_pipelines__no_search(self):
+        "AsiaqDataPipelineManager.fetch_or_create with known pipelines does not search the account"
+        known = self.mgr.search_descriptions()
+        self.mock_client.reset_mock()
+        self.mock_client.get_pipeline_definition.return_value = {'pipelineObjects': Mock()}
+        found = self.mgr.fetch_or_create("dynamodb_backup", "mypipeline", "pipeline in ci",
+                                         tags={'environment': 'ci'}, log_location="s3://bucket/logs",
+                                         known_pipelines=known)
+        self.assertEqual("ciya", found._id)
+        self.mock_client.list_pipelines.assert_not_called()
+        self.mock_client.describe_pipelines.assert_not_called()
+        self.mock_client.get_pipeline_definition.assert_called_once_with(pipelineId="ciya", version="latest")
+
     def test__start__unpersisted__error(self):
         "AsiaqDataPipelineManager.start on a detached object: error"
         self.assertRaises(asiaq_exceptions.DataPipelineStateException,
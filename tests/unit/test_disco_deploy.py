@@ -398,6 +398,17 @@ class DiscoDeployTests(TestCase):
         self.assertEqual(latest_running_amis['mhcintegrated'], amis[1])
         self.assertEqual(latest_running_amis['mhcbar'], amis[2])
 
+    def test_get_latest_running_amis_is_loaded_once(self):
+        '''get_latest_running_amis looks up running instances and AMIs only once per run'''
+        amis = [self._amis_by_name['mhcbar 2'], self._amis_by_name['mhcfoo 4']]
+        self._ci_deploy._disco_bake.get_amis = MagicMock(return_value=amis)
+        self._ci_deploy.get_latest_running_amis = self._real_get_latest_running_amis
+        self._ci_deploy.get_latest_running_amis()
+        self._ci_deploy.get_latest_running_amis()
+        self.assertEqual(self._disco_aws.instances.call_count, 1)
+        self.assertEqual(self._ci_deploy._disco_bake.get_amis.call_count, 1)
+        self._ci_deploy._disco_bake.load_ami_creation_times.assert_called_once_with(amis)
+
     def test_get_update_amis_untested(self):
         '''Tests that we can find the next untested AMI to deploy in prod'''
         amis = {"mhcintegrated": self._amis_by_name['mhcintegrated 2']}
@@ -1286,6 +1297,45 @@ class DiscoDeployTests(TestCase):
         self.assertEqual(self._ci_deploy.get_test_amis.call_count, 1)
         self.assertEqual(self._ci_deploy.test_ami.call_count, 1)
 
+    def test_test_all_hostclasses(self):
+        '''Test test with all_hostclasses deploys every untested AMI'''
+        amis = [self._amis_by_name['mhcfoo 6'], self._amis_by_name['mhcbluegreen 2']]
+        self._ci_deploy.get_test_amis = MagicMock(return_value=amis)
+        self._ci_deploy.test_ami = MagicMock()
+        self._ci_deploy.test(all_hostclasses=True, max_parallel=2)
+        self.assertEqual(self._ci_deploy.test_ami.call_count, 2)
+
+    def test_test_all_hostclasses_failure_isolation(self):
+        '''Test test with all_hostclasses keeps going in a sequence when a hostclass fails'''
+        amis = [self._amis_by_name['mhcfoo 6'], self._amis_by_name['mhcbluegreen 2']]
+        self._ci_deploy.get_test_amis = MagicMock(return_value=amis)
+
+        def _test_ami(ami, *_args, **_kwargs):
+            if ami == amis[0]:
+                raise RuntimeError()
+        self._ci_deploy.test_ami = MagicMock(side_effect=_test_ami)
+        with self.assertRaisesRegexp(RuntimeError, "mhcfoo"):
+            self._ci_deploy.test(all_hostclasses=True)
+        self.assertEqual(self._ci_deploy.test_ami.call_count, 2)
+
+    def test_test_all_hostclasses_sequence(self):
+        '''Test test with all_hostclasses skips later sequences once a hostclass fails'''
+        amis = [self._amis_by_name['mhcfoo 6'], self._amis_by_name['mhcbluegreen 2']]
+        self._ci_deploy.get_test_amis = MagicMock(return_value=amis)
+        self._ci_deploy.get_sequence = MagicMock(
+            side_effect=lambda hostclass: 2 if hostclass == 'mhcfoo' else 1)
+        self._ci_deploy.test_ami = MagicMock(side_effect=RuntimeError())
+        with self.assertRaisesRegexp(RuntimeError, "mhcbluegreen mhcfoo"):
+            self._ci_deploy.test(all_hostclasses=True)
+        self._ci_deploy.test_ami.assert_called_once_with(amis[1], False, None, force_deployable=None)
+
+    def test_get_sequence(self):
+        '''Test get_sequence falls back to the default sequence'''
+        self._ci_deploy._hostclasses = {'mhcfoo': {'sequence': '3'}, 'mhcbar': {'sequence': ''}}
+        self.assertEqual(self._ci_deploy.get_sequence('mhcfoo'), 3)
+        self.assertEqual(self._ci_deploy.get_sequence('mhcbar'), 1)
+        self.assertEqual(self._ci_deploy.get_sequence('mhcnew'), 1)
+
     def test_update_with_amis(self):
         '''Test update with amis'''
         self._ci_deploy.update_ami = MagicMock()
@@ -1456,6 +1506,17 @@ class DiscoDeployTests(TestCase):
                                                             "test_hostclass")
         self.assertEqual(expected_hostclass, actual_hostclass)
 
+    def test_hostclass_option_not_resolved_again(self):
+        '''Tests that looking a hostclass option up again does not read the config again'''
+        self._ci_deploy.hostclass_option("hostclass_being_tested", "test_hostclass")
+
+        with patch.object(self._ci_deploy._config, 'has_option') as has_option, \
+                patch.object(self._ci_deploy._config, 'get') as get:
+            self.assertEqual("another_test_hostclass",
+                             self._ci_deploy.hostclass_option("hostclass_being_tested", "test_hostclass"))
+        self.assertFalse(has_option.called)
+        self.assertFalse(get.called)
+
     def test_correct_zero_pipeline_sizing(self):
         '''Tests that get deploy sizing corrects zero pipeline sizing'''
         post_deploy_pipeline = self._ci_deploy._generate_deploy_pipeline(
@@ -1,9 +1,12 @@
 """Test disco_dynamodb"""
+from threading import Lock
 from unittest import TestCase
+from mock import MagicMock
 from boto.dynamodb2.fields import HashKey, RangeKey, GlobalAllIndex
 from boto.dynamodb2.table import Table
 from moto import mock_dynamodb2
 from disco_aws_automation import DiscoDynamoDB
+from disco_aws_automation.disco_dynamodb import AsiaqDynamoDbBackupManager
 from disco_aws_automation.exceptions import DynamoDBEnvironmentError
 
 
@@ -21,6 +24,38 @@ MOCK_TABLE_READ_THROUGHPUT_UPDATE = 23
 MOCK_TABLE_WRITE_THROUGHPUT_UPDATE = 19
 
 
+class _FakePipelineManager(object):
+    """Records the pipelines fetched and started, safe to call from several threads at once"""
+
+    def __init__(self, fail_table=None):
+        self.fail_table = fail_table
+        self.known_pipelines = object()
+        self.searches = []
+        self.fetched = []
+        self.started = []
+        self._lock = Lock()
+
+    def search_descriptions(self, tags):
+        """Records the search and returns a stand-in for the pipelines found"""
+        with self._lock:
+            self.searches.append(tags)
+        return self.known_pipelines
+
+    def fetch_or_create(self, _template, **kwargs):
+        """Records the fetch, the pipeline returned is the name of its table"""
+        table_name = kwargs['tags']['table_name']
+        if table_name == self.fail_table:
+            raise RuntimeError("Mock failure")
+        with self._lock:
+            self.fetched.append(kwargs)
+        return table_name
+
+    def start(self, pipeline, param_values):
+        """Records the pipeline started and its parameters"""
+        with self._lock:
+            self.started.append((pipeline, param_values))
+
+
 class DiscoDynamoDBTests(TestCase):
     """Test disco_dynamodb"""
 
@@ -112,3 +147,65 @@ class DiscoDynamoDBTests(TestCase):
                 'write': write_throughput},
             global_indexes=[GlobalAllIndex(global_index_name,
                                            parts=[HashKey(global_index_attr_name)])])
+
+
+class AsiaqDynamoDbBackupManagerTests(TestCase):
+    """Test AsiaqDynamoDbBackupManager"""
+
+    def setUp(self):
+        config = MagicMock()
+        config.environment = ENVIRONMENT_NAME
+        self.backup_mgr = AsiaqDynamoDbBackupManager(config=config)
+        self.backup_mgr._mgr = MagicMock()
+        self.backup_mgr._s3_client = MagicMock()
+        self.backup_mgr._s3_bucket_name = "backup-bucket"
+        self.backup_mgr._dynamodb = MagicMock()
+        self.backup_mgr._dynamodb.get_real_table_identifiers = \
+            lambda name: ("us-west-2", name + "_" + ENVIRONMENT_NAME)
+
+    def test_create_backups_searches_once(self):
+        """Test creating backups of several tables looks up the existing pipelines once"""
+        mgr = self.backup_mgr._mgr = _FakePipelineManager()
+        self.backup_mgr.create_backups([MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2])
+
+        self.assertEqual([{'environment': ENVIRONMENT_NAME, 'template': 'dynamodb_backup'}], mgr.searches)
+        self.assertItemsEqual([MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2],
+                              [fetched['tags']['table_name'] for fetched in mgr.fetched])
+        for fetched in mgr.fetched:
+            self.assertIs(mgr.known_pipelines, fetched['known_pipelines'])
+        self.assertItemsEqual([MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2],
+                              [pipeline for pipeline, _ in mgr.started])
+
+    def test_restore_backups_uses_latest(self):
+        """Test restoring several tables restores each from its latest backup"""
+        def _list_objects(Prefix, **_kwargs):  # pylint: disable=invalid-name
+            return {'KeyCount': 2, 'IsTruncated': False,
+                    'CommonPrefixes': [{'Prefix': Prefix + '2017-01-02/'},
+                                       {'Prefix': Prefix + '2017-01-01/'}]}
+
+        self.backup_mgr._s3_client.list_objects_v2 = _list_objects
+        mgr = self.backup_mgr._mgr = _FakePipelineManager()
+        self.backup_mgr.restore_backups([MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2])
+
+        self.assertItemsEqual(
+            ["s3://backup-bucket/unittest/%s/2017-01-02/" % name
+             for name in [MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2]],
+            [params['myInputS3Loc'] for _, params in mgr.started])
+
+    def test_create_backups_failure(self):
+        """Test a failed table does not stop the others and is reported"""
+        mgr = self.backup_mgr._mgr = _FakePipelineManager(fail_table=MOCK_TABLE_NAME_1)
+
+        with self.assertRaises(DynamoDBEnvironmentError) as context:
+            self.backup_mgr.create_backups([MOCK_TABLE_NAME_1, MOCK_TABLE_NAME_2])
+
+        self.assertIn(MOCK_TABLE_NAME_1, str(context.exception))
+        self.assertNotIn(MOCK_TABLE_NAME_2, str(context.exception))
+        self.assertEqual([MOCK_TABLE_NAME_2], [pipeline for pipeline, _ in mgr.started])
+
+    def test_list_tables(self):
+        """Test listing the logical names of the tables in the environment"""
+        self.backup_mgr._dynamodb.get_all_tables.return_value = [
+            MOCK_TABLE_NAME_1 + "_" + ENVIRONMENT_NAME, MOCK_TABLE_NAME_2 + "_other"]
+
+        self.assertEqual([MOCK_TABLE_NAME_1], self.backup_mgr.list_tables())
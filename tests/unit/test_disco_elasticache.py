@@ -4,6 +4,8 @@ Tests of disco_elasticache
 from unittest import TestCase
 from mock import MagicMock, call, patch
 from disco_aws_automation import DiscoElastiCache
+from disco_aws_automation.disco_elasticache import ELASTICACHE_POLL_INTERVAL
+from disco_aws_automation.exceptions import CommandError
 from tests.helpers.matchers import MatchAnything
 from tests.helpers.patch_disco_aws import get_mock_config
 
@@ -110,6 +112,8 @@ class DiscoElastiCacheTests(TestCase):
         def _create_replication_group(**kwargs):
             self.replication_groups.append({
                 'ReplicationGroupId': kwargs['ReplicationGroupId'],
+                'Description': kwargs['ReplicationGroupDescription'],
+                'Status': 'available',
                 'NodeGroups': [{
                     'PrimaryEndpoint': {
                         'Address': 'foo.example.com'
@@ -234,6 +238,94 @@ class DiscoElastiCacheTests(TestCase):
             ReplicationGroupId=self.elasticache._get_redis_replication_group_id('old-cache')
         )
 
+        self.elasticache.route53.create_record.assert_any_call(
+            'example.com', 'new-cache-unittest.example.com', 'CNAME', 'foo.example.com'
+        )
+        # the new cluster is waited on by polling the listing rather than a waiter per cluster
+        self.elasticache.conn.get_waiter.assert_not_called()
+        self.elasticache.conn.create_cache_subnet_group.assert_not_called()
+
+    def test_update_all_failure(self):
+        """Test a cluster failing to update does not keep the new clusters from getting their DNS"""
+        self.elasticache.conn.modify_replication_group.side_effect = RuntimeError('Mock failure')
+
+        self.assertRaises(CommandError, self.elasticache.update_all)
+
+        self.elasticache.route53.create_record.assert_any_call(
+            'example.com', 'new-cache-unittest.example.com', 'CNAME', 'foo.example.com'
+        )
+
+    def test_update_all_wait_failure(self):
+        """Test a new cluster failing to create is reported along with the clusters that failed to update"""
+        self.elasticache.conn.modify_replication_group.side_effect = RuntimeError('Mock failure')
+        create_group = self.elasticache.conn.create_replication_group.side_effect
+
+        def _create_replication_group(**kwargs):
+            create_group(**kwargs)
+            self.replication_groups[-1]['Status'] = 'create-failed'
+
+        self.elasticache.conn.create_replication_group.side_effect = _create_replication_group
+
+        with self.assertRaises(CommandError) as context:
+            self.elasticache.update_all()
+
+        self.assertIn('old-cache', str(context.exception))
+        self.assertIn('Failed to create cache clusters: unittest-new-cache', str(context.exception))
+        self.elasticache.route53.create_record.assert_not_called()
+
+    def test_list_paginated(self):
+        """Test listing cache clusters across multiple pages"""
+        page_1 = {'ReplicationGroups': self.replication_groups[:1], 'Marker': 'page2'}
+        page_2 = {'ReplicationGroups': self.replication_groups[1:]}
+        self.elasticache.conn.describe_replication_groups.side_effect = [page_1, page_2]
+
+        clusters = self.elasticache.list()
+
+        self.assertEqual(['unittest-cache2', 'unittest-old-cache'],
+                         [cluster['Description'] for cluster in clusters])
+        self.elasticache.conn.describe_replication_groups.assert_called_with(Marker='page2')
+
+    @patch('time.sleep', return_value=None)
+    def test_update_all_waits_together(self, mock_sleep):
+        """Test update_all polls all of the new clusters in one listing until they are available"""
+        create_group = self.elasticache.conn.create_replication_group.side_effect
+
+        def _create_replication_group(**kwargs):
+            create_group(**kwargs)
+            self.replication_groups[-1]['Status'] = 'creating'
+
+        self.elasticache.conn.create_replication_group.side_effect = _create_replication_group
+
+        def _sleep(seconds):
+            if seconds != ELASTICACHE_POLL_INTERVAL:
+                return
+            for group in self.replication_groups:
+                group['Status'] = 'available'
+
+        mock_sleep.side_effect = _sleep
+
+        self.elasticache.update_all()
+
+        self.assertEqual(1, mock_sleep.call_args_list.count(call(ELASTICACHE_POLL_INTERVAL)))
+        self.elasticache.route53.create_record.assert_any_call(
+            'example.com', 'new-cache-unittest.example.com', 'CNAME', 'foo.example.com'
+        )
+
+    @patch('time.sleep', return_value=None)
+    def test_delete_all_cache_clusters_wait(self, mock_sleep):
+        """Test deleting all cache clusters and waiting for them to be gone"""
+        def _delete_replication_group(ReplicationGroupId):  # pylint: disable=C0103
+            self.replication_groups = [group for group in self.replication_groups
+                                       if group['ReplicationGroupId'] != ReplicationGroupId]
+
+        self.elasticache.conn.delete_replication_group.side_effect = _delete_replication_group
+
+        self.elasticache.delete_all_cache_clusters(wait=True)
+
+        self.assertEqual(2, self.elasticache.conn.delete_replication_group.call_count)
+        self.elasticache.conn.get_waiter.assert_not_called()
+        self.assertNotIn(call(ELASTICACHE_POLL_INTERVAL), mock_sleep.call_args_list)
+
     def test_delete_cache_cluster(self):
         """Test deleting a cache cluster"""
         self.elasticache.delete('old-cache')
@@ -119,6 +119,13 @@ class DiscoElastiSearchTests(TestCase):
         def _describe_elasticsearch_domain(DomainName):
             return self.domain_configs[DomainName]
 
+        # pylint doesn't like Boto3's argument names
+        # pylint: disable=C0103
+        def _describe_elasticsearch_domains(DomainNames):
+            return {"DomainStatusList": [self.domain_configs[domain_name]["DomainStatus"]
+                                         for domain_name in DomainNames
+                                         if domain_name in self.domain_configs]}
+
         def _create_elasticsearch_domain(**config):
             domain_name = config["DomainName"]
             if domain_name in self.domain_configs:
@@ -148,6 +155,7 @@ class DiscoElastiSearchTests(TestCase):
         self._es._conn.list_domain_names.side_effect = _list_domain_names
         self._es._conn.delete_elasticsearch_domain.side_effect = _delete_elasticsearch_domain
         self._es._conn.describe_elasticsearch_domain.side_effect = _describe_elasticsearch_domain
+        self._es._conn.describe_elasticsearch_domains.side_effect = _describe_elasticsearch_domains
         self._es._conn.create_elasticsearch_domain.side_effect = _create_elasticsearch_domain
         self._es._conn.update_elasticsearch_domain_config.side_effect = _update_elasticsearch_domain_config
 
@@ -195,6 +203,24 @@ class DiscoElastiSearchTests(TestCase):
         self._es.update("logs")
         self.assertIn("elasticsearch_endpoint", self._es.list(include_endpoint=True)[0])
 
+    def test_list_domains_with_endpoints_in_batches(self):
+        """If we list many domains with endpoints, they are described in batches"""
+        es_config = self._es._get_es_config("logs")
+        elasticsearch_names = ["logs-{}".format(index) for index in range(7)]
+        for elasticsearch_name in elasticsearch_names:
+            es_config["DomainName"] = self._es.get_domain_name(elasticsearch_name)
+            self._es.conn.create_elasticsearch_domain(**es_config)
+
+        domain_infos = self._es.list(include_endpoint=True)
+
+        self.assertEqual(
+            [self._get_endpoint(self._es.get_domain_name(elasticsearch_name))
+             for elasticsearch_name in elasticsearch_names],
+            [info["elasticsearch_endpoint"] for info in domain_infos]
+        )
+        self.assertEqual(2, self._es._conn.describe_elasticsearch_domains.call_count)
+        self.assertFalse(self._es._conn.describe_elasticsearch_domain.called)
+
     def test_get_endpoint_with_a_domain(self):
         """Verify that get_endpoint returns the correct endpoint for a domain"""
         elasticsearch_name = "logs"
@@ -223,6 +249,16 @@ class DiscoElastiSearchTests(TestCase):
         self._es.update()
         self.assertEqual(self._es._list(), expected_domain_names)
 
+    def test_create_all_reads_nat_eips_once(self):
+        """Verify that creating all domains reads the NAT gateway EIPs once for all their access policies"""
+        self._es._get_nat_eips = MagicMock(return_value="1.1.1.1,2.2.2.2")
+        self._es.update()
+        self.assertEqual(1, self._es._get_nat_eips.call_count)
+        for domain_name in ["es-logs-foo", "es-other-logs-foo"]:
+            access_policy = json.loads(self.domain_configs[domain_name]["DomainStatus"]["AccessPolicies"])
+            source_ips = access_policy["Statement"][0]["Condition"]["IpAddress"]["aws:SourceIp"]
+            self.assertEqual(["1.1.1.1", "2.2.2.2"], source_ips[-2:])
+
     def test_create_domain_respects_config_files(self):
         """Verify that create respects the configuration file"""
         elasticsearch_name = "logs"
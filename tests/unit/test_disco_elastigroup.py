@@ -8,6 +8,7 @@ from unittest import TestCase
 from parameterized import parameterized
 from mock import MagicMock, ANY, patch
 from disco_aws_automation import DiscoElastigroup
+from disco_aws_automation.exceptions import TimeoutError
 
 ENVIRONMENT_NAME = "moon"
 
@@ -623,3 +624,82 @@ class DiscoElastigroupTests(TestCase):
         launch_config = self.elastigroup.get_launch_config(hostclass='mhcfoo')
 
         self.assertEqual({'instance_type': 'm4.large'}, launch_config)
+
+    @patch("boto3.session.Session")
+    def test_groups_listed_once(self, session_mock):
+        """Verifies lookups share one listing of the elastigroups"""
+        group = self.mock_elastigroup(hostclass='mhcfoo')
+        other_group = self.mock_elastigroup(hostclass='mhcbar')
+        self.elastigroup.spotinst_client.get_groups.return_value = [group, other_group]
+        session_mock.return_value.region_name = 'us-moon'
+
+        self.assertEqual(group['id'], self.elastigroup.get_existing_group(hostclass='mhcfoo')['id'])
+        self.assertEqual(other_group['id'],
+                         self.elastigroup.get_existing_group(group_name=other_group['name'])['id'])
+        self.assertEqual({'instance_type': 'm4.large'},
+                         self.elastigroup.get_launch_config(hostclass='mhcbar'))
+        self.assertIsNone(self.elastigroup.get_existing_group(hostclass='mhcbaz'))
+
+        self.assertEqual(1, self.elastigroup.spotinst_client.get_groups.call_count)
+        self.assertEqual(1, session_mock.call_count)
+
+    @patch("boto3.session.Session")
+    def test_groups_listed_again_after_change(self, session_mock):
+        """Verifies the elastigroups are listed again after one is changed"""
+        group = self.mock_elastigroup(hostclass='mhcfoo')
+        self.elastigroup.spotinst_client.get_groups.return_value = [group]
+        session_mock.return_value.region_name = 'us-moon'
+
+        self.elastigroup.scaledown_groups(hostclass='mhcfoo')
+        self.elastigroup.get_existing_group(hostclass='mhcfoo')
+
+        self.assertEqual(2, self.elastigroup.spotinst_client.get_groups.call_count)
+
+    @patch("time.sleep")
+    def test_roll_groups(self, sleep_mock):
+        """Verifies many groups are rolled with a cap on how many roll at once"""
+        client = self.elastigroup.spotinst_client
+        client.roll_group.side_effect = lambda group_id, *_: {'id': 'deploy-' + group_id}
+        polls = {}
+
+        def _get_roll_status(group_id, deploy_id):
+            self.assertEqual('deploy-' + group_id, deploy_id)
+            polls[group_id] = polls.get(group_id, 0) + 1
+            if polls[group_id] < 2:
+                return {'status': 'in_progress', 'progress': {'unit': 'percent', 'value': 50}}
+            return {'status': 'finished', 'progress': {'unit': 'percent', 'value': 100}}
+
+        client.get_roll_status.side_effect = _get_roll_status
+
+        statuses = self.elastigroup.roll_groups(['sig-1', 'sig-2', 'sig-3'], max_parallel=2)
+
+        self.assertEqual({'sig-1': 'finished', 'sig-2': 'finished', 'sig-3': 'finished'}, statuses)
+        self.assertEqual(['sig-1', 'sig-2', 'sig-3'],
+                         [call[0][0] for call in client.roll_group.call_args_list])
+        # the third roll starts once the first two are done
+        self.assertEqual(4, sleep_mock.call_count)
+        self.assertFalse(client.get_deployments.called)
+
+    @patch("time.sleep")
+    def test_roll_groups_finds_deployment(self, sleep_mock):
+        """Verifies the deployment of a roll is found when starting the roll doesn't return it"""
+        client = self.elastigroup.spotinst_client
+        client.roll_group.return_value = None
+        client.get_deployments.return_value = [{'id': 'deploy-old'}, {'id': 'deploy-new'}]
+        client.get_roll_status.return_value = {'status': 'finished'}
+
+        self.assertEqual({'sig-1': 'finished'}, self.elastigroup.roll_groups(['sig-1']))
+
+        client.get_roll_status.assert_called_once_with('sig-1', 'deploy-new')
+        self.assertEqual(1, sleep_mock.call_count)
+
+    @patch("disco_aws_automation.disco_elastigroup.time")
+    def test_roll_groups_timeout(self, time_mock):
+        """Verifies a roll that doesn't finish in time is reported"""
+        time_mock.time.side_effect = [0, 10000]
+        client = self.elastigroup.spotinst_client
+        client.roll_group.return_value = {'id': 'deploy-1'}
+        client.get_roll_status.return_value = {'status': 'in_progress', 'progress': {'value': 10}}
+
+        self.assertRaises(TimeoutError, self.elastigroup.roll_groups, ['sig-1'], grace_period=100)
+        self.assertEqual(1, time_mock.sleep.call_count)
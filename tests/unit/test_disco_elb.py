@@ -1,10 +1,11 @@
 """Tests of disco_elb"""
 from unittest import TestCase
-from mock import MagicMock, ANY
+from mock import MagicMock, ANY, patch
 from moto import mock_elb
 from boto.exception import EC2ResponseError
 from disco_aws_automation import DiscoELB
-from disco_aws_automation.disco_elb import DiscoELBPortConfig, DiscoELBPortMapping
+from disco_aws_automation.disco_elb import DiscoELBPortConfig, DiscoELBPortMapping, ELBHealthWait
+from disco_aws_automation.exceptions import TimeoutError
 
 TEST_ENV_NAME = 'unittestenv'
 TEST_HOSTCLASS = 'mhcunit'
@@ -522,6 +523,62 @@ class DiscoELBTests(TestCase):
                                                                         Instances=instances)
         self.disco_elb.wait_for_instance_health_state(hostclass='mhcbar')
 
+    def test_list_paginated(self):
+        """Test that listing ELBs goes through every page of results"""
+        self.disco_elb._elb_client = MagicMock()
+        self.disco_elb.elb_client.describe_load_balancers.side_effect = [
+            {'LoadBalancerDescriptions': [{'LoadBalancerName': 'elb1', 'VPCId': TEST_VPC_ID},
+                                          {'LoadBalancerName': 'elb2', 'VPCId': 'vpc-other'}],
+             'NextMarker': 'mock_marker'},
+            {'LoadBalancerDescriptions': [{'LoadBalancerName': 'elb3', 'VPCId': TEST_VPC_ID}]}
+        ]
+
+        self.assertEqual(['elb1', 'elb3'], [elb['LoadBalancerName'] for elb in self.disco_elb.list()])
+        self.disco_elb.elb_client.describe_load_balancers.assert_called_with(Marker='mock_marker')
+
+    @mock_elb
+    def test_wait_for_multiple_elbs_health(self):
+        """Test that we can wait for instances attached to several ELBs at once"""
+        self._create_elb(hostclass='mhcbar')
+        self._create_elb(hostclass='mhcfoo')
+        for hostclass, instance_id in [('mhcbar', 'i-123123aa'), ('mhcfoo', 'i-123123bb')]:
+            self.disco_elb.elb_client.register_instances_with_load_balancer(
+                LoadBalancerName=self.disco_elb.get_elb_id(TEST_ENV_NAME, hostclass),
+                Instances=[{"InstanceId": instance_id}])
+
+        self.disco_elb.wait_for_instance_health_states([
+            ELBHealthWait(hostclass='mhcbar', testing=False, instance_ids=None),
+            ('mhcfoo', False, ['i-123123bb'])
+        ])
+
+    @mock_elb
+    @patch('time.sleep', return_value=None)
+    def test_wait_for_multiple_elbs_health_timeout(self, mock_sleep):
+        """Test that waiting for several ELBs times out when one of them never becomes healthy"""
+        self._create_elb(hostclass='mhcbar')
+        self._create_elb(hostclass='mhcfoo')
+        self.disco_elb.elb_client.register_instances_with_load_balancer(
+            LoadBalancerName=self.disco_elb.get_elb_id(TEST_ENV_NAME, 'mhcbar'),
+            Instances=[{"InstanceId": 'i-123123aa'}])
+
+        self.assertRaises(TimeoutError, self.disco_elb.wait_for_instance_health_states,
+                          [('mhcbar', False, None), ('mhcfoo', False, None)], timeout=0)
+
+    @patch('time.sleep', return_value=None)
+    def test_wait_for_same_elb_twice(self, mock_sleep):
+        """Test that waiting on one ELB for two sets of instances waits for both of them"""
+        self.disco_elb.get_elb = MagicMock(return_value={'LoadBalancerName': 'elb1'})
+        self.disco_elb._describe_instance_health = MagicMock(
+            side_effect=lambda elb_id, instance_ids: [
+                {'InstanceId': instance_id, 'State': 'InService' if instance_id == 'i-2' else 'Unknown'}
+                for instance_id in instance_ids
+            ]
+        )
+
+        with self.assertRaisesRegexp(TimeoutError, 'i-1'):
+            self.disco_elb.wait_for_instance_health_states(
+                [('mhcbar', False, ['i-1']), ('mhcbar', False, ['i-2'])], timeout=0)
+
     @mock_elb
     def test_tagging_elb(self):
         """Test tagging an ELB"""
@@ -1,4 +1,5 @@
 """Tests of disco_metanetwork"""
+from threading import Lock
 from unittest import TestCase
 
 from mock import MagicMock, call, patch
@@ -51,6 +52,21 @@ def _get_vpc_conn_mock():
     return ret
 
 
+class _SubnetCallRecorder(object):
+    """Records the calls of a DiscoSubnet method, safe to call from several threads at once"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = Lock()
+
+    def method(self):
+        """Returns a function that records the subnet it is called on and its keyword arguments"""
+        def _record(disco_subnet, **kwargs):
+            with self._lock:
+                self.calls.append((disco_subnet, kwargs))
+        return _record
+
+
 # DiscoSubnet.__init__ is being patched but not referenced.
 # pylint: disable=W0613
 class DiscoMetaNetworkTests(TestCase):
@@ -86,14 +102,15 @@ class DiscoMetaNetworkTests(TestCase):
 
     @patch('disco_aws_automation.disco_subnet.DiscoSubnet.__init__', return_value=None)
     @patch('disco_aws_automation.disco_subnet.DiscoSubnet.recreate_route_table', return_value=None)
-    @patch('disco_aws_automation.disco_subnet.DiscoSubnet.create_nat_gateway', return_value=None)
-    def test_create_nat_gateways(self, mock_create_nat_gateway,
-                                 mock_recreate_route_table, mock_subnet_init):
+    def test_create_nat_gateways(self, mock_recreate_route_table, mock_subnet_init):
         """ Verify that NAT gateways are properly created for a meta network  """
         mock_allocation_ids = ["allocation_id1", "allocation_id2", "allocation_id3"]
+        create_nat_gateway = _SubnetCallRecorder()
 
         self.meta_network.create()
-        self.meta_network.add_nat_gateways(allocation_ids=mock_allocation_ids)
+        with patch('disco_aws_automation.disco_subnet.DiscoSubnet.create_nat_gateway',
+                   create_nat_gateway.method()):
+            self.meta_network.add_nat_gateways(allocation_ids=mock_allocation_ids)
 
         self.assertFalse(self.meta_network.centralized_route_table)
         self.mock_vpc_conn.delete_route_table.assert_called_once_with(MOCK_ROUTE_TABLE.id)
@@ -103,32 +120,47 @@ class DiscoMetaNetworkTests(TestCase):
             recreate_route_table_calls.append(call())
         mock_recreate_route_table.assert_has_calls(recreate_route_table_calls)
 
-        nat_gateway_calls = []
-        for allocation_id in mock_allocation_ids:
-            nat_gateway_calls.append(call(eip_allocation_id=allocation_id))
-        mock_create_nat_gateway.assert_has_calls(nat_gateway_calls)
+        self.assertItemsEqual(self.meta_network.disco_subnets.values(),
+                              [disco_subnet for disco_subnet, _ in create_nat_gateway.calls])
+        self.assertItemsEqual([{"eip_allocation_id": allocation_id} for allocation_id in mock_allocation_ids],
+                              [kwargs for _, kwargs in create_nat_gateway.calls])
 
     @patch('disco_aws_automation.disco_subnet.DiscoSubnet.__init__', return_value=None)
     @patch('disco_aws_automation.disco_subnet.DiscoSubnet.recreate_route_table', return_value=None)
-    @patch('disco_aws_automation.disco_subnet.DiscoSubnet.create_nat_gateway', return_value=None)
-    def test_create_dyno_nat_gateways(self, mock_create_nat_gateway,
-                                      mock_recreate_route_table, mock_subnet_init):
+    def test_create_dyno_nat_gateways(self, mock_recreate_route_table, mock_subnet_init):
         """ Verify that NAT gateways are properly created for a meta network using dynamic EIPs"""
+        create_nat_gateway = _SubnetCallRecorder()
 
         self.meta_network.create()
-        self.meta_network.add_nat_gateways()
+        with patch('disco_aws_automation.disco_subnet.DiscoSubnet.create_nat_gateway',
+                   create_nat_gateway.method()):
+            self.meta_network.add_nat_gateways()
 
         self.assertFalse(self.meta_network.centralized_route_table)
         self.mock_vpc_conn.delete_route_table.assert_called_once_with(MOCK_ROUTE_TABLE.id)
 
         recreate_route_table_calls = []
-        nat_gateway_calls = []
         for _ in range(len(MOCK_ZONES)):
             recreate_route_table_calls.append(call())
-            nat_gateway_calls.append(call())
 
         mock_recreate_route_table.assert_has_calls(recreate_route_table_calls)
-        mock_create_nat_gateway.assert_has_calls(nat_gateway_calls)
+        self.assertItemsEqual([(disco_subnet, {})
+                               for disco_subnet in self.meta_network.disco_subnets.values()],
+                              create_nat_gateway.calls)
+
+    @patch('disco_aws_automation.disco_subnet.DiscoSubnet.__init__', return_value=None)
+    def test_delete_nat_gateways(self, mock_subnet_init):
+        """ Verify that the NAT gateways of every subnet in a meta network are deleted """
+        delete_nat_gateway = _SubnetCallRecorder()
+
+        self.meta_network.create()
+        with patch('disco_aws_automation.disco_subnet.DiscoSubnet.delete_nat_gateway',
+                   delete_nat_gateway.method()):
+            self.meta_network.delete_nat_gateways()
+
+        self.assertItemsEqual([(disco_subnet, {})
+                               for disco_subnet in self.meta_network.disco_subnets.values()],
+                              delete_nat_gateway.calls)
 
     @patch('disco_aws_automation.disco_subnet.DiscoSubnet.__init__', return_value=None)
     def test_create_nat_gateways__fail(self, mock_subnet_init):
@@ -400,3 +400,33 @@ class DiscoRDSTests(unittest.TestCase):
         self.rds.delete_db_instance = MagicMock()
         self.assertRaises(RDSEnvironmentError, self.rds.delete_all_db_instances)
         self.assertFalse(self.rds.delete_db_instance.called)
+
+    def test_update_all_clusters_shares_context(self):
+        """Test that all clusters in the VPC are updated using the same shared context"""
+        updated_clusters = []
+
+        def _update_cluster(rds):
+            updated_clusters.append((rds.database_name, rds.context))
+
+        with patch.object(RDS, 'update_cluster', autospec=True, side_effect=_update_cluster):
+            self.rds.vpc_name = 'some-env'
+            self.rds.update_all_clusters_in_vpc(parallel=True, max_workers=2)
+
+        self.assertEqual(['db-name', 'db-name-with-windows'],
+                         sorted(name for name, _ in updated_clusters))
+        self.assertEqual(1, len(set(context for _, context in updated_clusters)))
+
+    def test_update_all_clusters_failure(self):
+        """Test that a failing cluster doesn't stop the others from being updated"""
+        updated_clusters = []
+
+        def _update_cluster(rds):
+            if rds.database_name == 'db-name':
+                raise RuntimeError("Mock failure")
+            updated_clusters.append(rds.database_name)
+
+        with patch.object(RDS, 'update_cluster', autospec=True, side_effect=_update_cluster):
+            self.rds.vpc_name = 'some-env'
+            self.assertRaises(RDSEnvironmentError, self.rds.update_all_clusters_in_vpc, parallel=False)
+
+        self.assertEqual(['db-name-with-windows'], updated_clusters)
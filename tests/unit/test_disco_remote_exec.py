@@ -1,12 +1,16 @@
 """
 Tests of disco_remote_exec
 """
+import os
+import shutil
+import tempfile
 import unittest
 
-from mock import MagicMock, patch
+from boto.exception import S3ResponseError
+from mock import MagicMock, patch, ANY
 
 from disco_aws_automation import CommandError
-from disco_aws_automation.disco_remote_exec import DiscoRemoteExec
+from disco_aws_automation.disco_remote_exec import DiscoRemoteExec, SSHKeyCache
 
 TEST_DEFAULT_SSH_OPTIONS = '-oConnectTimeout=10 -oBatchMode=yes -oStrictHostKeyChecking=no " \
                  "-oUserKnownHostsFile=/dev/null'
@@ -66,6 +70,19 @@ class DiscoRemoteExecTests(unittest.TestCase):
         mock_get_exec_command.assert_called_once_with(TEST_ADDRESS, TEST_COMMAND, TEST_USER,
                                                       TEST_JUMP_ADDRESS, (), None)
 
+    # pylint: disable=unused-argument
+    @patch('disco_aws_automation.disco_remote_exec.DiscoRemoteExec._is_reachable', return_value=True)
+    @patch('subprocess.Popen', return_value=_get_mock_process())
+    def test_stream_stdin_file(self, mock_popen, mock_is_reachable):
+        """test that a file passed as stdin is streamed to the command rather than read"""
+        stdin_file = MagicMock()
+        DiscoRemoteExec.remotecmd(address=TEST_ADDRESS, remote_command=TEST_COMMAND, user=TEST_USER,
+                                  stdin=stdin_file)
+
+        self.assertIs(mock_popen.call_args[1]['stdin'], stdin_file)
+        mock_popen.return_value.communicate.assert_called_once_with(None)
+        self.assertFalse(stdin_file.read.called)
+
     def test_arguments_simple(self):
         """test getting ssh arguments with minimal options"""
         command = DiscoRemoteExec._get_remote_exec_command(address=TEST_ADDRESS,
@@ -146,3 +163,92 @@ class DiscoRemoteExecTests(unittest.TestCase):
                     TEST_COMMAND_STR]
 
         self.assertEqual(command, expected)
+
+
+class SSHKeyCacheTests(unittest.TestCase):
+    """Tests of SSHKeyCache"""
+
+    def setUp(self):
+        self._cache_dir = tempfile.mkdtemp()
+        self._s3_key = MagicMock(etag='"etag1"')
+        self._s3_key.name = 'private_keys/ssh/bake.pem'
+
+    def tearDown(self):
+        shutil.rmtree(self._cache_dir)
+
+    def _mock_bucket(self, mock_bucket_class):
+        def _get_contents_to_file(_key_name, file_name):
+            with open(file_name, "w") as key_file:
+                key_file.write("key")
+        mock_bucket_class.return_value.list.return_value = [self._s3_key]
+        mock_bucket_class.return_value.get_contents_to_file.side_effect = _get_contents_to_file
+        return mock_bucket_class.return_value
+
+    @patch('disco_aws_automation.disco_remote_exec.SSHKeyCache._fingerprint', return_value='SHA256:abc')
+    @patch('disco_aws_automation.disco_remote_exec.DiscoS3Bucket')
+    def test_keys_are_cached(self, mock_bucket_class, mock_fingerprint):
+        """test that keys are listed once while the cache is fresh and their fingerprints remembered"""
+        bucket = self._mock_bucket(mock_bucket_class)
+        key_cache = SSHKeyCache(self._cache_dir)
+        keys = key_cache.get_keys(['bucket1'])
+        self.assertEqual(keys, [(('bucket1', 'private_keys/ssh/bake.pem'), None)])
+
+        key_files = key_cache.download_keys([key for key, _ in keys])
+        self.assertEqual(len(key_files), 1)
+        self.assertEqual(os.stat(key_files[0]).st_mode & 0o777, 0o600)
+
+        self.assertEqual(SSHKeyCache(self._cache_dir).get_keys(['bucket1']),
+                         [(('bucket1', 'private_keys/ssh/bake.pem'), 'SHA256:abc')])
+        self.assertEqual(bucket.list.call_count, 1)
+        self.assertEqual(bucket.get_contents_to_file.call_count, 1)
+
+    @patch('disco_aws_automation.disco_remote_exec.SSHKeyCache._fingerprint', return_value='SHA256:abc')
+    @patch('disco_aws_automation.disco_remote_exec.DiscoS3Bucket')
+    def test_expired_keys_are_validated(self, mock_bucket_class, mock_fingerprint):
+        """test that an expired cache forgets the fingerprints of keys whose ETag changed"""
+        bucket = self._mock_bucket(mock_bucket_class)
+        key_cache = SSHKeyCache(self._cache_dir, ttl=0)
+        key_cache.download_keys([key for key, _ in key_cache.get_keys(['bucket1'])])
+
+        self.assertEqual(SSHKeyCache(self._cache_dir, ttl=0).get_keys(['bucket1'])[0][1], 'SHA256:abc')
+        self.assertEqual(bucket.list.call_count, 2)
+
+        self._s3_key.etag = '"etag2"'
+        self.assertIsNone(SSHKeyCache(self._cache_dir, ttl=0).get_keys(['bucket1'])[0][1])
+
+    @patch('disco_aws_automation.disco_remote_exec.DiscoS3Bucket')
+    def test_removed_keys_are_forgotten(self, mock_bucket_class):
+        """test that keys removed from a bucket are dropped once the bucket is listed again"""
+        bucket = self._mock_bucket(mock_bucket_class)
+        self.assertEqual(len(SSHKeyCache(self._cache_dir, ttl=0).get_keys(['bucket1'])), 1)
+
+        bucket.list.return_value = []
+        self.assertEqual(SSHKeyCache(self._cache_dir, ttl=0).get_keys(['bucket1']), [])
+
+    @patch('disco_aws_automation.disco_remote_exec.DiscoS3Bucket')
+    def test_failed_download_leaves_no_file(self, mock_bucket_class):
+        """test that a key that fails to download leaves nothing behind in the cache directory"""
+        bucket = self._mock_bucket(mock_bucket_class)
+        bucket.get_contents_to_file.side_effect = S3ResponseError(403, 'Forbidden')
+        key_cache = SSHKeyCache(self._cache_dir)
+
+        self.assertEqual(key_cache.download_keys([key for key, _ in key_cache.get_keys(['bucket1'])]), [])
+        self.assertEqual(os.listdir(self._cache_dir), [SSHKeyCache.MANIFEST])
+
+    @patch('disco_aws_automation.disco_remote_exec.DiscoRemoteExec._agent_fingerprints',
+           return_value=set(['SHA256:abc']))
+    @patch('disco_aws_automation.disco_remote_exec.SSHKeyCache.get_keys',
+           return_value=[(('bucket1', 'key1'), 'SHA256:abc'), (('bucket1', 'key2'), None)])
+    @patch('disco_aws_automation.disco_remote_exec.SSHKeyCache.download_keys')
+    @patch('subprocess.call', return_value=0)
+    def test_add_ssh_keys_skips_agent_keys(self, mock_call, mock_download_keys, mock_get_keys,
+                                           mock_agent_fingerprints):
+        """test that only keys missing from the agent are downloaded, added at once and then removed"""
+        key_file = os.path.join(self._cache_dir, 'key2')
+        open(key_file, 'w').close()
+        mock_download_keys.return_value = [key_file]
+        with patch('disco_aws_automation.disco_remote_exec.SSHKeyCache.__init__', return_value=None):
+            DiscoRemoteExec.add_ssh_keys(['bucket1'])
+        mock_download_keys.assert_called_once_with([('bucket1', 'key2')])
+        mock_call.assert_called_once_with(['ssh-add', key_file], stderr=ANY)
+        self.assertFalse(os.path.exists(key_file))
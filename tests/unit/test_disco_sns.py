@@ -1,5 +1,7 @@
 """Tests of disco_sns"""
+from threading import Lock
 from unittest import TestCase
+from mock import MagicMock
 from moto import mock_sns
 import boto
 from disco_aws_automation import DiscoSNS
@@ -11,6 +13,53 @@ SUBSCRIPTION_EMAIL_LIST = ["a@example.com", "b@example.com"]
 SUBSCRIPTION_URL = "https://example.com/fake_api_endpoint"
 
 
+class _FakeSNSConnection(object):
+    """Serves pages of topics and subscriptions and records the changes, safe to call from several threads"""
+
+    def __init__(self, topic_pages, subscriptions):
+        self.region = MagicMock()
+        self.region.name = "us-west-2"
+        self.topic_pages = topic_pages
+        self.subscriptions = subscriptions
+        self.listed_topics = []
+        self.created_topics = []
+        self.subscribed = []
+        self.deleted_topics = []
+        self.unsubscribed = []
+        self._lock = Lock()
+
+    def get_all_topics(self, next_token):
+        """Returns the page of topics for the token"""
+        return {"ListTopicsResponse": {"ListTopicsResult": self.topic_pages[next_token]}}
+
+    def get_all_subscriptions_by_topic(self, topic, next_token):
+        """Records the topic listed and returns all its subscriptions in one page"""
+        with self._lock:
+            self.listed_topics.append(topic)
+        return {"ListSubscriptionsByTopicResponse": {"ListSubscriptionsByTopicResult": {
+            "Subscriptions": self.subscriptions[topic]}}}
+
+    def create_topic(self, name):
+        """Records the topic created"""
+        with self._lock:
+            self.created_topics.append(name)
+
+    def subscribe(self, topic, protocol, endpoint):
+        """Records the subscription"""
+        with self._lock:
+            self.subscribed.append((topic, protocol, endpoint))
+
+    def delete_topic(self, topic):
+        """Records the topic deleted"""
+        with self._lock:
+            self.deleted_topics.append(topic)
+
+    def unsubscribe(self, subscription):
+        """Records the subscription deleted"""
+        with self._lock:
+            self.unsubscribed.append(subscription)
+
+
 class DiscoSNSTests(TestCase):
     """Test DiscoSNS class"""
 
@@ -68,3 +117,37 @@ class DiscoSNSTests(TestCase):
         expected_topic_to_delete = ["astro_topic2_ci_critical"]
         topic_to_delete = DiscoSNS.get_topics_to_delete(existing_topics, desired_topics, env)
         self.assertItemsEqual(expected_topic_to_delete, topic_to_delete)
+
+    def test_update_sns_with_notifications(self):
+        """Ensure only the environment's topics are indexed and only the differences are applied"""
+        arn = DiscoSNS(connection=_FakeSNSConnection({}, {}), account_id=ACCOUNT_ID).topic_arn_from_name
+        topic_pages = {
+            None: {"Topics": [{"TopicArn": arn("astro_topic1_ci_critical")},
+                              {"TopicArn": arn("astro_topic1_staging_critical")}],
+                   "NextToken": "page2"},
+            "page2": {"Topics": [{"TopicArn": arn("astro_topic2_ci_critical")}], "NextToken": None}
+        }
+        subscriptions = {
+            arn("astro_topic1_ci_critical"): [
+                {"SubscriptionArn": "sub-a", "Endpoint": "a@example.com"},
+                {"SubscriptionArn": "sub-old", "Endpoint": "old@example.com"},
+                {"SubscriptionArn": "PendingConfirmation", "Endpoint": "b@example.com"}],
+            arn("astro_topic2_ci_critical"): []
+        }
+        connection = _FakeSNSConnection(topic_pages, subscriptions)
+        disco_sns = DiscoSNS(connection=connection, account_id=ACCOUNT_ID)
+        notifications = [MagicMock(endpoints=["a@example.com", "b@example.com"]),
+                         MagicMock(endpoints=["c@example.com"])]
+        notifications[0].name = "astro_topic1_ci_critical"
+        notifications[1].name = "astro_topic3_ci_critical"
+
+        disco_sns.update_sns_with_notifications(notifications, "ci", delete=True)
+
+        self.assertItemsEqual([arn("astro_topic1_ci_critical"), arn("astro_topic2_ci_critical")],
+                              connection.listed_topics)
+        self.assertEqual(["astro_topic3_ci_critical"], connection.created_topics)
+        self.assertItemsEqual([(arn("astro_topic1_ci_critical"), "email", "b@example.com"),
+                               (arn("astro_topic3_ci_critical"), "email", "c@example.com")],
+                              connection.subscribed)
+        self.assertEqual([arn("astro_topic2_ci_critical")], connection.deleted_topics)
+        self.assertEqual(["sub-old"], connection.unsubscribed)
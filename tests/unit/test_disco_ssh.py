@@ -0,0 +1,196 @@
+"""Tests of disco_ssh"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from bin import disco_ssh
+from bin.disco_ssh import DiscoSSH
+
+ENVIRONMENT = "unittestenv"
+
+
+def _instance_lookup(hostname, ip_address=None, private_ip_address="10.0.0.1"):
+    return {
+        "id": "i-" + hostname,
+        "hostname": hostname,
+        "hostclass": "mhc" + hostname,
+        "ip_address": ip_address,
+        "private_ip_address": private_ip_address,
+        "interface_ips": [private_ip_address]
+    }
+
+
+def _ec2_instance(hostname, ip_address=None, private_ip_address="10.0.0.1"):
+    instance = MagicMock(id="i-" + hostname, ip_address=ip_address, private_ip_address=private_ip_address,
+                         interfaces=[MagicMock(private_ip_address=private_ip_address)])
+    instance.tags = {"hostname": hostname, "hostclass": "mhc" + hostname}
+    return instance
+
+
+class DiscoSSHTests(TestCase):
+    """Test DiscoSSH"""
+
+    def setUp(self):
+        self._cache_dir = tempfile.mkdtemp()
+        self._patches = [patch("bin.disco_ssh.SSH_LOOKUP_CACHE_DIR", self._cache_dir),
+                         patch("bin.disco_ssh.read_config", MagicMock()),
+                         patch("bin.disco_ssh.configure_logging", MagicMock())]
+        for patcher in self._patches:
+            patcher.start()
+        self.disco_ssh = self._disco_ssh()
+
+    def tearDown(self):
+        for patcher in self._patches:
+            patcher.stop()
+        shutil.rmtree(self._cache_dir)
+
+    def _disco_ssh(self, refresh=False):
+        ssh = DiscoSSH({"--env": ENVIRONMENT, "--first": False, "--debug": False, "--refresh": refresh})
+        ssh._aws = MagicMock()
+        ssh._aws.instances.return_value = [_ec2_instance("fetchedhost")]
+        ssh._aws.find_jump_address.return_value = "1.2.3.4"
+        return ssh
+
+    def _cache_path(self):
+        return os.path.join(self._cache_dir, "{0}.json".format(ENVIRONMENT))
+
+    def _write_cache(self, age, instances=None):
+        with open(self._cache_path(), "w") as cache_file:
+            json.dump({"fetched": time.time() - age,
+                       "instances": instances or [_instance_lookup("cachedhost")],
+                       "jump_address": "5.6.7.8"}, cache_file)
+
+    def _hostnames(self, lookups):
+        return [instance["hostname"] for instance in lookups["instances"]]
+
+    @patch("bin.disco_ssh.threading.Thread")
+    def test_cache_hit(self, mock_thread):
+        """Fresh cached lookups are used without asking EC2"""
+        self._write_cache(age=0)
+
+        self.assertEqual(["cachedhost"], self._hostnames(self.disco_ssh.lookups()))
+        self.assertFalse(self.disco_ssh._aws.instances.called)
+        self.assertFalse(mock_thread.called)
+
+    @patch("bin.disco_ssh.threading.Thread")
+    def test_cache_stale(self, mock_thread):
+        """Stale cached lookups are used and refreshed in the background"""
+        self._write_cache(age=disco_ssh.SSH_LOOKUP_CACHE_TTL + 1)
+
+        self.assertEqual(["cachedhost"], self._hostnames(self.disco_ssh.lookups()))
+        mock_thread.assert_called_once_with(target=self.disco_ssh._refresh_cache)
+        mock_thread.return_value.start.assert_called_once_with()
+
+    @patch("bin.disco_ssh.threading.Thread")
+    def test_cache_too_old(self, mock_thread):
+        """Cached lookups older than the max age are fetched from EC2 before they are used"""
+        self._write_cache(age=disco_ssh.SSH_LOOKUP_CACHE_MAX_AGE + 1)
+
+        self.assertEqual(["fetchedhost"], self._hostnames(self.disco_ssh.lookups()))
+        self.assertFalse(mock_thread.called)
+        with open(self._cache_path()) as cache_file:
+            self.assertEqual(["fetchedhost"], self._hostnames(json.load(cache_file)))
+
+    def test_cache_miss_then_refresh(self):
+        """A host that isn't in the cached lookups is looked up in EC2 again"""
+        self._write_cache(age=0)
+
+        self.assertEqual("fetchedhost", self.disco_ssh.match_instance("fetchedhost")["hostname"])
+        self.assertEqual(1, self.disco_ssh._aws.instances.call_count)
+        self.assertIsNone(self.disco_ssh.match_instance("missinghost"))
+        self.assertEqual(1, self.disco_ssh._aws.instances.call_count)
+
+    def test_cache_corrupt(self):
+        """Unreadable cached lookups are fetched from EC2 and the cache is rewritten"""
+        for corrupt in ['{"instances": ', '["fetched"]', '{"fetched": 0}']:
+            with open(self._cache_path(), "w") as cache_file:
+                cache_file.write(corrupt)
+
+            self.assertEqual(["fetchedhost"], self._hostnames(self._disco_ssh().lookups()))
+            with open(self._cache_path()) as cache_file:
+                self.assertEqual(["fetchedhost"], self._hostnames(json.load(cache_file)))
+
+    def test_refresh_ignores_cache(self):
+        """With --refresh the lookups are fetched from EC2 even if they are cached"""
+        self._write_cache(age=0)
+
+        self.assertEqual(["fetchedhost"], self._hostnames(self._disco_ssh(refresh=True).lookups()))
+
+    @patch("bin.disco_ssh.DiscoAWS")
+    def test_background_refresh(self, mock_disco_aws):
+        """The background refresh caches the lookups using its own DiscoAWS"""
+        self._write_cache(age=disco_ssh.SSH_LOOKUP_CACHE_TTL + 1)
+        mock_disco_aws.return_value = self.disco_ssh._aws
+        self.disco_ssh._aws = None
+
+        self.disco_ssh._refresh_cache()
+
+        self.assertIsNone(self.disco_ssh._aws)
+        with open(self._cache_path()) as cache_file:
+            self.assertEqual(["fetchedhost"], self._hostnames(json.load(cache_file)))
+
+    @patch("bin.disco_ssh.DiscoAWS")
+    @patch("bin.disco_ssh.logger")
+    def test_background_refresh_failure(self, mock_logger, mock_disco_aws):
+        """A failing background refresh is logged at debug level only and leaves the cache alone"""
+        self._write_cache(age=disco_ssh.SSH_LOOKUP_CACHE_TTL + 1)
+        mock_disco_aws.return_value.instances.side_effect = RuntimeError("Mock failure")
+
+        self.disco_ssh._refresh_cache()
+
+        self.assertTrue(mock_logger.debug.called)
+        self.assertFalse(mock_logger.info.called or mock_logger.warning.called or mock_logger.error.called)
+        with open(self._cache_path()) as cache_file:
+            self.assertEqual(["cachedhost"], self._hostnames(json.load(cache_file)))
+
+    def test_unreachable_cached_route_tunnels(self):
+        """A host that can't be reached directly is reached through the cached jump host without EC2"""
+        self._write_cache(age=0, instances=[_instance_lookup("host", private_ip_address="10.0.0.1")])
+        self.disco_ssh.is_reachable = MagicMock(side_effect=lambda ip_address: ip_address == "5.6.7.8")
+
+        self.assertEqual(["5.6.7.8", "10.0.0.1"], self.disco_ssh.detect_best_route("host"))
+        self.assertFalse(self.disco_ssh._aws.instances.called)
+
+    def test_unreachable_cached_jump_host_refreshed(self):
+        """A cached jump host that can't be reached is looked up again before tunnelling"""
+        self._write_cache(age=0, instances=[_instance_lookup("host", private_ip_address="10.0.0.1")])
+        self.disco_ssh._aws.instances.return_value = [_ec2_instance("host", private_ip_address="10.0.0.2")]
+        self.disco_ssh.is_reachable = MagicMock(return_value=False)
+
+        self.assertEqual(["1.2.3.4", "10.0.0.2"], self.disco_ssh.detect_best_route("host"))
+        self.assertEqual(1, self.disco_ssh._aws.instances.call_count)
+
+    @patch("bin.disco_ssh.os.system")
+    def test_failed_cached_route_retried(self, mock_system):
+        """When ssh fails to connect through a cached route the lookups are refreshed and ssh is run again"""
+        self._write_cache(age=0, instances=[_instance_lookup("host", private_ip_address="10.0.0.1")])
+        self.disco_ssh._aws.instances.return_value = [_ec2_instance("host", private_ip_address="10.0.0.2")]
+        self.disco_ssh.args["<host>"] = "host"
+        jump_addresses = ("5.6.7.8", "1.2.3.4")
+        self.disco_ssh.is_reachable = MagicMock(side_effect=lambda ip_address: ip_address in jump_addresses)
+        mock_system.side_effect = [disco_ssh.SSH_CONNECTION_ERROR << 8, disco_ssh.SSH_CONNECTION_ERROR << 8]
+
+        self.disco_ssh.run()
+
+        self.assertEqual([["5.6.7.8"], ["1.2.3.4"]],
+                         [[ip for ip in ("5.6.7.8", "1.2.3.4") if ip in call[0][0]]
+                          for call in mock_system.call_args_list])
+        self.assertEqual(1, self.disco_ssh._aws.instances.call_count)
+
+    @patch("bin.disco_ssh.os.system")
+    def test_session_exit_status_not_retried(self, mock_system):
+        """ssh exiting with the status of the remote session does not refresh the lookups"""
+        self._write_cache(age=0)
+        self.disco_ssh.args["<host>"] = "cachedhost"
+        self.disco_ssh.is_reachable = MagicMock(side_effect=lambda ip_address: ip_address == "10.0.0.1")
+        mock_system.return_value = 1 << 8
+
+        self.disco_ssh.run()
+
+        self.assertEqual(1, mock_system.call_count)
+        self.assertFalse(self.disco_ssh._aws.instances.called)
@@ -106,6 +106,15 @@ def _get_mock_ssm():
                                      'PlatformTypes': ['Linux']})
         mock_asiaq_document_contents[Name] = Content
 
+    def _mock_update_document(Content, Name, DocumentVersion):
+        if DocumentVersion != '$LATEST':
+            raise RuntimeError("Documents should only be updated from their latest version.")
+        if Name not in mock_asiaq_document_contents:
+            raise ClientError({'Error': {'Code': 'InvalidDocument', 'Message': 'mock message'}},
+                              'UpdateDocument')
+        mock_asiaq_document_contents[Name] = Content
+        return {'DocumentDescription': {'Name': Name, 'DocumentVersion': '2', 'Status': 'Updating'}}
+
     def _mock_delete_document(Name):
         doc_to_delete = [document for document in mock_asiaq_documents
                          if document['Name'] == Name]
@@ -170,6 +179,7 @@ def _get_mock_ssm():
     mock_ssm.get_document.side_effect = _mock_get_document
     mock_ssm.create_document.side_effect = _mock_create_document
     mock_ssm.delete_document.side_effect = _mock_delete_document
+    mock_ssm.update_document.side_effect = _mock_update_document
     mock_ssm.describe_document.side_effect = _mock_describe_document
     mock_ssm.send_command.side_effect = _mock_send_command
     mock_ssm.list_commands.side_effect = _mock_list_commands
@@ -442,6 +452,12 @@ class DiscoSSMTests(TestCase):
         # Calling the method under test
         self._ssm.update(wait=False)
 
+        # Verify document_1 is updated in place rather than recreated
+        self.assertEqual([], self._ssm.conn.delete_document.mock_calls)
+        self.assertEqual([], self._ssm.conn.create_document.mock_calls)
+        self._ssm.conn.update_document_default_version.assert_called_once_with(
+            Name='asiaq-ssm_document_1', DocumentVersion='2')
+
         # Verify only document_1 is modified
         self.assertEqual(_standardize_json_str(new_doc_1_content),
                          _standardize_json_str(
@@ -471,8 +487,8 @@ class DiscoSSMTests(TestCase):
 
         # Verify only document_1 is modified
         describe_call = call(Name='asiaq-ssm_document_1')
-        # Expecting describe_document() to be called four times: two for delete, two for create
-        expected_describe_calls = [describe_call, describe_call, describe_call, describe_call]
+        # Expecting describe_document() to be called twice while the new version becomes active
+        expected_describe_calls = [describe_call, describe_call]
         self.assertEqual(expected_describe_calls,
                          self._ssm.conn.describe_document.mock_calls)
 
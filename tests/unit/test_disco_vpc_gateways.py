@@ -118,11 +118,11 @@ class DiscoVPCGatewaysTests(unittest.TestCase):
             VpcId=MOCK_VPC_ID, VpnGatewayId=MOCK_VGW_ID)
 
     @patch('disco_aws_automation.disco_vpc.DiscoMetaNetwork')
-    @patch('disco_aws_automation.disco_vpc.DiscoVPC.config', new_callable=PropertyMock)
-    def test_update_nat_gateways_and_routes(self, config_mock, meta_network_mock):
+    def test_update_nat_gateways_and_routes(self, meta_network_mock):
         """ Verify NAT gateways and the routes to them are created properly """
 
-        config_mock.return_value = get_mock_config({
+        # the meta networks are updated on a pool of threads, so they share no mocks
+        self.mock_vpc._config = get_mock_config({
             'envtype:sandbox': {
                 'ip_space': '10.0.0.0/24',
                 'vpc_cidr_size': '26',
@@ -136,6 +136,7 @@ class DiscoVPCGatewaysTests(unittest.TestCase):
                 'nat_gateway_routes': 'intranet/tunnel'
             }
         })
+        self.disco_vpc_gateways.eip.find_eip_address = lambda eip: MagicMock(allocation_id="eipalloc-" + eip)
 
         network_intranet_mock = MagicMock()
         network_dmz_mock = MagicMock()
@@ -173,8 +174,9 @@ class DiscoVPCGatewaysTests(unittest.TestCase):
 
         # Verifying correct behavior
         network_intranet_mock.upsert_nat_gateway_route.assert_called_once_with(network_tunnel_mock)
-        network_tunnel_mock.add_nat_gateways.assert_called_once_with(allocation_ids=[
-            self.disco_vpc_gateways.eip.find_eip_address('eip').allocation_id,
-            self.disco_vpc_gateways.eip.find_eip_address('eip').allocation_id,
-            self.disco_vpc_gateways.eip.find_eip_address('eip').allocation_id
-        ])
+        network_tunnel_mock.add_nat_gateways.assert_called_once_with(
+            allocation_ids=["eipalloc-10.1.0.4", "eipalloc-10.1.0.5", "eipalloc-10.1.0.6"])
+        network_intranet_mock.add_nat_gateways.assert_called_once_with()
+        networks = [network_intranet_mock, network_dmz_mock, network_maintenance_mock, network_tunnel_mock]
+        self.assertItemsEqual([network_dmz_mock, network_maintenance_mock],
+                              [network for network in networks if network.delete_nat_gateways.called])
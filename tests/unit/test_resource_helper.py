@@ -9,10 +9,10 @@ import boto.ec2.instance
 from botocore.exceptions import ClientError
 from mock import patch, MagicMock, create_autospec
 
-from disco_aws_automation.exceptions import ExpectedTimeoutError
+from disco_aws_automation.exceptions import ExpectedTimeoutError, ProgrammerError
 from disco_aws_automation import TimeoutError
 from disco_aws_automation.resource_helper import Jitter, keep_trying, throttled_call, wait_for_state, \
-    wait_for_state_boto3, wait_for_sshable, MAX_POLL_INTERVAL
+    wait_for_state_boto3, wait_for_sshable, parallel_map, RateLimiter, run_step_graph, MAX_POLL_INTERVAL
 
 
 # time.sleep is being patched but not referenced.
@@ -235,3 +235,63 @@ class ResourceHelperTests(TestCase):
         """Test wait_for_sshable with timeout"""
         mock_remote_cmd = MagicMock(return_value=[1])
         self.assertRaises(TimeoutError, wait_for_sshable, mock_remote_cmd, self.mock_instance(), 30)
+
+    def test_parallel_map_preserves_order(self):
+        """Test parallel_map returns results in the order of the items"""
+        self.assertEqual([x * 2 for x in range(20)], parallel_map(lambda x: x * 2, range(20), max_workers=4))
+
+    def test_parallel_map_empty(self):
+        """Test parallel_map with no items"""
+        self.assertEqual([], parallel_map(lambda x: x, []))
+
+    def test_parallel_map_error(self):
+        """Test parallel_map re-raises errors from the workers"""
+        def _fail(item):
+            if item == 3:
+                raise RuntimeError("Mock failure")
+            return item
+
+        self.assertRaises(RuntimeError, parallel_map, _fail, range(5), max_workers=2)
+
+    @patch('time.sleep', return_value=None)
+    @patch('time.time', return_value=100.0)
+    def test_rate_limiter(self, mock_time, mock_sleep):
+        """Test RateLimiter spaces out calls made at the same time"""
+        limiter = RateLimiter(4)
+        limiter.wait()
+        limiter.wait()
+        limiter.wait()
+        self.assertEqual([0.25, 0.5], [call[0][0] for call in mock_sleep.call_args_list])
+
+    def test_run_step_graph(self):
+        """Test run_step_graph runs each step after its dependencies and returns all results"""
+        order = []
+
+        def _step(name, value):
+            def _run(results):
+                order.append(name)
+                return value + sum(results[dependency] for dependency in dependencies[name])
+            return _run
+
+        dependencies = {"a": [], "b": [], "c": ["a", "b"], "d": ["c"]}
+        results = run_step_graph([(name, _step(name, 1), dependencies[name]) for name in "dcba"])
+
+        self.assertEqual({"a": 1, "b": 1, "c": 3, "d": 4}, results)
+        self.assertEqual(["c", "d"], order[2:])
+
+    def test_run_step_graph_failure(self):
+        """Test run_step_graph re-raises a failed step and doesn't start the steps that need it"""
+        dependent = MagicMock()
+
+        def _fail(_results):
+            raise RuntimeError("Mock failure")
+
+        self.assertRaises(RuntimeError, run_step_graph,
+                          [("fail", _fail, []), ("dependent", dependent, ["fail"])])
+        self.assertFalse(dependent.called)
+
+    def test_run_step_graph_bad_dependencies(self):
+        """Test run_step_graph refuses unknown dependencies and cycles"""
+        self.assertRaises(ProgrammerError, run_step_graph, [("a", MagicMock(), ["b"])])
+        self.assertRaises(ProgrammerError, run_step_graph,
+                          [("a", MagicMock(), ["b"]), ("b", MagicMock(), ["a"])])